@@ -0,0 +1,43 @@
+"""add draft_orders table and order expiry index
+
+Revision ID: a7d3e9f1c5b2
+Revises: f2c8a6d4b1e7
+Create Date: 2026-10-18 19:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7d3e9f1c5b2'
+down_revision: Union[str, Sequence[str], None] = 'f2c8a6d4b1e7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('draft_orders',
+    sa.Column('id', sa.String(length=64), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('items_json', sa.JSON(), nullable=False),
+    sa.Column('total_amount', sa.Numeric(precision=10, scale=2), nullable=False),
+    sa.Column('from_source', sa.String(length=32), nullable=True),
+    sa.Column('expires_at', sa.DateTime(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_draft_orders_user_id'), 'draft_orders', ['user_id'], unique=False)
+    op.create_index(op.f('ix_draft_orders_expires_at'), 'draft_orders', ['expires_at'], unique=False)
+    op.create_index('ix_orders_status_created_at', 'orders', ['status', 'created_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_orders_status_created_at', table_name='orders')
+    op.drop_index(op.f('ix_draft_orders_expires_at'), table_name='draft_orders')
+    op.drop_index(op.f('ix_draft_orders_user_id'), table_name='draft_orders')
+    op.drop_table('draft_orders')
@@ -0,0 +1,41 @@
+"""add payment_notifications table
+
+Revision ID: b8e4f2a6d0c3
+Revises: a7d3e9f1c5b2
+Create Date: 2026-10-18 20:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'b8e4f2a6d0c3'
+down_revision: Union[str, Sequence[str], None] = 'a7d3e9f1c5b2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('payment_notifications',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('transaction_id', sa.String(length=64), nullable=False),
+    sa.Column('order_number', sa.String(length=64), nullable=False),
+    sa.Column('total_fee', sa.Integer(), nullable=True),
+    sa.Column('time_end', sa.String(length=14), nullable=True),
+    sa.Column('result', sa.String(length=16), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('transaction_id')
+    )
+    op.create_index(op.f('ix_payment_notifications_id'), 'payment_notifications', ['id'], unique=False)
+    op.create_index(op.f('ix_payment_notifications_order_number'), 'payment_notifications', ['order_number'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_payment_notifications_order_number'), table_name='payment_notifications')
+    op.drop_index(op.f('ix_payment_notifications_id'), table_name='payment_notifications')
+    op.drop_table('payment_notifications')
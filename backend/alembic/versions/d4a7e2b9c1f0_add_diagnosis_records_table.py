@@ -0,0 +1,49 @@
+"""add diagnosis_records table
+
+Revision ID: d4a7e2b9c1f0
+Revises: c3d8f0a1e5b6
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4a7e2b9c1f0'
+down_revision: Union[str, Sequence[str], None] = 'c3d8f0a1e5b6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('diagnosis_records',
+    sa.Column('id', sa.String(length=32), nullable=False),
+    sa.Column('disease', sa.String(length=32), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('patient_id', sa.String(), nullable=True),
+    sa.Column('source', sa.String(length=16), nullable=False),
+    sa.Column('base_score', sa.Integer(), nullable=True),
+    sa.Column('level', sa.String(), nullable=True),
+    sa.Column('syndrome', sa.String(), nullable=True),
+    sa.Column('confidence', sa.Float(), nullable=True),
+    sa.Column('syndrome_scores', sa.JSON(), nullable=True),
+    sa.Column('treatment_plan', sa.JSON(), nullable=True),
+    sa.Column('answers', sa.JSON(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_diagnosis_records_disease'), 'diagnosis_records', ['disease'], unique=False)
+    op.create_index(op.f('ix_diagnosis_records_user_id'), 'diagnosis_records', ['user_id'], unique=False)
+    op.create_index(op.f('ix_diagnosis_records_created_at'), 'diagnosis_records', ['created_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_diagnosis_records_created_at'), table_name='diagnosis_records')
+    op.drop_index(op.f('ix_diagnosis_records_user_id'), table_name='diagnosis_records')
+    op.drop_index(op.f('ix_diagnosis_records_disease'), table_name='diagnosis_records')
+    op.drop_table('diagnosis_records')
@@ -2,12 +2,8 @@
 管理后台API
 """
 import os
-import uuid
-import csv
-import io
 from datetime import datetime
 from fastapi import APIRouter, Depends, HTTPException, status, File, UploadFile, Form
-from fastapi.responses import StreamingResponse
 from app.core.exceptions import (
     NotFoundException, BusinessException, ValidationException,
     FileTooLargeException, UnsupportedFileTypeException, DatabaseException,
@@ -19,9 +15,14 @@ from pydantic import BaseModel
 
 from app import schemas, models
 from app.database import get_db
+from app.core.auth_context import invalidate_user
 from app.core.permissions import require_admin_role, get_current_user
 from app.core.logger import log_admin_action, log_file_upload, log_data_export, admin_logger
-from app.core.enums_v2 import AuditStatus, ExpertStatus, ProductStatus, OrderStatus, ConsultationStatus, ConsultationType
+from app.core.enums_v2 import AuditStatus, OrderStatus
+from app.core.export_stream import export_response, format_datetime
+from app.core.upload_stream import UploadEmptyError, UploadTooLargeError
+from app.services import file_store
+from app.services.statistics_service import statistics_cache
 
 router = APIRouter(tags=["admin"])
 
@@ -266,37 +267,25 @@ async def upload_video(
     if file.content_type not in allowed_types:
         raise UnsupportedFileTypeException(f"支持的格式：{', '.join(allowed_types)}")
     
-    # 检查文件大小（限制为1GB）
-    max_size = 1024 * 1024 * 1024  # 1GB
-    content = await file.read()
-    file_size = len(content)
-    
-    if file_size == 0:
-        raise ValidationException("文件不能为空")
-    
-    if file_size > max_size:
-        raise FileTooLargeException("1GB")
-    
-    # 生成安全的文件名
-    unique_filename = f"{uuid.uuid4()}{file_extension}"
-    
-    # 创建按日期分组的上传目录
     from datetime import datetime
-    date_path = datetime.now().strftime("%Y/%m")
-    upload_dir = f"uploads/videos/{date_path}"
-    os.makedirs(upload_dir, exist_ok=True)
     
-    # 保存文件
-    file_path = os.path.join(upload_dir, unique_filename)
+    # 分块保存文件并按内容去重，同时计算哈希（限制为1GB）
+    max_size = 1024 * 1024 * 1024  # 1GB
     try:
-        with open(file_path, "wb") as buffer:
-            buffer.write(content)
-    except Exception as e:
+        record, stored, created = await file_store.store_upload(
+            db, file, "videos", max_size, extra_hashes=("md5",)
+        )
+    except UploadTooLargeError:
+        raise FileTooLargeException("1GB")
+    except UploadEmptyError:
+        raise ValidationException("文件不能为空")
+    except OSError as e:
         raise DatabaseException(f"文件保存失败: {str(e)}")
     
-    # 计算文件哈希（用于防重复）
-    import hashlib
-    file_hash = hashlib.md5(content).hexdigest()
+    file_size = stored.size
+    file_hash = stored.hashes["md5"]
+    file_path = file_store.absolute_path(record.path)
+    unique_filename = os.path.basename(record.path)
     
     # 记录文件上传日志
     log_file_upload(current_user, file.filename, file_size, file.content_type)
@@ -309,7 +298,9 @@ async def upload_video(
         "file_size": file_size,
         "file_hash": file_hash,
         "content_type": file.content_type,
-        "upload_url": f"/uploads/videos/{date_path}/{unique_filename}",
+        "upload_url": file_store.file_url(record.path),
+        "sha256": record.sha256,
+        "deduplicated": not created,
         "uploaded_by": current_user.username,
         "uploaded_at": datetime.now().isoformat()
     }
@@ -341,50 +332,37 @@ async def upload_image(
     if file.content_type not in allowed_types:
         raise UnsupportedFileTypeException(f"支持的格式：{', '.join(allowed_types)}")
     
-    # 检查文件大小（限制为20MB）
-    max_size = 20 * 1024 * 1024  # 20MB
-    content = await file.read()
-    file_size = len(content)
-    
-    if file_size == 0:
-        raise ValidationException("文件不能为空")
-    
-    if file_size > max_size:
-        raise FileTooLargeException("20MB")
-    
-    # 生成安全的文件名
-    unique_filename = f"{uuid.uuid4()}{file_extension}"
-    
-    # 创建按日期分组的上传目录
     from datetime import datetime
-    date_path = datetime.now().strftime("%Y/%m")
-    upload_dir = f"uploads/images/{date_path}"
-    os.makedirs(upload_dir, exist_ok=True)
     
-    # 保存文件
-    file_path = os.path.join(upload_dir, unique_filename)
+    # 分块保存文件并按内容去重，同时计算哈希（限制为20MB）
+    max_size = 20 * 1024 * 1024  # 20MB
     try:
-        with open(file_path, "wb") as buffer:
-            buffer.write(content)
-    except Exception as e:
+        record, stored, created = await file_store.store_upload(
+            db, file, "images", max_size, extra_hashes=("md5",)
+        )
+    except UploadTooLargeError:
+        raise FileTooLargeException("20MB")
+    except UploadEmptyError:
+        raise ValidationException("文件不能为空")
+    except OSError as e:
         raise DatabaseException(f"文件保存失败: {str(e)}")
     
-    # 计算文件哈希
-    import hashlib
-    file_hash = hashlib.md5(content).hexdigest()
+    file_size = stored.size
+    file_hash = stored.hashes["md5"]
+    file_path = file_store.absolute_path(record.path)
+    unique_filename = os.path.basename(record.path)
     
     # 获取图片尺寸（如果可能）
     image_info = {}
     try:
         from PIL import Image
-        import io
-        image = Image.open(io.BytesIO(content))
-        image_info = {
-            "width": image.width,
-            "height": image.height,
-            "format": image.format,
-            "mode": image.mode
-        }
+        with Image.open(file_path) as image:
+            image_info = {
+                "width": image.width,
+                "height": image.height,
+                "format": image.format,
+                "mode": image.mode
+            }
     except ImportError:
         # PIL未安装，跳过图片信息获取
         pass
@@ -402,7 +380,9 @@ async def upload_image(
         "file_size": file_size,
         "file_hash": file_hash,
         "content_type": file.content_type,
-        "upload_url": f"/uploads/images/{date_path}/{unique_filename}",
+        "upload_url": file_store.file_url(record.path),
+        "sha256": record.sha256,
+        "deduplicated": not created,
         "uploaded_by": current_user.username,
         "uploaded_at": datetime.now().isoformat(),
         **image_info
@@ -440,37 +420,25 @@ async def upload_document(
     if file.content_type not in allowed_types:
         raise UnsupportedFileTypeException(f"支持的格式：{', '.join(allowed_types)}")
     
-    # 检查文件大小（限制为50MB）
-    max_size = 50 * 1024 * 1024  # 50MB
-    content = await file.read()
-    file_size = len(content)
-    
-    if file_size == 0:
-        raise ValidationException("文件不能为空")
-    
-    if file_size > max_size:
-        raise FileTooLargeException("50MB")
-    
-    # 生成安全的文件名
-    unique_filename = f"{uuid.uuid4()}{file_extension}"
-    
-    # 创建按日期分组的上传目录
     from datetime import datetime
-    date_path = datetime.now().strftime("%Y/%m")
-    upload_dir = f"uploads/documents/{date_path}"
-    os.makedirs(upload_dir, exist_ok=True)
     
-    # 保存文件
-    file_path = os.path.join(upload_dir, unique_filename)
+    # 分块保存文件并按内容去重，同时计算哈希（限制为50MB）
+    max_size = 50 * 1024 * 1024  # 50MB
     try:
-        with open(file_path, "wb") as buffer:
-            buffer.write(content)
-    except Exception as e:
+        record, stored, created = await file_store.store_upload(
+            db, file, "documents", max_size, extra_hashes=("md5",)
+        )
+    except UploadTooLargeError:
+        raise FileTooLargeException("50MB")
+    except UploadEmptyError:
+        raise ValidationException("文件不能为空")
+    except OSError as e:
         raise DatabaseException(f"文件保存失败: {str(e)}")
     
-    # 计算文件哈希
-    import hashlib
-    file_hash = hashlib.md5(content).hexdigest()
+    file_size = stored.size
+    file_hash = stored.hashes["md5"]
+    file_path = file_store.absolute_path(record.path)
+    unique_filename = os.path.basename(record.path)
     
     return {
         "filename": unique_filename,
@@ -479,7 +447,9 @@ async def upload_document(
         "file_size": file_size,
         "file_hash": file_hash,
         "content_type": file.content_type,
-        "upload_url": f"/uploads/documents/{date_path}/{unique_filename}",
+        "upload_url": file_store.file_url(record.path),
+        "sha256": record.sha256,
+        "deduplicated": not created,
         "uploaded_by": current_user.username,
         "uploaded_at": datetime.now().isoformat()
     }
@@ -488,173 +458,14 @@ async def upload_document(
 
 @router.get("/statistics")
 def get_statistics(
+    refresh: bool = False,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(require_admin_role)
 ):
-    """获取平台统计数据"""
-    from datetime import datetime, timedelta
-    from sqlalchemy import func
-    from app.models.user import UserRole, UserStatus
-    
-    # 基础统计
-    total_courses = db.query(models.Course).count()
-    published_courses = db.query(models.Course).filter(models.Course.is_published == True).count()
-    total_lessons = db.query(models.Lesson).count()
-    total_users = db.query(models.User).count()
-    total_enrollments = db.query(models.Enrollment).count()
-    
-    # 专家统计
-    total_experts = db.query(models.Expert).count()
-    active_experts = db.query(models.Expert).filter(models.Expert.status == ExpertStatus.ACTIVE).count()
-    verified_experts = db.query(models.Expert).filter(models.Expert.is_verified == True).count()
-    
-    # 商品统计
-    total_products = db.query(models.Product).count()
-    active_products = db.query(models.Product).filter(models.Product.status == ProductStatus.ACTIVE).count()
-    featured_products = db.query(models.Product).filter(models.Product.is_featured == True).count()
-    
-    # 订单统计
-    total_orders = db.query(models.Order).count()
-    pending_orders = db.query(models.Order).filter(models.Order.status == OrderStatus.PENDING_PAYMENT).count()
-    completed_orders = db.query(models.Order).filter(models.Order.status == OrderStatus.DELIVERED).count()
-    total_revenue = db.query(func.sum(models.Order.total_amount)).filter(
-        models.Order.status.in_([OrderStatus.PAID, OrderStatus.SHIPPED, OrderStatus.DELIVERED])
-    ).scalar() or 0
-    
-    # 咨询统计
-    total_consultations = db.query(models.Consultation).count()
-    pending_consultations = db.query(models.Consultation).filter(models.Consultation.status == ConsultationStatus.PENDING).count()
-    completed_consultations = db.query(models.Consultation).filter(models.Consultation.status == ConsultationStatus.COMPLETED).count()
-    ai_consultations = db.query(models.Consultation).filter(models.Consultation.type == ConsultationType.AI).count()
-    expert_consultations = db.query(models.Consultation).filter(models.Consultation.type.in_([ConsultationType.TEXT, ConsultationType.VOICE, ConsultationType.VIDEO])).count()
-    
-    # 用户分析
-    active_users = db.query(models.User).filter(models.User.status == UserStatus.ACTIVE).count()
-    vip_users = db.query(models.User).filter(models.User.role == UserRole.VIP).count()
-    doctor_users = db.query(models.User).filter(models.User.role == UserRole.DOCTOR).count()
-    admin_users = db.query(models.User).filter(models.User.role.in_([UserRole.ADMIN, UserRole.SUPER_ADMIN])).count()
-    
-    # 课程分析
-    free_courses = db.query(models.Course).filter(models.Course.is_free == True).count()
-    paid_courses = db.query(models.Course).filter(models.Course.is_free == False).count()
-    
-    # 最近7天统计
-    seven_days_ago = datetime.utcnow() - timedelta(days=7)
-    new_users_week = db.query(models.User).filter(models.User.created_at >= seven_days_ago).count()
-    new_courses_week = db.query(models.Course).filter(models.Course.created_at >= seven_days_ago).count()
-    new_enrollments_week = db.query(models.Enrollment).filter(models.Enrollment.enrolled_at >= seven_days_ago).count()
-    new_orders_week = db.query(models.Order).filter(models.Order.created_at >= seven_days_ago).count()
-    new_consultations_week = db.query(models.Consultation).filter(models.Consultation.created_at >= seven_days_ago).count()
-    weekly_revenue = db.query(func.sum(models.Order.total_amount)).filter(
-        models.Order.created_at >= seven_days_ago,
-        models.Order.status.in_([OrderStatus.PAID, OrderStatus.SHIPPED, OrderStatus.DELIVERED])
-    ).scalar() or 0
-    
-    # 最近30天统计
-    thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-    monthly_revenue = db.query(func.sum(models.Order.total_amount)).filter(
-        models.Order.created_at >= thirty_days_ago,
-        models.Order.status.in_([OrderStatus.PAID, OrderStatus.SHIPPED, OrderStatus.DELIVERED])
-    ).scalar() or 0
-    monthly_orders = db.query(models.Order).filter(models.Order.created_at >= thirty_days_ago).count()
-    monthly_consultations = db.query(models.Consultation).filter(models.Consultation.created_at >= thirty_days_ago).count()
-    
-    # 学习进度统计
-    total_watch_time = db.query(func.sum(models.WatchRecord.watch_time)).scalar() or 0
-    completed_lessons = db.query(models.WatchRecord).filter(models.WatchRecord.is_completed == True).count()
-    
-    # 商品分类统计
-    from app.models.product import ProductCategory
-    product_category_stats = {}
-    for category in ProductCategory:
-        count = db.query(models.Product).filter(models.Product.category == category).count()
-        product_category_stats[category.value] = count
-    
-    # 专家分类统计
-    from app.models.expert import ExpertCategory
-    expert_category_stats = {}
-    for category in ExpertCategory:
-        count = db.query(models.Expert).filter(models.Expert.category == category).count()
-        expert_category_stats[category.value] = count
-    
-    return {
-        "overview": {
-            "total_users": total_users,
-            "total_experts": total_experts,
-            "total_products": total_products,
-            "total_courses": total_courses,
-            "total_orders": total_orders,
-            "total_consultations": total_consultations,
-            "total_revenue": round(total_revenue, 2)
-        },
-        "expert_stats": {
-            "total_experts": total_experts,
-            "active_experts": active_experts,
-            "verified_experts": verified_experts,
-            "category_stats": expert_category_stats
-        },
-        "product_stats": {
-            "total_products": total_products,
-            "active_products": active_products,
-            "featured_products": featured_products,
-            "category_stats": product_category_stats
-        },
-        "order_stats": {
-            "total_orders": total_orders,
-            "pending_orders": pending_orders,
-            "completed_orders": completed_orders,
-            "completion_rate": round(completed_orders / max(total_orders, 1) * 100, 2),
-            "total_revenue": round(total_revenue, 2)
-        },
-        "consultation_stats": {
-            "total_consultations": total_consultations,
-            "pending_consultations": pending_consultations,
-            "completed_consultations": completed_consultations,
-            "ai_consultations": ai_consultations,
-            "expert_consultations": expert_consultations,
-            "completion_rate": round(completed_consultations / max(total_consultations, 1) * 100, 2)
-        },
-        "user_analysis": {
-            "active_users": active_users,
-            "vip_users": vip_users,
-            "doctor_users": doctor_users,
-            "admin_users": admin_users,
-            "user_distribution": {
-                "regular": total_users - vip_users - doctor_users - admin_users,
-                "vip": vip_users,
-                "doctor": doctor_users,
-                "admin": admin_users
-            }
-        },
-        "course_analysis": {
-            "total_courses": total_courses,
-            "published_courses": published_courses,
-            "free_courses": free_courses,
-            "paid_courses": paid_courses,
-            "total_lessons": total_lessons,
-            "total_enrollments": total_enrollments
-        },
-        "recent_activity": {
-            "last_7_days": {
-                "new_users": new_users_week,
-                "new_courses": new_courses_week,
-                "new_enrollments": new_enrollments_week,
-                "new_orders": new_orders_week,
-                "new_consultations": new_consultations_week,
-                "revenue": round(weekly_revenue, 2)
-            },
-            "last_30_days": {
-                "revenue": round(monthly_revenue, 2),
-                "orders": monthly_orders,
-                "consultations": monthly_consultations
-            }
-        },
-        "learning_stats": {
-            "total_watch_time_hours": round(total_watch_time / 3600, 2),
-            "completed_lessons": completed_lessons,
-            "avg_completion_rate": round(completed_lessons / max(total_enrollments, 1) * 100, 2)
-        }
-    }
+    """获取平台统计数据（缓存快照，refresh=true 时强制重新计算）"""
+    if refresh:
+        statistics_cache.invalidate()
+    return statistics_cache.get(db)
 
 # ====== 专家管理 ======
 
@@ -1016,13 +827,21 @@ def update_user_role(
     db: Session = Depends(get_db),
     current_user: models.User = Depends(require_admin_role)
 ):
-    """更新用户权限"""
+    """更新用户权限（设为管理员，或把管理员降为普通用户；其他角色和超级管理员不受影响）"""
     user = db.query(models.User).filter(models.User.id == user_id).first()
     if not user:
         raise CommonErrors.USER_NOT_FOUND
     
-    user.is_admin = is_admin
-    db.commit()
+    if is_admin and user.role != models.UserRole.SUPER_ADMIN:
+        new_role = models.UserRole.ADMIN
+    elif not is_admin and user.role == models.UserRole.ADMIN:
+        new_role = models.UserRole.USER
+    else:
+        new_role = user.role
+    if new_role != user.role:
+        user.role = new_role
+        db.commit()
+        invalidate_user(user_id=user.id)
     
     return {"message": f"User role updated successfully"}
 
@@ -1030,176 +849,141 @@ def update_user_role(
 
 @router.get("/export/users")
 def export_users(
-    format: str = "csv",  # csv, json
+    format: str = "csv",  # csv, json(NDJSON)
+    gzip: bool = False,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(require_admin_role)
 ):
-    """导出用户数据"""
-    users = db.query(models.User).all()
+    """导出用户数据（流式输出）"""
+    from sqlalchemy import func, select
     
     # 记录数据导出日志
-    log_data_export(current_user, f"用户数据({format})", len(users))
-    
-    if format == "csv":
-        output = io.StringIO()
-        writer = csv.writer(output)
-        
-        # CSV表头
-        writer.writerow([
+    total = db.query(func.count(models.User.id)).scalar()
+    log_data_export(current_user, f"用户数据({format})", total)
+    
+    statement = select(
+        models.User.id, models.User.username, models.User.email, models.User.full_name,
+        models.User.phone, models.User.role, models.User.status, models.User.is_active,
+        models.User.created_at, models.User.last_login
+    ).order_by(models.User.id)
+    
+    return export_response(
+        statement, format, "users",
+        csv_header=[
             "ID", "用户名", "邮箱", "姓名", "电话", "角色", "状态", 
             "是否激活", "注册时间", "最后登录"
-        ])
-        
-        # 数据行
-        for user in users:
-            writer.writerow([
-                user.id, user.username, user.email, user.full_name or "",
-                user.phone or "", user.role.value, user.status.value,
-                "是" if user.is_active else "否",
-                user.created_at.strftime("%Y-%m-%d %H:%M:%S") if user.created_at else "",
-                user.last_login.strftime("%Y-%m-%d %H:%M:%S") if hasattr(user, 'last_login') and user.last_login else ""
-            ])
-        
-        output.seek(0)
-        
-        return StreamingResponse(
-            io.BytesIO(output.getvalue().encode('utf-8-sig')),
-            media_type="text/csv",
-            headers={"Content-Disposition": f"attachment; filename=users_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"}
-        )
-    
-    else:  # JSON格式
-        user_data = []
-        for user in users:
-            user_data.append({
-                "id": user.id,
-                "username": user.username,
-                "email": user.email,
-                "full_name": user.full_name,
-                "phone": user.phone,
-                "role": user.role.value,
-                "status": user.status.value,
-                "is_active": user.is_active,
-                "created_at": user.created_at.isoformat() if user.created_at else None
-            })
-        
-        return user_data
+        ],
+        to_csv_row=lambda user: [
+            user.id, user.username, user.email, user.full_name or "",
+            user.phone or "", user.role.value, user.status.value,
+            "是" if user.is_active else "否",
+            format_datetime(user.created_at),
+            format_datetime(user.last_login)
+        ],
+        to_record=lambda user: {
+            "id": user.id,
+            "username": user.username,
+            "email": user.email,
+            "full_name": user.full_name,
+            "phone": user.phone,
+            "role": user.role.value,
+            "status": user.status.value,
+            "is_active": user.is_active,
+            "created_at": user.created_at
+        },
+        gzip=gzip
+    )
 
 @router.get("/export/courses")
 def export_courses(
     format: str = "csv",
-    db: Session = Depends(get_db),
+    gzip: bool = False,
     current_user: models.User = Depends(require_admin_role)
 ):
-    """导出课程数据"""
-    courses = db.query(models.Course).all()
-    
-    if format == "csv":
-        output = io.StringIO()
-        writer = csv.writer(output)
-        
-        # CSV表头
-        writer.writerow([
+    """导出课程数据（流式输出）"""
+    from sqlalchemy import select
+    
+    statement = select(
+        models.Course.id, models.Course.title, models.Course.description, models.Course.category,
+        models.Course.instructor, models.Course.duration, models.Course.price, models.Course.is_free,
+        models.Course.is_published, models.Course.total_lessons, models.Course.created_at
+    ).order_by(models.Course.id)
+    
+    return export_response(
+        statement, format, "courses",
+        csv_header=[
             "ID", "标题", "描述", "分类", "讲师", "时长", "价格", 
             "是否免费", "是否发布", "总课时", "创建时间"
-        ])
-        
-        # 数据行
-        for course in courses:
-            writer.writerow([
-                course.id, course.title, course.description or "",
-                course.category.value, course.instructor or "", course.duration or "",
-                course.price or 0, "是" if course.is_free else "否",
-                "是" if course.is_published else "否", course.total_lessons or 0,
-                course.created_at.strftime("%Y-%m-%d %H:%M:%S") if course.created_at else ""
-            ])
-        
-        output.seek(0)
-        
-        return StreamingResponse(
-            io.BytesIO(output.getvalue().encode('utf-8-sig')),
-            media_type="text/csv",
-            headers={"Content-Disposition": f"attachment; filename=courses_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"}
-        )
-    
-    else:  # JSON格式
-        course_data = []
-        for course in courses:
-            course_data.append({
-                "id": course.id,
-                "title": course.title,
-                "description": course.description,
-                "category": course.category.value,
-                "instructor": course.instructor,
-                "duration": course.duration,
-                "price": course.price,
-                "is_free": course.is_free,
-                "is_published": course.is_published,
-                "total_lessons": course.total_lessons,
-                "created_at": course.created_at.isoformat() if course.created_at else None
-            })
-        
-        return course_data
+        ],
+        to_csv_row=lambda course: [
+            course.id, course.title, course.description or "",
+            course.category.value, course.instructor or "", course.duration or "",
+            course.price or 0, "是" if course.is_free else "否",
+            "是" if course.is_published else "否", course.total_lessons or 0,
+            format_datetime(course.created_at)
+        ],
+        to_record=lambda course: {
+            "id": course.id,
+            "title": course.title,
+            "description": course.description,
+            "category": course.category.value,
+            "instructor": course.instructor,
+            "duration": course.duration,
+            "price": course.price,
+            "is_free": course.is_free,
+            "is_published": course.is_published,
+            "total_lessons": course.total_lessons,
+            "created_at": course.created_at
+        },
+        gzip=gzip
+    )
 
 @router.get("/export/enrollments")
 def export_enrollments(
     format: str = "csv",
-    db: Session = Depends(get_db),
+    gzip: bool = False,
     current_user: models.User = Depends(require_admin_role)
 ):
-    """导出注册数据"""
-    from sqlalchemy.orm import joinedload
-    
-    enrollments = db.query(models.Enrollment).options(
-        joinedload(models.Enrollment.course)
-    ).all()
-    
-    if format == "csv":
-        output = io.StringIO()
-        writer = csv.writer(output)
-        
-        # CSV表头
-        writer.writerow([
+    """导出注册数据（流式输出）"""
+    from sqlalchemy import select
+    
+    statement = select(
+        models.Enrollment.id, models.Enrollment.user_id, models.Enrollment.course_id,
+        models.Course.title.label("course_title"), models.Enrollment.progress,
+        models.Enrollment.completed_lessons, models.Enrollment.total_watch_time,
+        models.Enrollment.enrolled_at, models.Enrollment.completed_at
+    ).outerjoin(
+        models.Course, models.Course.id == models.Enrollment.course_id
+    ).order_by(models.Enrollment.id)
+    
+    return export_response(
+        statement, format, "enrollments",
+        csv_header=[
             "ID", "用户ID", "课程ID", "课程标题", "学习进度(%)", 
             "已完成课时", "总观看时长(小时)", "注册时间", "完成时间"
-        ])
-        
-        # 数据行
-        for enrollment in enrollments:
-            writer.writerow([
-                enrollment.id, enrollment.user_id, enrollment.course_id,
-                enrollment.course.title if enrollment.course else "",
-                round(enrollment.progress * 100, 2) if enrollment.progress else 0,
-                enrollment.completed_lessons or 0,
-                round((enrollment.total_watch_time or 0) / 3600, 2),
-                enrollment.enrolled_at.strftime("%Y-%m-%d %H:%M:%S") if enrollment.enrolled_at else "",
-                enrollment.completed_at.strftime("%Y-%m-%d %H:%M:%S") if enrollment.completed_at else ""
-            ])
-        
-        output.seek(0)
-        
-        return StreamingResponse(
-            io.BytesIO(output.getvalue().encode('utf-8-sig')),
-            media_type="text/csv",
-            headers={"Content-Disposition": f"attachment; filename=enrollments_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"}
-        )
-    
-    else:  # JSON格式
-        enrollment_data = []
-        for enrollment in enrollments:
-            enrollment_data.append({
-                "id": enrollment.id,
-                "user_id": enrollment.user_id,
-                "course_id": enrollment.course_id,
-                "course_title": enrollment.course.title if enrollment.course else None,
-                "progress": enrollment.progress,
-                "completed_lessons": enrollment.completed_lessons,
-                "total_watch_time": enrollment.total_watch_time,
-                "enrolled_at": enrollment.enrolled_at.isoformat() if enrollment.enrolled_at else None,
-                "completed_at": enrollment.completed_at.isoformat() if enrollment.completed_at else None
-            })
-        
-        return enrollment_data
+        ],
+        to_csv_row=lambda enrollment: [
+            enrollment.id, enrollment.user_id, enrollment.course_id,
+            enrollment.course_title or "",
+            round(enrollment.progress * 100, 2) if enrollment.progress else 0,
+            enrollment.completed_lessons or 0,
+            round((enrollment.total_watch_time or 0) / 3600, 2),
+            format_datetime(enrollment.enrolled_at),
+            format_datetime(enrollment.completed_at)
+        ],
+        to_record=lambda enrollment: {
+            "id": enrollment.id,
+            "user_id": enrollment.user_id,
+            "course_id": enrollment.course_id,
+            "course_title": enrollment.course_title,
+            "progress": enrollment.progress,
+            "completed_lessons": enrollment.completed_lessons,
+            "total_watch_time": enrollment.total_watch_time,
+            "enrolled_at": enrollment.enrolled_at,
+            "completed_at": enrollment.completed_at
+        },
+        gzip=gzip
+    )
 
 # ====== 系统管理 ======
 
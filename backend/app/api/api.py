@@ -3,7 +3,7 @@
 """
 from fastapi import APIRouter
 
-from app.api import users, auth, consultations, courses, experts, admin, orders, diagnosis, upload, system, draft_orders, products_simple, simple_orders, cart, wechat_pay, shipping
+from app.api import users, auth, consultations, courses, experts, admin, orders, diagnosis, upload, system, draft_orders, products_simple, simple_orders, cart, wechat_pay, shipping, video
 
 api_router = APIRouter()
 
@@ -18,6 +18,7 @@ api_router.include_router(auth.router, prefix="/auth", tags=["auth"])
 api_router.include_router(users.router, prefix="/users", tags=["users"])
 api_router.include_router(consultations.router, prefix="/consultations", tags=["consultations"])
 api_router.include_router(courses.router, prefix="/courses", tags=["courses"])
+api_router.include_router(video.router, prefix="/video")
 api_router.include_router(experts.router, prefix="/experts", tags=["experts"])
 api_router.include_router(admin.router, prefix="/admin", tags=["admin"])
 api_router.include_router(products_simple.router, tags=["products-simple"])
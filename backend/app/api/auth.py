@@ -2,19 +2,21 @@
 认证相关API路由
 """
 from fastapi import APIRouter, Depends, status, Request
+from fastapi.security import HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
 from datetime import datetime, timezone
 import json
 
 from app import models
 from app.models.user import UserRole, UserStatus
-from app.schemas.user import UserRegister, UserLogin, Token, User
+from app.schemas.user import UserRegister, UserLogin, Token, TokenRefresh, User
 from app.database import get_db
+from app.core.permissions import security, verify_token
 from app.core.security import (
     get_password_hash, 
-    verify_password, 
-    create_access_token
+    verify_password_and_update_async
 )
+from app.services.token_service import issue_token_pair, revoke_access_token, rotate_refresh_token
 from app.core.validation import (
     validate_password_strength,
     validate_email,
@@ -24,6 +26,7 @@ from app.core.validation import (
     sanitize_string
 )
 from app.core.exceptions import (
+    AuthenticationException,
     NotFoundException, 
     BusinessException, 
     ValidationException, 
@@ -129,8 +132,16 @@ async def _login_handler(request: Request, db: Session):
     else:
         user = db.query(models.User).filter(models.User.username == username).first()
 
-    # 验证用户和密码
-    if not user or not verify_password(password, user.hashed_password):
+    # 验证用户和密码（bcrypt 在专用线程池中计算，排队已满时返回503）
+    if not user:
+        return ApiResponse.error("用户名或密码错误", 401)
+
+    # 等待哈希计算前结束只读事务、归还数据库连接，避免登录洪峰占满连接池
+    hashed_password = user.hashed_password
+    db.rollback()
+
+    password_ok, new_hash = await verify_password_and_update_async(password, hashed_password)
+    if not password_ok:
         return ApiResponse.error("用户名或密码错误", 401)
 
     # 检查用户状态
@@ -143,19 +154,23 @@ async def _login_handler(request: Request, db: Session):
     if user.status.value == "SUSPENDED":
         return ApiResponse.error("账户已被暂停", 403)
 
-    # 更新最后登录时间
+    # 更新最后登录时间；哈希参数已调整时顺便保存新哈希
     user.last_login = datetime.now(timezone.utc)
-    db.commit()
+    if new_hash:
+        user.hashed_password = new_hash
 
-    # 创建访问令牌
-    access_token = create_access_token(data={"sub": user.email, "user_id": user.id})
+    # 签发令牌对（在提交前读取用户字段，提交后不再触发重新加载、占用连接）
+    tokens = issue_token_pair(user)
+    user_data = user_to_dict(user)
+    db.commit()
 
     # 返回简单清晰的数据
     return ApiResponse.success({
-        "token": access_token,
+        "token": tokens["access_token"],
+        "refresh_token": tokens["refresh_token"],
         "token_type": "bearer",
-        "expires_in": 24 * 60 * 60,  # 24小时，单位秒
-        "user": user_to_dict(user)
+        "expires_in": tokens["expires_in"],
+        "user": user_data
     }, "登录成功")
 
 @router.post("/login")
@@ -166,4 +181,31 @@ async def login(request: Request, db: Session = Depends(get_db)):
 @router.post("/simple-login")
 async def simple_login(request: Request, db: Session = Depends(get_db)):
     """简单登录接口 - 无Pydantic验证���向后兼容）"""
-    return await _login_handler(request, db)
\ No newline at end of file
+    return await _login_handler(request, db)
+
+@router.post("/refresh")
+def refresh_token(token_data: TokenRefresh, db: Session = Depends(get_db)):
+    """用刷新令牌换取新的令牌对（刷新令牌只能使用一次，每次都会轮换）"""
+    from app.core.response import ApiResponse
+
+    try:
+        tokens = rotate_refresh_token(db, token_data.refresh_token)
+    except AuthenticationException as e:
+        return ApiResponse.error(e.detail, 401)
+
+    return ApiResponse.success({
+        "token": tokens["access_token"],
+        "refresh_token": tokens["refresh_token"],
+        "token_type": "bearer",
+        "expires_in": tokens["expires_in"]
+    }, "令牌已刷新")
+
+@router.post("/logout")
+def logout(credentials: HTTPAuthorizationCredentials = Depends(security), db: Session = Depends(get_db)):
+    """退出登录：当前会话的访问令牌和刷新令牌全部失效"""
+    from app.core.response import ApiResponse
+
+    payload = verify_token(credentials.credentials)
+    if payload:
+        revoke_access_token(db, payload)
+    return ApiResponse.success(None, "已退出登录")
@@ -2,16 +2,18 @@
 购物车API - 完整的后端购物车实现
 """
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
+from sqlalchemy import select
+from sqlalchemy.orm import Session, selectinload
+from typing import List, Optional
 from decimal import Decimal
 
 from app.database import get_db
 from app.models.cart import Cart, CartItem
 from app.models.product import Product
 from app.models.user import User
-from app.schemas.cart import CartItemCreate, CartItemUpdate, CartResponse, CartItemResponse
+from app.schemas.cart import CartItemCreate, CartItemUpdate, CartSync, CartResponse, CartItemResponse
 from app.core.permissions import get_current_user
+from app.core.cart_cache import cart_cache
 
 router = APIRouter(prefix="/cart", tags=["cart"])
 
@@ -27,26 +29,19 @@ def get_or_create_cart(user_id: int, db: Session) -> Cart:
     return cart
 
 
-@router.get("/")
-def get_cart(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
-):
-    """获取当前用户的购物车"""
-    cart = get_or_create_cart(current_user.id, db)
-
-    # 计算总价和总数量
-    total_items = sum(item.quantity for item in cart.items)
+def _serialize_cart(cart: Optional[Cart], user_id: int) -> dict:
+    """组装购物车响应，一次遍历同时计算总数量和总价（已删除的商品不展示也不计入）"""
+    total_items = 0
     total_price = Decimal('0.00')
-
-    # 组装商品信息
     items_with_products = []
-    for item in cart.items:
+
+    for item in cart.items if cart else []:
         product = item.product
         if product and not product.is_deleted:
             # 使用当前价格计算（也可以用price_snapshot）
             current_price = Decimal(str(product.price))
             total_price += current_price * item.quantity
+            total_items += item.quantity
 
             # 直接构造字典，不经过Pydantic验证
             item_data = {
@@ -71,16 +66,129 @@ def get_cart(
 
     # 直接返回字典，绕过Pydantic
     return {
-        'id': cart.id,
-        'user_id': cart.user_id,
+        'id': cart.id if cart else None,
+        'user_id': user_id,
         'items': items_with_products,
         'total_items': total_items,
         'total_price': str(total_price),
-        'created_at': cart.created_at.isoformat(),
-        'updated_at': cart.updated_at.isoformat()
+        'created_at': cart.created_at.isoformat() if cart else None,
+        'updated_at': cart.updated_at.isoformat() if cart else None
     }
 
 
+def load_cart(user_id: int, db: Session) -> dict:
+    """
+    查询并组装购物车：购物车一次查询，明细连同商品一次查询，查询次数与商品数无关
+    用户还没有购物车时返回空购物车，读取不写库
+    """
+    cart = db.scalar(
+        select(Cart)
+        .where(Cart.user_id == user_id)
+        .options(selectinload(Cart.items).joinedload(CartItem.product))
+    )
+    return _serialize_cart(cart, user_id)
+
+
+@router.get("/")
+def get_cart(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """获取当前用户的购物车"""
+    return cart_cache.resolve(current_user.id, lambda: load_cart(current_user.id, db))
+
+
+@router.put("/")
+def sync_cart(
+    sync_data: CartSync,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    批量同步购物车，一个事务内完成并返回新的购物车
+    replace: 请求中的商品即完整购物车，未列出的商品删除；delta: 在现有数量上增减，减到0删除
+    新增或数量增加的商品一次查询校验存在性和库存，任一不满足时整个请求不生效
+    """
+    requested = {}
+    for item in sync_data.items:
+        if sync_data.mode == "replace" and item.quantity < 0:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="商品数量不能为负数"
+            )
+        requested[item.product_id] = requested.get(item.product_id, 0) + item.quantity
+
+    cart = db.scalar(
+        select(Cart).where(Cart.user_id == current_user.id).options(selectinload(Cart.items))
+    )
+    if not cart:
+        cart = Cart(user_id=current_user.id)
+        db.add(cart)
+        db.flush()
+    current = {item.product_id: item for item in cart.items}
+
+    # 计算目标数量
+    if sync_data.mode == "replace":
+        target = {product_id: quantity for product_id, quantity in requested.items() if quantity > 0}
+    else:
+        target = {product_id: item.quantity for product_id, item in current.items()}
+        for product_id, delta in requested.items():
+            target[product_id] = target.get(product_id, 0) + delta
+        target = {product_id: quantity for product_id, quantity in target.items() if quantity > 0}
+
+    # 校验新增或数量增加的商品
+    increased = [
+        product_id for product_id, quantity in target.items()
+        if product_id not in current or quantity > current[product_id].quantity
+    ]
+    products = {}
+    if increased:
+        products = {
+            product.id: product for product in db.scalars(
+                select(Product).where(Product.id.in_(increased), Product.is_deleted == False)
+            )
+        }
+    for product_id in increased:
+        product = products.get(product_id)
+        if not product:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"商品 {product_id} 不存在"
+            )
+        if product.stock_quantity < target[product_id]:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"{product.name} 库存不足，当前库存：{product.stock_quantity}"
+            )
+
+    # 应用差异
+    for product_id, cart_item in current.items():
+        if product_id not in target:
+            db.delete(cart_item)
+        elif cart_item.quantity != target[product_id]:
+            cart_item.quantity = target[product_id]
+    for product_id, quantity in target.items():
+        if product_id not in current:
+            db.add(CartItem(
+                cart_id=cart.id,
+                product_id=product_id,
+                quantity=quantity,
+                price_snapshot=products[product_id].price
+            ))
+
+    try:
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"同步购物车失败: {str(e)}"
+        )
+
+    cart_cache.invalidate(current_user.id)
+    return get_cart(db, current_user)
+
+
 @router.post("/items")
 def add_to_cart(
     item_data: CartItemCreate,
@@ -146,6 +254,8 @@ def add_to_cart(
             detail=f"��加到购物车失败: {str(e)}"
         )
 
+    cart_cache.invalidate(current_user.id)
+
     # 返回完整购物车
     return get_cart(db, current_user)
 
@@ -195,6 +305,7 @@ def update_cart_item(
             detail=f"更新购物车失败: {str(e)}"
         )
 
+    cart_cache.invalidate(current_user.id)
     return get_cart(db, current_user)
 
 
@@ -230,6 +341,7 @@ def remove_from_cart(
             detail=f"删除失败: {str(e)}"
         )
 
+    cart_cache.invalidate(current_user.id)
     return get_cart(db, current_user)
 
 
@@ -253,4 +365,5 @@ def clear_cart(
             detail=f"清空购物车失败: {str(e)}"
         )
 
+    cart_cache.invalidate(current_user.id)
     return {"message": "购物车已清空"}
@@ -1,16 +1,31 @@
 """
 诊断系统API接口
 """
-from fastapi import APIRouter, Depends, HTTPException, Request
+import json
+import os
+import tempfile
+import uuid
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from sqlalchemy.orm import Session
-from typing import List, Dict
+from starlette.background import BackgroundTask
+from typing import List, Dict, Iterator, Optional
 from pydantic import BaseModel
 
 from ..database import get_db
+from ..core.payload_cache import payload_cache
+from ..core.permissions import check_resource_ownership, get_current_active_user, resolve_principal, verify_token
+from ..core.revocation_store import revocation_store
+from ..core.upload_stream import UploadEmptyError, UploadTooLargeError, save_stream
 from ..diagnosis.insomnia_diagnosis_engine import InsomniaDiagnosisEngine
 from ..diagnosis.insomnia_questionnaire import InsomniaQuestionnaire
+from ..diagnosis.spec_engine import CompiledDiagnosis, convert_answers, spec_registry
 from ..knowledge.insomnia_knowledge import InsomniaKnowledgeBase
 from ..models.insomnia_models import Symptoms
+from ..models.diagnosis_record import DiagnosisRecord
+from ..models.user import User
+from ..services.diagnosis_recorder import new_record_id, record_diagnosis, utc_now
 
 router = APIRouter(prefix="/diagnosis", tags=["诊断系统"])
 
@@ -48,168 +63,301 @@ questionnaire = InsomniaQuestionnaire()
 knowledge_base = InsomniaKnowledgeBase()
 # 版本: 2.1 - 添加了布局信息
 
+# 问卷内容变更时递增，预编码缓存按版本重建
+INSOMNIA_QUESTIONNAIRE_VERSION = "2.0"
+
+# 选项标签到选项值的映射（题号 -> {标签: 值}），启动时构建一次
+INSOMNIA_OPTION_VALUES: Dict[int, Dict[str, str]] = {
+    q.id: {opt.label: opt.value for opt in q.options}
+    for q in questionnaire.get_questions()
+}
+
+
+def _convert_insomnia_answers(answers: List[dict]) -> Dict:
+    """把前端答案（选项标签）转换为诊断引擎需要的格式（题号字符串 -> 选项值或选项值列表）"""
+    answers_dict = {}
+    for answer_data in answers:
+        question_id = int(answer_data['question_id'])
+        selected_options = answer_data.get('selected_options', [])
+
+        # 转换标签为值；找不到映射时直接使用原值（可能已经是正确格式）
+        option_values = INSOMNIA_OPTION_VALUES.get(question_id)
+        if option_values is not None:
+            converted_options = [option_values.get(label, label) for label in selected_options]
+        else:
+            converted_options = selected_options
+
+        # 单选题或是非题取单个值，多选题保留列表，未选择为空列表
+        if len(converted_options) == 1:
+            answers_dict[str(question_id)] = converted_options[0]
+        elif len(converted_options) > 1:
+            answers_dict[str(question_id)] = converted_options
+        else:
+            answers_dict[str(question_id)] = []
+    return answers_dict
+
+
+def _format_insomnia_result(diagnosis_result) -> dict:
+    """诊断结果的接口返回格式"""
+    return {
+        # 基础信息
+        'base_score': diagnosis_result.base_score,
+        'insomnia_level': diagnosis_result.level.value,
+        'syndrome_type': diagnosis_result.syndrome.value,
+        'confidence_score': diagnosis_result.confidence,
+
+        # 详细得分
+        'detailed_scores': {
+            'liver_intestine': diagnosis_result.syndrome_scores.liver_intestine,
+            'blood': diagnosis_result.syndrome_scores.blood,
+            'neural': diagnosis_result.syndrome_scores.neural,
+            'bone_marrow': diagnosis_result.syndrome_scores.bone_marrow,
+            'brain_marrow': diagnosis_result.syndrome_scores.brain_marrow
+        },
+
+        # 治疗方案
+        'treatment_plan': diagnosis_result.treatment_plan,
+    }
+
+
+optional_bearer = HTTPBearer(auto_error=False)
+
+
+def _token_email(credentials: Optional[HTTPAuthorizationCredentials]) -> Optional[str]:
+    """诊断接口允许匿名访问；带了有效token时取出用户邮箱，用于关联诊断记录（不查数据库）"""
+    if credentials is None:
+        return None
+    payload = verify_token(credentials.credentials)
+    if not payload or payload.get("type", "access") != "access" or revocation_store.is_revoked(payload):
+        return None
+    return payload.get("sub")
+
+
+def _enqueue_diagnosis_record(
+    disease: str,
+    result_fields: Dict,
+    answers_dict: Dict,
+    patient_id: Optional[str],
+    source: str,
+    user_email: Optional[str]
+) -> Dict:
+    """
+    把诊断结果放入后台写入队列，返回记录ID和诊断时间
+    未开启诊断记录或队列已满未能记录时，记录ID为 None
+    """
+    record_id = new_record_id()
+    created_at = utc_now()
+    recorded = record_diagnosis({
+        'id': record_id,
+        'disease': disease,
+        'user_email': user_email,
+        'patient_id': patient_id,
+        'source': source,
+        **result_fields,
+        'answers': answers_dict,
+        'created_at': created_at
+    })
+    return {
+        'record_id': record_id if recorded else None,
+        'timestamp': created_at.isoformat().replace('+00:00', 'Z')
+    }
+
+
+def _record_insomnia_diagnosis(
+    diagnosis_result,
+    answers_dict: Dict,
+    patient_id: Optional[str],
+    source: str,
+    user_email: Optional[str]
+) -> Dict:
+    return _enqueue_diagnosis_record('insomnia', {
+        'base_score': diagnosis_result.base_score,
+        'level': diagnosis_result.level.value,
+        'syndrome': diagnosis_result.syndrome.value,
+        'confidence': diagnosis_result.confidence,
+        'syndrome_scores': {
+            'liver_intestine': diagnosis_result.syndrome_scores.liver_intestine,
+            'blood': diagnosis_result.syndrome_scores.blood,
+            'neural': diagnosis_result.syndrome_scores.neural,
+            'bone_marrow': diagnosis_result.syndrome_scores.bone_marrow,
+            'brain_marrow': diagnosis_result.syndrome_scores.brain_marrow
+        },
+        'treatment_plan': diagnosis_result.treatment_plan
+    }, answers_dict, patient_id, source, user_email)
+
 
 @router.get("/diseases")
 async def get_diseases():
     """获取支持的疾病类型"""
     return {
-        "diseases": [
-            {"code": "insomnia", "name": "失眠", "status": "active"},
-            {"code": "stomach", "name": "胃病", "status": "active"},
-            {"code": "aging", "name": "早衰", "status": "active"}
+        "diseases": [{"code": "insomnia", "name": "失眠", "status": "active"}] + [
+            {"code": diagnosis.key, "name": diagnosis.name, "status": "active"}
+            for diagnosis in spec_registry.all()
         ]
     }
 
 
 
-@router.get("/insomnia/questionnaire")
-async def get_insomnia_questionnaire():
-    """获取19题失眠问诊问卷"""
-    try:
-        questions = questionnaire.get_questions()
-        # 转换为API返回格式，添加美化信息
-        formatted_questions = []
-        for i, q in enumerate(questions):
-            # 判断问题类型的显示名称
-            type_display = {
-                "single": "单选题",
-                "multiple": "多选题", 
-                "yes_no": "是非题"
-            }.get(q.type, "单选题")
-            
-            # 添加问题序号和美化格式
-            question_number = f"第{i+1}题"
-            
-            # 为不同类型的问题添加不同的样式类
-            css_class = {
-                "基础评分": "basic-question",
-                "肝肠证型": "liver-question", 
-                "血液证型": "blood-question",
-                "神内证型": "neural-question",
-                "骨髓证型": "bone-question",
-                "脑髓证型": "brain-question"
-            }.get(q.category, "default-question")
-            
-            # 确定每行显示的选项数量
-            options_per_row = 3 if len(q.options) >= 3 else len(q.options)
-            if q.type == "yes_no":
-                options_per_row = 2  # 是非题只有两个选项
-            elif len(q.options) == 4:
-                options_per_row = 2  # 4个选项时每行显示2个
-            elif len(q.options) >= 5:
-                options_per_row = 3  # 5个或更多选项时每行显示3个
-            
-            formatted_question = {
-                "id": q.id,
-                "number": question_number,
-                "text": q.text,
-                "type": q.type,
-                "type_display": type_display,
-                "category": q.category,
-                "css_class": css_class,
-                "required": q.required,
-                "options": [
-                    {
-                        "value": opt.value, 
-                        "label": opt.label, 
-                        "score": opt.score,
-                        "display": f"{opt.value}. {opt.label}"
-                    } for opt in q.options
-                ],
-                # 添加布局信息
-                "layout": {
-                    "question_alignment": "center",
-                    "options_per_row": options_per_row,
-                    "option_alignment": "left",
-                    "show_question_number": True
-                },
-                # 添加问题提示信息
-                "hint": _get_question_hint(i+1, q.category, q.type)
-            }
-            formatted_questions.append(formatted_question)
+def _build_insomnia_questionnaire() -> dict:
+    """构建19题失眠问卷的完整返回数据（只在每个问卷版本首次请求时执行）"""
+    questions = questionnaire.get_questions()
+    # 转换为API返回格式，添加美化信息
+    formatted_questions = []
+    for i, q in enumerate(questions):
+        # 判断问题类型的显示名称
+        type_display = {
+            "single": "单选题",
+            "multiple": "多选题", 
+            "yes_no": "是非题"
+        }.get(q.type, "单选题")
         
-        # 返回问卷和概要信息
-        summary = questionnaire.get_questionnaire_summary()
+        # 添加问题序号和美化格式
+        question_number = f"第{i+1}题"
         
-        # 按分组整理问题
-        question_groups = [
-            {
-                "group_id": 1,
-                "group_name": "基础睡眠评估",
-                "group_description": "评估您的基础睡眠状况，计算失眠严重程度",
-                "questions": [q for q in formatted_questions if q["category"] == "基础评分"],
-                "icon": "🛏️",
-                "color": "#4A90E2"
-            },
-            {
-                "group_id": 2, 
-                "group_name": "中医证型分析",
-                "group_description": "根据中医理论分析您的体质特点和证型",
-                "questions": [q for q in formatted_questions if q["category"] != "基础评分"],
-                "icon": "⚗️",
-                "color": "#7ED321"
-            }
-        ]
+        # 为不同类型的问题添加不同的样式类
+        css_class = {
+            "基础评分": "basic-question",
+            "肝肠证型": "liver-question", 
+            "血液证型": "blood-question",
+            "神内证型": "neural-question",
+            "骨髓证型": "bone-question",
+            "脑髓证型": "brain-question"
+        }.get(q.category, "default-question")
         
-        return {
-            "success": True,
-            "data": {
-                "questions": formatted_questions,
-                "question_groups": question_groups,
-                "total": len(formatted_questions),
-                "summary": summary,
-                "questionnaire_info": {
-                    "title": "失眠中医辨证问卷",
-                    "subtitle": "基于19题专业失眠评估系统", 
-                    "version": "2.0",
-                    "description": "结合现代医学和传统中医理论的综合性失眠诊断问卷",
-                    "estimated_time": "8-10分钟",
-                    "total_questions": len(formatted_questions)
+        # 确定每行显示的选项数量
+        options_per_row = 3 if len(q.options) >= 3 else len(q.options)
+        if q.type == "yes_no":
+            options_per_row = 2  # 是非题只有两个选项
+        elif len(q.options) == 4:
+            options_per_row = 2  # 4个选项时每行显示2个
+        elif len(q.options) >= 5:
+            options_per_row = 3  # 5个或更多选项时每行显示3个
+        
+        formatted_question = {
+            "id": q.id,
+            "number": question_number,
+            "text": q.text,
+            "type": q.type,
+            "type_display": type_display,
+            "category": q.category,
+            "css_class": css_class,
+            "required": q.required,
+            "options": [
+                {
+                    "value": opt.value, 
+                    "label": opt.label, 
+                    "score": opt.score,
+                    "display": f"{opt.value}. {opt.label}"
+                } for opt in q.options
+            ],
+            # 添加布局信息
+            "layout": {
+                "question_alignment": "center",
+                "options_per_row": options_per_row,
+                "option_alignment": "left",
+                "show_question_number": True
+            },
+            # 添加问题提示信息
+            "hint": _get_question_hint(i+1, q.category, q.type)
+        }
+        formatted_questions.append(formatted_question)
+    
+    # 返回问卷和概要信息
+    summary = questionnaire.get_questionnaire_summary()
+    
+    # 按分组整理问题
+    question_groups = [
+        {
+            "group_id": 1,
+            "group_name": "基础睡眠评估",
+            "group_description": "评估您的基础睡眠状况，计算失眠严重程度",
+            "questions": [q for q in formatted_questions if q["category"] == "基础评分"],
+            "icon": "🛏️",
+            "color": "#4A90E2"
+        },
+        {
+            "group_id": 2, 
+            "group_name": "中医证型分析",
+            "group_description": "根据中医理论分析您的体质特点和证型",
+            "questions": [q for q in formatted_questions if q["category"] != "基础评分"],
+            "icon": "⚗️",
+            "color": "#7ED321"
+        }
+    ]
+    
+    return {
+        "success": True,
+        "data": {
+            "questions": formatted_questions,
+            "question_groups": question_groups,
+            "total": len(formatted_questions),
+            "summary": summary,
+            "questionnaire_info": {
+                "title": "失眠中医辨证问卷",
+                "subtitle": "基于19题专业失眠评估系统", 
+                "version": INSOMNIA_QUESTIONNAIRE_VERSION,
+                "description": "结合现代医学和传统中医理论的综合性失眠诊断问卷",
+                "estimated_time": "8-10分钟",
+                "total_questions": len(formatted_questions)
+            },
+            "layout_config": {
+                "question_container": {
+                    "alignment": "center",
+                    "max_width": "800px",
+                    "margin": "0 auto",
+                    "padding": "20px"
                 },
-                "layout_config": {
-                    "question_container": {
-                        "alignment": "center",
-                        "max_width": "800px",
-                        "margin": "0 auto",
-                        "padding": "20px"
-                    },
-                    "question_title": {
-                        "text_align": "center",
-                        "font_weight": "bold",
-                        "margin_bottom": "15px"
-                    },
-                    "options_container": {
-                        "display": "grid",
-                        "grid_template_columns": "repeat(auto-fit, minmax(200px, 1fr))",
-                        "gap": "10px",
-                        "justify_items": "start",
-                        "margin_top": "10px"
-                    },
-                    "option_item": {
-                        "display": "flex",
-                        "align_items": "center",
-                        "padding": "8px 12px",
-                        "border_radius": "6px",
-                        "cursor": "pointer",
-                        "transition": "all 0.2s ease"
-                    }
+                "question_title": {
+                    "text_align": "center",
+                    "font_weight": "bold",
+                    "margin_bottom": "15px"
                 },
-                "instructions": [
-                    "请根据您最近一个月的实际情况如实回答",
-                    "每道题目都有相应的提示信息帮助您理解", 
-                    "前8题为基础评估（第9题不参与评分），后10题为中医证型分析",
-                    "第1题选择'好'将直接完成测评并给出祝福",
-                    "第8题选择'无'将跳过第9题，第9题选择'3个月以上'将建议专业咨询"
-                ]
-            }
+                "options_container": {
+                    "display": "grid",
+                    "grid_template_columns": "repeat(auto-fit, minmax(200px, 1fr))",
+                    "gap": "10px",
+                    "justify_items": "start",
+                    "margin_top": "10px"
+                },
+                "option_item": {
+                    "display": "flex",
+                    "align_items": "center",
+                    "padding": "8px 12px",
+                    "border_radius": "6px",
+                    "cursor": "pointer",
+                    "transition": "all 0.2s ease"
+                }
+            },
+            "instructions": [
+                "请根据您最近一个月的实际情况如实回答",
+                "每道题目都有相应的提示信息帮助您理解", 
+                "前8题为基础评估（第9题不参与评分），后10题为中医证型分析",
+                "第1题选择'好'将直接完成测评并给出祝福",
+                "第8题选择'无'将跳过第9题，第9题选择'3个月以上'将建议专业咨询"
+            ]
         }
+    }
+
+
+@router.get("/insomnia/questionnaire")
+async def get_insomnia_questionnaire(request: Request):
+    """获取19题失眠问诊问卷（预编码缓存，支持 ETag / 304）"""
+    try:
+        payload = payload_cache.get(
+            ("insomnia_questionnaire", INSOMNIA_QUESTIONNAIRE_VERSION),
+            _build_insomnia_questionnaire
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取问卷失败: {str(e)}")
+    return payload.response(request)
 
 
 @router.api_route("/insomnia/analyze", methods=["POST"])  
-async def analyze_insomnia(request: Request):
-    """失眠诊断分析 - 使用19题问卷的精确诊断逻辑"""
+async def analyze_insomnia(
+    request: Request,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_bearer)
+):
+    """失眠诊断分析 - 使用19题问卷的精确诊断逻辑（结果由后台队列写入诊断记录）"""
     try:
         # 解析请求数据
         body = await request.body()
@@ -223,77 +371,23 @@ async def analyze_insomnia(request: Request):
             }
         
         # 将前端答案格式转换为诊断引擎需要的格式
-        answers_dict = {}
-        
-        # 获取问卷数据以建立标签到值的映射
-        questions = questionnaire.get_questions()
-        label_to_value_mapping = {}
-        
-        # 为每个问题创建标签到值的映射
-        for q in questions:
-            label_to_value_mapping[q.id] = {}
-            for opt in q.options:
-                label_to_value_mapping[q.id][opt.label] = opt.value
-        
-        for answer_data in data['answers']:
-            question_id = int(answer_data['question_id'])
-            selected_options = answer_data.get('selected_options', [])
-            
-            # 转换标签为值
-            converted_options = []
-            if question_id in label_to_value_mapping:
-                for selected_label in selected_options:
-                    if selected_label in label_to_value_mapping[question_id]:
-                        converted_options.append(label_to_value_mapping[question_id][selected_label])
-                    else:
-                        # 如果找不到映射，直接使用原值（可能已经是正确格式）
-                        converted_options.append(selected_label)
-            else:
-                converted_options = selected_options
-            
-            question_id_str = str(question_id)
-            
-            # 处理不同类型的问题
-            if len(converted_options) == 1:
-                # 单选题或是非题
-                answers_dict[question_id_str] = converted_options[0]
-            elif len(converted_options) > 1:
-                # 多选题
-                answers_dict[question_id_str] = converted_options
-            else:
-                # 未选择
-                answers_dict[question_id_str] = []
+        answers_dict = _convert_insomnia_answers(data['answers'])
         
         # 使用新的失眠诊断引擎进行分析
         diagnosis_result = InsomniaDiagnosisEngine.analyze_questionnaire(answers_dict)
+        patient_id = data.get('patient_id', 'diagnosed_patient')
+        record = _record_insomnia_diagnosis(
+            diagnosis_result, answers_dict, patient_id, 'single', _token_email(credentials)
+        )
         
         # 返回完整的诊断结果
         return {
             'success': True,
             'data': {
-                'patient_id': data.get('patient_id', 'diagnosed_patient'),
-                'diagnosis_result': {
-                    # 基础信息
-                    'base_score': diagnosis_result.base_score,
-                    'insomnia_level': diagnosis_result.level.value,
-                    'syndrome_type': diagnosis_result.syndrome.value,
-                    'confidence_score': diagnosis_result.confidence,
-                    
-                    # 详细得分
-                    'detailed_scores': {
-                        'liver_intestine': diagnosis_result.syndrome_scores.liver_intestine,
-                        'blood': diagnosis_result.syndrome_scores.blood,
-                        'neural': diagnosis_result.syndrome_scores.neural,
-                        'bone_marrow': diagnosis_result.syndrome_scores.bone_marrow,
-                        'brain_marrow': diagnosis_result.syndrome_scores.brain_marrow
-                    },
-                    
-                    # 治疗方案
-                    'treatment_plan': diagnosis_result.treatment_plan,
-                    
-                    # 诊断描述已移除
-                },
-                'timestamp': '2024-01-01T00:00:00Z',
+                'patient_id': patient_id,
+                'record_id': record['record_id'],
+                'diagnosis_result': _format_insomnia_result(diagnosis_result),
+                'timestamp': record['timestamp'],
                 'processed_answers': len(data['answers'])
             }
         }
@@ -307,85 +401,304 @@ async def analyze_insomnia(request: Request):
         }
 
 
-@router.get("/insomnia/knowledge/syndromes")
-async def get_insomnia_syndromes():
-    """获取失眠证型知识"""
+# ==================== 批量诊断（NDJSON） ====================
+
+INSOMNIA_BATCH_SIZE = 256  # 每批计分的问卷数
+INSOMNIA_BATCH_MAX_BYTES = 50 * 1024 * 1024  # 请求体上限
+
+
+def _encode_ndjson(records: List[dict]) -> bytes:
+    return "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records).encode("utf-8")
+
+
+def _parse_batch_line(raw: bytes) -> dict:
+    """解析一行问卷：{"id": 可选, "patient_id": 可选, "answers": [...]}"""
+    item = json.loads(raw)
+    if not isinstance(item, dict) or not isinstance(item.get('answers'), list):
+        raise ValueError("缺少 answers 字段")
+    return item
+
+
+def _score_batch_items(items: List[dict], user_email: Optional[str] = None) -> List[dict]:
+    """对一批已解析的问卷计分；整批失败时逐份重试，单份出错不影响其他问卷"""
+    valid = [item for item in items if 'answers_dict' in item]
+    try:
+        results = InsomniaDiagnosisEngine.analyze_batch([item['answers_dict'] for item in valid])
+        for item, result in zip(valid, results):
+            item['result'] = result
+    except Exception:
+        for item in valid:
+            try:
+                item['result'] = InsomniaDiagnosisEngine.analyze_questionnaire(item['answers_dict'])
+            except Exception as e:
+                item['error'] = f"诊断分析失败: {str(e)}"
+
+    records = []
+    for item in items:
+        record = {'line': item['line'], 'id': item.get('id')}
+        if 'result' in item:
+            patient_id = item.get('patient_id') or 'diagnosed_patient'
+            saved = _record_insomnia_diagnosis(
+                item['result'], item['answers_dict'], patient_id, 'batch', user_email
+            )
+            record['success'] = True
+            record['data'] = {
+                'patient_id': patient_id,
+                'record_id': saved['record_id'],
+                'diagnosis_result': _format_insomnia_result(item['result']),
+                'processed_answers': item['answer_count']
+            }
+        else:
+            record['success'] = False
+            record['error'] = item['error']
+        records.append(record)
+    return records
+
+
+def _remove_if_exists(path: str):
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def _iter_batch_results(path: str, user_email: Optional[str] = None) -> Iterator[bytes]:
+    """
+    逐行读取已落盘的NDJSON问卷，按批计分并输出结果（同步生成器，由线程池驱动）
+    内存占用只与批大小有关，与上传的问卷数量无关
+    临时文件由响应的后台任务删除（客户端在输出开始前断开时生成器不会执行）
+    """
+    succeeded = failed = 0
+    with open(path, "rb") as source:
+        items = []
+        for line_number, raw in enumerate(source, 1):
+            if not raw.strip():
+                continue
+            item = {'line': line_number}
+            try:
+                parsed = _parse_batch_line(raw)
+                item['id'] = parsed.get('id')
+                item['patient_id'] = parsed.get('patient_id')
+                item['answer_count'] = len(parsed['answers'])
+                item['answers_dict'] = _convert_insomnia_answers(parsed['answers'])
+            except Exception as e:
+                item['error'] = f"问卷格式错误: {str(e)}"
+            items.append(item)
+
+            if len(items) >= INSOMNIA_BATCH_SIZE:
+                records = _score_batch_items(items, user_email)
+                succeeded += sum(1 for record in records if record['success'])
+                failed += sum(1 for record in records if not record['success'])
+                yield _encode_ndjson(records)
+                items = []
+
+        if items:
+            records = _score_batch_items(items, user_email)
+            succeeded += sum(1 for record in records if record['success'])
+            failed += sum(1 for record in records if not record['success'])
+            yield _encode_ndjson(records)
+
+    yield _encode_ndjson([{'summary': {'total': succeeded + failed, 'succeeded': succeeded, 'failed': failed}}])
+
+
+@router.post("/insomnia/analyze/batch")
+async def analyze_insomnia_batch(
+    request: Request,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_bearer)
+):
+    """
+    批量失眠诊断（合作机构批量录入 / 离线重新计分）
+
+    请求体为NDJSON，每行一份问卷: {"id": "可选的机构编号", "patient_id": "...", "answers": [...]}
+    返回NDJSON，每行一个结果（含行号，单份问卷出错只影响该行），最后一行为汇总。
+    请求体先流式写入临时文件，再边计分边输出，内存占用与问卷数量无关。
+    """
+    path = os.path.join(tempfile.gettempdir(), f"insomnia-batch-{uuid.uuid4().hex}.ndjson")
+    try:
+        await save_stream(request.stream(), path, INSOMNIA_BATCH_MAX_BYTES, hash_names=())
+    except UploadTooLargeError:
+        raise HTTPException(status_code=413, detail=f"批量数据过大，最大支持{INSOMNIA_BATCH_MAX_BYTES // (1024 * 1024)}MB")
+    except UploadEmptyError:
+        raise HTTPException(status_code=400, detail="请提供问卷数据")
+
+    return StreamingResponse(
+        _iter_batch_results(path, _token_email(credentials)),
+        media_type="application/x-ndjson",
+        background=BackgroundTask(_remove_if_exists, path)
+    )
+
+
+# ==================== 诊断记录 ====================
+
+def _format_diagnosis_record(record: DiagnosisRecord, include_details: bool = False) -> dict:
+    data = {
+        'record_id': record.id,
+        'disease': record.disease,
+        'patient_id': record.patient_id,
+        'source': record.source,
+        'base_score': record.base_score,
+        'level': record.level,
+        'syndrome': record.syndrome,
+        'confidence': record.confidence,
+        'created_at': record.created_at.isoformat() if record.created_at else None
+    }
+    if include_details:
+        data['syndrome_scores'] = record.syndrome_scores
+        data['treatment_plan'] = record.treatment_plan
+        data['answers'] = record.answers
+    return data
+
+
+@router.get("/records")
+def get_my_diagnosis_records(
+    disease: Optional[str] = Query(None, description="病种，如 insomnia"),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=100),
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """当前用户的诊断历史（按时间倒序）"""
+    query = db.query(DiagnosisRecord).filter(DiagnosisRecord.user_id == current_user.id)
+    if disease:
+        query = query.filter(DiagnosisRecord.disease == disease)
+    total = query.count()
+    records = query.order_by(DiagnosisRecord.created_at.desc()).offset(skip).limit(limit).all()
+    return {
+        'success': True,
+        'data': {
+            'total': total,
+            'items': [_format_diagnosis_record(record) for record in records]
+        }
+    }
+
+
+@router.get("/records/{record_id}")
+def get_diagnosis_record(
+    record_id: str,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_bearer),
+    db: Session = Depends(get_db)
+):
+    """
+    诊断记录详情
+    匿名诊断的记录凭记录ID查看；登录用户的记录只有本人和管理员可以查看。
+    记录由后台队列批量写入，诊断后稍有延迟（默认不超过 DIAGNOSIS_RECORD_FLUSH_MS）才能查到。
+    """
+    record = db.query(DiagnosisRecord).filter(DiagnosisRecord.id == record_id).first()
+    if record is None:
+        raise HTTPException(status_code=404, detail="诊断记录不存在")
+
+    if record.user_id is not None:
+        if credentials is None:
+            raise HTTPException(status_code=401, detail="请先登录")
+        current_user = resolve_principal(credentials.credentials, db)
+        check_resource_ownership(current_user, record.user_id)
+
+    return {'success': True, 'data': _format_diagnosis_record(record, include_details=True)}
+
+
+def _knowledge_response(request: Request, name: str, attribute: str, label: str):
+    """知识库内容只随部署变化：首次请求时编码为JSON字节并缓存，支持 ETag / 304"""
     try:
-        syndromes = knowledge_base.SYNDROME_PATTERNS
-        return {"syndromes": syndromes}
+        payload = payload_cache.get(
+            ("insomnia_knowledge", name),
+            lambda: {name: getattr(knowledge_base, attribute)}
+        )
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"获取证型知识失败: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"获取{label}失败: {str(e)}")
+    return payload.response(request)
+
+
+@router.get("/insomnia/knowledge/syndromes")
+async def get_insomnia_syndromes(request: Request):
+    """获取失眠证型知识"""
+    return _knowledge_response(request, "syndromes", "SYNDROME_PATTERNS", "证型知识")
 
 
 @router.get("/insomnia/knowledge/formulas")
-async def get_insomnia_formulas():
+async def get_insomnia_formulas(request: Request):
     """获取失眠方剂知识"""
-    try:
-        formulas = knowledge_base.CLASSICAL_FORMULAS
-        return {"formulas": formulas}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"获取方剂知识失败: {str(e)}")
+    return _knowledge_response(request, "formulas", "CLASSICAL_FORMULAS", "方剂知识")
 
 
 @router.get("/insomnia/knowledge/treatments")
-async def get_insomnia_treatments():
+async def get_insomnia_treatments(request: Request):
     """获取失眠外治法知识"""
-    try:
-        treatments = knowledge_base.EXTERNAL_TREATMENTS
-        return {"treatments": treatments}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"获取外治法知识失败: {str(e)}")
+    return _knowledge_response(request, "treatments", "EXTERNAL_TREATMENTS", "外治法知识")
 
 
 @router.get("/insomnia/knowledge/diet")
-async def get_insomnia_diet():
+async def get_insomnia_diet(request: Request):
     """获取失眠食疗知识"""
-    try:
-        diet = knowledge_base.DIET_THERAPY
-        return {"diet": diet}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"获取食疗知识失败: {str(e)}")
+    return _knowledge_response(request, "diet", "DIET_THERAPY", "食疗知识")
 
 
-# 胃病诊断接口
-@router.get("/stomach/questionnaire")
-async def get_stomach_questionnaire():
-    """获取胃病问诊问卷"""
-    return {"message": "胃病问卷系统初始化中", "questions": [], "total": 0}
+# ==================== 声明式问卷病种（胃病、早衰等，见 diagnosis/specs） ====================
+# 放在所有固定路由之后，/insomnia/* 等固定路径优先匹配
 
+def _get_spec_diagnosis(disease: str) -> CompiledDiagnosis:
+    diagnosis = spec_registry.get(disease)
+    if diagnosis is None:
+        raise HTTPException(status_code=404, detail=f"不支持的病种: {disease}")
+    return diagnosis
 
-@router.post("/stomach/analyze") 
-async def analyze_stomach(request: AnalyzeRequest, db: Session = Depends(get_db)):
-    """胃病诊断分析"""
-    try:
-        answers = request.answers
-        return {
-            "message": "胃病诊断系统初始化中", 
-            "diagnosis": {}, 
-            "status": "pending",
-            "received_answers": len(answers)
+
+def _build_spec_questionnaire(diagnosis: CompiledDiagnosis) -> dict:
+    questions = diagnosis.get_questionnaire()
+    return {
+        "success": True,
+        "disease": diagnosis.key,
+        "questions": questions,
+        "total": len(questions),
+        "questionnaire_info": {
+            "title": diagnosis.title,
+            "version": diagnosis.version,
+            "dimensions": [
+                {"key": key, "name": diagnosis.dimension_names[key]} for key in diagnosis.dimension_keys
+            ]
         }
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"胃病诊断分析失败: {str(e)}")
+    }
 
 
-# 早衰诊断接口
-@router.get("/aging/questionnaire")
-async def get_aging_questionnaire():
-    """获取早衰问诊问卷"""
-    return {"message": "早衰问卷系统初始化中", "questions": [], "total": 0}
+@router.get("/{disease}/questionnaire")
+async def get_spec_questionnaire(disease: str, request: Request):
+    """获取病种问诊问卷（胃病、早衰等；预编码缓存，支持 ETag / 304）"""
+    diagnosis = _get_spec_diagnosis(disease)
+    payload = payload_cache.get(
+        ("spec_questionnaire", diagnosis.key, diagnosis.version),
+        lambda: _build_spec_questionnaire(diagnosis)
+    )
+    return payload.response(request)
 
 
-@router.post("/aging/analyze")
-async def analyze_aging(request: AnalyzeRequest, db: Session = Depends(get_db)):
-    """早衰诊断分析"""
+@router.post("/{disease}/analyze")
+async def analyze_spec_disease(
+    disease: str,
+    request: AnalyzeRequest,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_bearer)
+):
+    """病种诊断分析（按问卷规格编译的计分表查表计分，结果由后台队列写入诊断记录）"""
+    diagnosis = _get_spec_diagnosis(disease)
     try:
-        answers = request.answers
-        return {
-            "message": "早衰诊断系统初始化中", 
-            "diagnosis": {}, 
-            "status": "pending",
-            "received_answers": len(answers)
-        }
+        answers_dict = convert_answers([answer.model_dump() for answer in request.answers])
+        result = diagnosis.analyze(answers_dict)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"早衰诊断分析失败: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"{diagnosis.name}诊断分析失败: {str(e)}")
+
+    patient_id = getattr(request, 'patient_id', None) or 'diagnosed_patient'
+    record = _enqueue_diagnosis_record(diagnosis.key, {
+        'base_score': round(result.total_score),
+        'level': result.level,
+        'syndrome': diagnosis.syndromes[result.syndrome]['name'],
+        'confidence': result.confidence,
+        'syndrome_scores': result.dimension_scores,
+        'treatment_plan': result.treatment_plan
+    }, answers_dict, patient_id, 'single', _token_email(credentials))
+
+    return {
+        'success': True,
+        'data': {
+            'patient_id': patient_id,
+            'record_id': record['record_id'],
+            'diagnosis_result': diagnosis.format_result(result),
+            'timestamp': record['timestamp'],
+            'processed_answers': len(request.answers)
+        }
+    }
@@ -2,13 +2,14 @@
 预订单API - 安全的checkout流程
 """
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 import logging
 from datetime import datetime, timedelta
 import uuid
 
-from app.database import get_db
+from app.database import get_async_db
 from app import models
 from app.core.permissions import get_current_user
 from pydantic import BaseModel
@@ -43,7 +44,7 @@ class DraftOrderDetailResponse(BaseModel):
 @router.post("/create", response_model=DraftOrderResponse)
 async def create_draft_order(
     request: CreateDraftOrderRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.User = Depends(get_current_user)
 ):
     """创建预订单"""
@@ -53,10 +54,10 @@ async def create_draft_order(
         total_amount = 0
         
         for item in request.items:
-            product = db.query(models.Product).filter(
+            product = await db.scalar(select(models.Product).where(
                 models.Product.id == item.product_id,
                 models.Product.is_deleted == False
-            ).first()
+            ))
             
             if not product:
                 raise HTTPException(status_code=404, detail=f"商品 {item.product_id} 不存在")
@@ -95,7 +96,7 @@ async def create_draft_order(
         )
         
         db.add(draft_order)
-        db.commit()
+        await db.commit()
         
         logger.info(f"Created draft order: {draft_order_id} for user {current_user.id}")
         
@@ -115,16 +116,16 @@ async def create_draft_order(
 @router.get("/{draft_order_id}", response_model=DraftOrderDetailResponse)
 async def get_draft_order(
     draft_order_id: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.User = Depends(get_current_user)
 ):
     """获取预订单详情"""
     try:
         # 查找预订单
-        draft_order = db.query(models.DraftOrder).filter(
+        draft_order = await db.scalar(select(models.DraftOrder).where(
             models.DraftOrder.id == draft_order_id,
             models.DraftOrder.user_id == current_user.id
-        ).first()
+        ))
         
         if not draft_order:
             raise HTTPException(status_code=404, detail="预订单不存在")
@@ -140,10 +141,10 @@ async def get_draft_order(
         current_total = 0
         
         for item in draft_order.items_json:
-            product = db.query(models.Product).filter(
+            product = await db.scalar(select(models.Product).where(
                 models.Product.id == item["product_id"],
                 models.Product.is_deleted == False
-            ).first()
+            ))
             
             if not product:
                 continue  # 商品可能已下架
@@ -179,16 +180,16 @@ async def get_draft_order(
 async def convert_draft_to_order(
     draft_order_id: str,
     customer_info: dict,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.User = Depends(get_current_user)
 ):
     """将预订单转换为正式订单"""
     try:
         # 获取预订单
-        draft_order = db.query(models.DraftOrder).filter(
+        draft_order = await db.scalar(select(models.DraftOrder).where(
             models.DraftOrder.id == draft_order_id,
             models.DraftOrder.user_id == current_user.id
-        ).first()
+        ))
         
         if not draft_order:
             raise HTTPException(status_code=404, detail="预订单不存在")
@@ -209,7 +210,7 @@ async def convert_draft_to_order(
         )
         
         db.add(order)
-        db.flush()  # 获取order.id
+        await db.flush()  # 获取order.id
         
         # 创建订单项
         for item in draft_order.items_json:
@@ -224,9 +225,9 @@ async def convert_draft_to_order(
             db.add(order_item)
         
         # 删除预订单
-        db.delete(draft_order)
+        await db.delete(draft_order)
         
-        db.commit()
+        await db.commit()
         
         logger.info(f"Converted draft order {draft_order_id} to order {order_number}")
         
@@ -245,21 +246,21 @@ async def convert_draft_to_order(
 @router.delete("/{draft_order_id}")
 async def cancel_draft_order(
     draft_order_id: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.User = Depends(get_current_user)
 ):
     """取消预订单"""
     try:
-        draft_order = db.query(models.DraftOrder).filter(
+        draft_order = await db.scalar(select(models.DraftOrder).where(
             models.DraftOrder.id == draft_order_id,
             models.DraftOrder.user_id == current_user.id
-        ).first()
+        ))
         
         if not draft_order:
             raise HTTPException(status_code=404, detail="预订单不存在")
         
-        db.delete(draft_order)
-        db.commit()
+        await db.delete(draft_order)
+        await db.commit()
         
         return {"success": True, "message": "预订单已取消"}
         
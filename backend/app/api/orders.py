@@ -19,7 +19,14 @@ from app.core.exceptions import (
     DatabaseException, 
     CommonErrors
 )
-from app.core.enums_v2 import ProductStatus, OrderStatus
+from app.core.enums_v2 import OrderStatus
+from app.services.inventory_service import (
+    merge_quantities,
+    reserve_stock,
+    add_reservations,
+    commit_reservations,
+    release_reservations
+)
 
 router = APIRouter(tags=["orders"])
 
@@ -68,21 +75,15 @@ def create_order(
     # 生成订单号
     order_number = f"TCM{datetime.now().strftime('%Y%m%d%H%M%S')}{str(uuid.uuid4())[:8].upper()}"
     
-    # 验证商品库存
+    # 一次查询全部商品，条件更新扣减库存（库存不足时整个事务回滚）
+    quantities = merge_quantities(order_data.items)
+    products = reserve_stock(db, quantities)
+
     total_amount = 0
     order_items = []
-    
-    for item_data in order_data.items:
-        product = db.query(models.Product).filter(
-            models.Product.id == item_data.product_id,
-            models.Product.status == ProductStatus.ACTIVE
-        ).first()
 
-        if not product:
-            raise CommonErrors.PRODUCT_NOT_FOUND
-
-        if product.stock_quantity < item_data.quantity:
-            raise CommonErrors.INSUFFICIENT_STOCK
+    for item_data in order_data.items:
+        product = products[item_data.product_id]
 
         # 始终使用产品表中的价格，忽略前端传的价格（防止篡改）
         unit_price = float(product.price)
@@ -127,12 +128,8 @@ def create_order(
         )
         db.add(order_item)
     
-    # 更新商品库存
-    for item_data in order_data.items:
-        product = db.query(models.Product).filter(
-            models.Product.id == item_data.product_id
-        ).first()
-        product.stock_quantity -= item_data.quantity
+    # 记录库存预占，超时未支付时释放
+    add_reservations(db, db_order.id, quantities)
     
     db.commit()
     db.refresh(db_order)
@@ -179,6 +176,9 @@ def update_order_status(
     # 如果是支付成功，更新支付时间
     if status_update == OrderStatus.PAID:
         order.paid_at = datetime.utcnow()
+        commit_reservations(db, order.id)
+    elif status_update == OrderStatus.CANCELLED:
+        release_reservations(db, order.id)
     
     db.commit()
     return {"message": "Order status updated successfully", "status": status_update}
@@ -195,13 +195,8 @@ def cancel_order(order_id: int, db: Session = Depends(get_db)):
     if order.status != OrderStatus.PENDING:
         raise CommonErrors.ORDER_CANNOT_CANCEL
 
-    # 恢复商品库存
-    for item in order.items:
-        product = db.query(models.Product).filter(
-            models.Product.id == item.product_id
-        ).first()
-        if product:
-            product.stock_quantity += item.quantity
+    # 释放库存预占，归还商品库存
+    release_reservations(db, order.id, fallback_items=order.items)
 
     order.status = OrderStatus.CANCELLED
     order.cancelled_at = datetime.utcnow()
@@ -2,11 +2,13 @@
 配送管理API
 """
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import List
 from datetime import datetime
 
-from app.database import get_db
+from app.database import get_db, get_async_db
 from app.models.shipping import Shipping
 from app.models.product import Order
 from app.schemas.shipping import (
@@ -25,13 +27,13 @@ router = APIRouter()
 @router.post("/create", response_model=ShippingResponse)
 async def create_shipping(
     shipping_data: ShippingCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     创建配送记录（管理员发货时调用）
     """
     # 检查订单是否存在
-    order = db.query(Order).filter(Order.id == shipping_data.order_id).first()
+    order = await db.get(Order, shipping_data.order_id)
     if not order:
         raise HTTPException(status_code=404, detail="订单不存在")
 
@@ -40,7 +42,7 @@ async def create_shipping(
         raise HTTPException(status_code=400, detail=f"订单状态不正确，当前状态: {order.status}")
 
     # 检查是否已经有配送记录
-    existing = db.query(Shipping).filter(Shipping.order_id == shipping_data.order_id).first()
+    existing = await db.scalar(select(Shipping).where(Shipping.order_id == shipping_data.order_id))
     if existing:
         raise HTTPException(status_code=400, detail="该订单已有配送记录")
 
@@ -69,8 +71,8 @@ async def create_shipping(
     # 更新订单状态为已发货
     order.status = OrderStatus.SHIPPED
 
-    db.commit()
-    db.refresh(shipping)
+    await db.commit()
+    await db.refresh(shipping)
 
     return shipping
 
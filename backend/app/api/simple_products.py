@@ -2,13 +2,14 @@
 简洁的商品API
 """
 from fastapi import APIRouter, HTTPException, Depends
-from sqlalchemy.orm import Session
+from sqlalchemy import select, delete
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 from pydantic import BaseModel
 from datetime import datetime
 import uuid
 
-from app.database import get_db
+from app.database import get_async_db
 from app.models.simple_product import SimpleProduct, SimpleCart, SimpleOrder, SimpleOrderItem
 
 router = APIRouter(prefix="/api/simple", tags=["simple"])
@@ -51,54 +52,54 @@ async def get_products(
     skip: int = 0,
     limit: int = 20,
     category: Optional[str] = None,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """获取商品列表"""
-    query = db.query(SimpleProduct).filter(SimpleProduct.is_active == True)
+    query = select(SimpleProduct).where(SimpleProduct.is_active == True)
     
     if category:
-        query = query.filter(SimpleProduct.category == category)
+        query = query.where(SimpleProduct.category == category)
     
-    products = query.offset(skip).limit(limit).all()
+    products = (await db.scalars(query.offset(skip).limit(limit))).all()
     return products
 
 @router.get("/products/{product_id}", response_model=ProductResponse)
-async def get_product(product_id: int, db: Session = Depends(get_db)):
+async def get_product(product_id: int, db: AsyncSession = Depends(get_async_db)):
     """获取商品详情"""
-    product = db.query(SimpleProduct).filter(SimpleProduct.id == product_id).first()
+    product = await db.get(SimpleProduct, product_id)
     if not product:
         raise HTTPException(status_code=404, detail="商品不存在")
     return product
 
 @router.post("/products", response_model=ProductResponse)
-async def create_product(product: ProductCreate, db: Session = Depends(get_db)):
+async def create_product(product: ProductCreate, db: AsyncSession = Depends(get_async_db)):
     """创建商品"""
     db_product = SimpleProduct(**product.dict())
     db.add(db_product)
-    db.commit()
-    db.refresh(db_product)
+    await db.commit()
+    await db.refresh(db_product)
     return db_product
 
 # 购物车相关API
 @router.get("/cart/{user_id}")
-async def get_cart(user_id: int, db: Session = Depends(get_db)):
+async def get_cart(user_id: int, db: AsyncSession = Depends(get_async_db)):
     """获取购物车"""
-    cart_items = db.query(SimpleCart).filter(SimpleCart.user_id == user_id).all()
+    cart_items = (await db.scalars(select(SimpleCart).where(SimpleCart.user_id == user_id))).all()
     return cart_items
 
 @router.post("/cart/{user_id}")
-async def add_to_cart(user_id: int, item: CartItem, db: Session = Depends(get_db)):
+async def add_to_cart(user_id: int, item: CartItem, db: AsyncSession = Depends(get_async_db)):
     """添加到购物车"""
     # 检查商品是否存在
-    product = db.query(SimpleProduct).filter(SimpleProduct.id == item.product_id).first()
+    product = await db.get(SimpleProduct, item.product_id)
     if not product:
         raise HTTPException(status_code=404, detail="商品不存在")
     
     # 检查是否已在购物车中
-    existing_item = db.query(SimpleCart).filter(
+    existing_item = await db.scalar(select(SimpleCart).where(
         SimpleCart.user_id == user_id,
         SimpleCart.product_id == item.product_id
-    ).first()
+    ))
     
     if existing_item:
         existing_item.quantity += item.quantity
@@ -110,27 +111,27 @@ async def add_to_cart(user_id: int, item: CartItem, db: Session = Depends(get_db
         )
         db.add(cart_item)
     
-    db.commit()
+    await db.commit()
     return {"message": "已添加到购物车"}
 
 @router.delete("/cart/{user_id}/{product_id}")
-async def remove_from_cart(user_id: int, product_id: int, db: Session = Depends(get_db)):
+async def remove_from_cart(user_id: int, product_id: int, db: AsyncSession = Depends(get_async_db)):
     """从购物车删除"""
-    cart_item = db.query(SimpleCart).filter(
+    cart_item = await db.scalar(select(SimpleCart).where(
         SimpleCart.user_id == user_id,
         SimpleCart.product_id == product_id
-    ).first()
+    ))
     
     if cart_item:
-        db.delete(cart_item)
-        db.commit()
+        await db.delete(cart_item)
+        await db.commit()
         return {"message": "已从购物车删除"}
     else:
         raise HTTPException(status_code=404, detail="购物车中没有此商品")
 
 # 订单相关API
 @router.post("/orders/{user_id}")
-async def create_order(user_id: int, order: OrderCreate, db: Session = Depends(get_db)):
+async def create_order(user_id: int, order: OrderCreate, db: AsyncSession = Depends(get_async_db)):
     """创建订单"""
     # 生成订单号
     order_number = f"ORD{datetime.now().strftime('%Y%m%d%H%M%S')}{uuid.uuid4().hex[:6].upper()}"
@@ -140,7 +141,7 @@ async def create_order(user_id: int, order: OrderCreate, db: Session = Depends(g
     order_items = []
     
     for item in order.items:
-        product = db.query(SimpleProduct).filter(SimpleProduct.id == item.product_id).first()
+        product = await db.get(SimpleProduct, item.product_id)
         if not product:
             raise HTTPException(status_code=404, detail=f"商品ID {item.product_id} 不存在")
         
@@ -165,7 +166,7 @@ async def create_order(user_id: int, order: OrderCreate, db: Session = Depends(g
         shipping_address=order.shipping_address
     )
     db.add(db_order)
-    db.flush()  # 获取订单ID
+    await db.flush()  # 获取订单ID
     
     # 创建订单项
     for item_data in order_items:
@@ -176,10 +177,10 @@ async def create_order(user_id: int, order: OrderCreate, db: Session = Depends(g
         db.add(order_item)
     
     # 清空购物车
-    db.query(SimpleCart).filter(SimpleCart.user_id == user_id).delete()
+    await db.execute(delete(SimpleCart).where(SimpleCart.user_id == user_id))
     
-    db.commit()
-    db.refresh(db_order)
+    await db.commit()
+    await db.refresh(db_order)
     
     return {
         "order_id": db_order.id,
@@ -189,24 +190,26 @@ async def create_order(user_id: int, order: OrderCreate, db: Session = Depends(g
     }
 
 @router.get("/orders/{user_id}")
-async def get_orders(user_id: int, db: Session = Depends(get_db)):
+async def get_orders(user_id: int, db: AsyncSession = Depends(get_async_db)):
     """获取用户订单"""
-    orders = db.query(SimpleOrder).filter(SimpleOrder.user_id == user_id).all()
+    orders = (await db.scalars(select(SimpleOrder).where(SimpleOrder.user_id == user_id))).all()
     return orders
 
 @router.get("/orders/{user_id}/{order_id}")
-async def get_order(user_id: int, order_id: int, db: Session = Depends(get_db)):
+async def get_order(user_id: int, order_id: int, db: AsyncSession = Depends(get_async_db)):
     """获取订单详情"""
-    order = db.query(SimpleOrder).filter(
+    order = await db.scalar(select(SimpleOrder).where(
         SimpleOrder.id == order_id,
         SimpleOrder.user_id == user_id
-    ).first()
+    ))
     
     if not order:
         raise HTTPException(status_code=404, detail="订单不存在")
     
     # 获取订单项
-    order_items = db.query(SimpleOrderItem).filter(SimpleOrderItem.order_id == order_id).all()
+    order_items = (await db.scalars(
+        select(SimpleOrderItem).where(SimpleOrderItem.order_id == order_id)
+    )).all()
     
     return {
         "order": order,
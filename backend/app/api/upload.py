@@ -13,7 +13,12 @@ from typing import List, Optional
 from fastapi import APIRouter, File, UploadFile, HTTPException, status, Depends
 from fastapi.responses import FileResponse
 from pydantic import BaseModel
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 from app.core.permissions import require_admin_role
+from app.core.upload_stream import RollingSignatureScanner, UploadRejectedError, UploadTooLargeError
+from app.database import get_db
+from app.services import file_store
 from app import models
 
 router = APIRouter(tags=["upload"])
@@ -52,6 +57,17 @@ DANGEROUS_EXTENSIONS = {
     ".py", ".pl", ".cgi", ".htaccess", ".htpasswd"
 }
 
+# 恶意文件特征（不区分大小写）
+MALWARE_SIGNATURES = [
+    b"MZ",  # PE executable
+    b"<?php",  # PHP code
+    b"<script",  # JavaScript
+    b"javascript:",  # JavaScript URL
+    b"eval(",  # JavaScript eval
+    b"exec(",  # Code execution
+    b"system(",  # System command
+]
+
 class UploadResponse(BaseModel):
     success: bool
     message: str
@@ -59,6 +75,8 @@ class UploadResponse(BaseModel):
     file_path: Optional[str] = None
     file_name: Optional[str] = None
     file_size: Optional[int] = None
+    sha256: Optional[str] = None
+    deduplicated: bool = False  # 是否复用了已存在的相同文件
 
 def get_file_extension(filename: str) -> str:
     """获取文件扩展名"""
@@ -122,23 +140,7 @@ def validate_mime_type(content: bytes, file_type: str) -> bool:
 
 def scan_for_malware(content: bytes) -> bool:
     """简单的恶意文件扫描"""
-    # 检查常见的恶意文件签名
-    malware_signatures = [
-        b"MZ",  # PE executable
-        b"<?php",  # PHP code
-        b"<script",  # JavaScript
-        b"javascript:",  # JavaScript URL
-        b"eval(",  # JavaScript eval
-        b"exec(",  # Code execution
-        b"system(",  # System command
-    ]
-    
-    content_lower = content.lower()
-    for signature in malware_signatures:
-        if signature.lower() in content_lower:
-            return False
-    
-    return True
+    return not RollingSignatureScanner(MALWARE_SIGNATURES).feed(content)
 
 
 def calculate_file_hash(content: bytes) -> str:
@@ -164,6 +166,26 @@ def is_allowed_file(filename: str, file_type: str = None) -> bool:
     
     return ext in all_extensions
 
+# 上传类型对应的存储目录
+UPLOAD_CATEGORIES = {
+    "image": "images",
+    "video": "videos",
+    "document": "documents"
+}
+
+def _stored_file_response(record: models.StoredFile, message: str, deduplicated: bool) -> UploadResponse:
+    """由内容索引记录生成上传响应"""
+    return UploadResponse(
+        success=True,
+        message=message,
+        file_url=file_store.file_url(record.path),
+        file_path=file_store.absolute_path(record.path),
+        file_name=Path(record.path).name,
+        file_size=record.size,
+        sha256=record.sha256,
+        deduplicated=deduplicated
+    )
+
 def generate_filename(original_filename: str) -> str:
     """生成唯一文件名"""
     ext = get_file_extension(original_filename)
@@ -175,6 +197,7 @@ def generate_filename(original_filename: str) -> str:
 async def upload_file(
     file: UploadFile = File(...), 
     file_type: Optional[str] = None,
+    db: Session = Depends(get_db),
     current_user: models.User = Depends(require_admin_role)
 ):
     """
@@ -192,14 +215,6 @@ async def upload_file(
                 detail="未选择文件"
             )
         
-        # 检查文件大小
-        content = await file.read()
-        if len(content) > MAX_FILE_SIZE:
-            raise HTTPException(
-                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
-                detail=f"文件大小超过限制 ({MAX_FILE_SIZE // (1024*1024)}MB)"
-            )
-        
         # 检查文件类型
         if not is_allowed_file(file.filename, file_type):
             allowed_types = ALLOWED_EXTENSIONS.get(file_type, "支持的格式")
@@ -208,53 +223,34 @@ async def upload_file(
                 detail=f"不支持的文件类型，{allowed_types}"
             )
         
-        # 验证MIME类型
-        if not validate_mime_type(content, file_type or ""):
+        def check_mime_type(head: bytes):
+            # 验证MIME类型（只需文件首块）
+            if not validate_mime_type(head, file_type or ""):
+                raise UploadRejectedError("文件内容与扩展名不匹配")
+        
+        # 分块保存文件：大小限制、类型校验、恶意文件扫描在读取过程中完成，
+        # 相同内容的文件只保存一份
+        try:
+            record, stored, created = await file_store.store_upload(
+                db,
+                file,
+                UPLOAD_CATEGORIES.get(file_type, "general"),
+                MAX_FILE_SIZE,
+                head_check=check_mime_type,
+                scanner=RollingSignatureScanner(MALWARE_SIGNATURES)
+            )
+        except UploadTooLargeError as e:
             raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="文件内容与扩展名不匹配"
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=str(e)
             )
-        
-        # 恶意文件扫描
-        if not scan_for_malware(content):
+        except UploadRejectedError as e:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
-                detail="检测到潜在恶意文件，上传被拒绝"
+                detail=str(e)
             )
         
-        # 确定上传目录
-        if file_type == "image":
-            upload_dir = Path(UPLOAD_DIRECTORY) / "images"
-        elif file_type == "video":
-            upload_dir = Path(UPLOAD_DIRECTORY) / "videos"
-        elif file_type == "document":
-            upload_dir = Path(UPLOAD_DIRECTORY) / "documents"
-        else:
-            upload_dir = Path(UPLOAD_DIRECTORY) / "general"
-        
-        # 创建上传目录
-        upload_dir.mkdir(parents=True, exist_ok=True)
-        
-        # 生成唯一文件名
-        new_filename = generate_filename(file.filename)
-        file_path = upload_dir / new_filename
-        
-        # 保存文件
-        with open(file_path, "wb") as buffer:
-            buffer.write(content)
-        
-        # 生成访问URL
-        relative_path = str(file_path).replace("\\", "/")
-        file_url = f"/uploads/{relative_path.split('uploads/')[-1]}"
-        
-        return UploadResponse(
-            success=True,
-            message="文件上传成功",
-            file_url=file_url,
-            file_path=str(file_path),
-            file_name=new_filename,
-            file_size=len(content)
-        )
+        return _stored_file_response(record, "文件上传成功", deduplicated=not created)
         
     except HTTPException:
         raise
@@ -268,6 +264,7 @@ async def upload_file(
 async def upload_multiple_files(
     files: List[UploadFile] = File(...),
     file_type: Optional[str] = None,
+    db: Session = Depends(get_db),
     current_user: models.User = Depends(require_admin_role)
 ):
     """
@@ -286,7 +283,7 @@ async def upload_multiple_files(
     results = []
     for file in files:
         try:
-            result = await upload_file(file, file_type)
+            result = await upload_file(file, file_type, db)
             results.append(result)
         except HTTPException as e:
             results.append(UploadResponse(
@@ -300,22 +297,51 @@ async def upload_multiple_files(
 @router.post("/upload/image", response_model=UploadResponse)
 async def upload_image(
     file: UploadFile = File(...),
+    db: Session = Depends(get_db),
     current_user: models.User = Depends(require_admin_role)
 ):
     """上传图片文件"""
-    return await upload_file(file, "image")
+    return await upload_file(file, "image", db)
 
 @router.post("/upload/video", response_model=UploadResponse)
 async def upload_video(
     file: UploadFile = File(...),
+    db: Session = Depends(get_db),
     current_user: models.User = Depends(require_admin_role)
 ):
     """上传视频文件"""
-    return await upload_file(file, "video")
+    return await upload_file(file, "video", db)
+
+@router.post("/upload/hash/{sha256}", response_model=UploadResponse)
+def upload_by_hash(
+    sha256: str,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(require_admin_role)
+):
+    """
+    按内容哈希秒传：服务器已有相同文件时直接返回地址，无需上传文件内容
+    
+    Args:
+        sha256: 文件内容的SHA-256（十六进制）
+    """
+    record = file_store.find_by_hash(db, sha256)
+    # 最后一个引用恰好被并发释放时引用失败，按文件不存在处理
+    if (
+        record is None
+        or not Path(file_store.absolute_path(record.path)).exists()
+        or file_store.add_reference(db, record) is None
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="文件不存在，请上传文件内容"
+        )
+    
+    return _stored_file_response(record, "秒传成功", deduplicated=True)
 
 @router.delete("/upload/{file_path:path}")
 async def delete_file(
     file_path: str,
+    db: Session = Depends(get_db),
     current_user: models.User = Depends(require_admin_role)
 ):
     """
@@ -341,8 +367,12 @@ async def delete_file(
                 detail="无效的文件路径"
             )
         
-        # 删除文件
-        full_path.unlink()
+        # 内容索引中的文件按引用计数释放，最后一个引用释放时才删除
+        released = await run_in_threadpool(file_store.release, db, file_path)
+        if released is None:
+            full_path.unlink()
+        elif released is False:
+            return {"success": True, "message": "文件引用已移除（仍被其他内容使用）"}
         
         return {"success": True, "message": "文件删除成功"}
         
@@ -13,17 +13,19 @@ from app.database import get_db
 from app.core.security import (
     get_password_hash, 
     verify_password, 
-    create_access_token,
-    create_refresh_token,
+    verify_password_and_update,
     verify_token,
     create_email_verification_token,
     create_password_reset_token,
     verify_password_reset_token,
     verify_email_verification_token
 )
+from app.core.auth_context import invalidate_user
+from app.services.token_service import issue_token_pair, revoke_user_tokens
 from app.core.permissions import (
     get_current_user, 
     get_current_active_user, 
+    get_current_db_user,
     require_admin_role,
     require_super_admin_role,
     check_resource_ownership
@@ -87,7 +89,11 @@ def login_user(login_data: UserLogin, db: Session = Depends(get_db)):
         user = db.query(models.User).filter(models.User.username == login_data.email_or_username).first()
     
     # 验证用户和密码
-    if not user or not verify_password(login_data.password, user.hashed_password):
+    if not user:
+        raise CommonErrors.INVALID_CREDENTIALS
+    
+    password_ok, new_hash = verify_password_and_update(login_data.password, user.hashed_password)
+    if not password_ok:
         raise CommonErrors.INVALID_CREDENTIALS
     
     # 检查用户状态
@@ -97,19 +103,14 @@ def login_user(login_data: UserLogin, db: Session = Depends(get_db)):
     if user.status == models.UserStatus.SUSPENDED:
         raise PermissionDeniedException("账户已被暂停")
     
-    # 更新最后登录时间
+    # 更新最后登录时间；哈希参数已调整时顺便保存新哈希
     user.last_login = datetime.utcnow()
+    if new_hash:
+        user.hashed_password = new_hash
     db.commit()
     
-    # 创建访问令牌
-    access_token = create_access_token(data={"sub": user.email, "user_id": user.id})
-    
-    return {
-        "access_token": access_token,
-        "token_type": "bearer",
-        "expires_in": 24 * 60 * 60,  # 24小时，单位秒
-        "user": user
-    }
+    # 签发访问令牌和刷新令牌
+    return {**issue_token_pair(user), "user": user}
 
 # OAuth2 登录（兼容性）
 @router.post("/token", response_model=Token)
@@ -164,7 +165,7 @@ def read_users(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
     return users
 
 @router.get("/me", response_model=UserDetail)
-def read_current_user(current_user: models.User = Depends(get_current_user)):
+def read_current_user(current_user: models.User = Depends(get_current_db_user)):
     """获取当前用户信息"""
     return current_user
 
@@ -177,7 +178,7 @@ def read_user(user_id: int, db: Session = Depends(get_db)):
     return db_user
 
 @router.put("/me", response_model=User)
-def update_current_user(user_update: UserUpdate, current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
+def update_current_user(user_update: UserUpdate, current_user: models.User = Depends(get_current_db_user), db: Session = Depends(get_db)):
     """更新当前用户信息"""
     # 检查用户名是否被其他用户使用
     if user_update.username and user_update.username != current_user.username:
@@ -204,11 +205,12 @@ def update_current_user(user_update: UserUpdate, current_user: models.User = Dep
     
     current_user.updated_at = datetime.utcnow()
     db.commit()
+    invalidate_user(user_id=current_user.id)
     db.refresh(current_user)
     return current_user
 
 @router.put("/me/password")
-def change_password(password_data: UserPasswordUpdate, current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
+def change_password(password_data: UserPasswordUpdate, current_user: models.User = Depends(get_current_db_user), db: Session = Depends(get_db)):
     """更改当前用户密码"""
     # 验证旧密码
     if not verify_password(password_data.old_password, current_user.hashed_password):
@@ -219,7 +221,9 @@ def change_password(password_data: UserPasswordUpdate, current_user: models.User
     current_user.updated_at = datetime.utcnow()
     db.commit()
     
-    return {"message": "密码更新成功"}
+    # 旧密码签发的令牌全部失效（其他设备需要重新登录），当前客户端换用新令牌
+    revoke_user_tokens(db, current_user.id)
+    return {"message": "密码更新成功", **issue_token_pair(current_user)}
 
 @router.put("/{user_id}", response_model=User)
 def update_user(user_id: int, user_update: UserAdminUpdate, current_user: models.User = Depends(require_admin_role), db: Session = Depends(get_db)):
@@ -245,6 +249,11 @@ def update_user(user_id: int, user_update: UserAdminUpdate, current_user: models
     
     db_user.updated_at = datetime.utcnow()
     db.commit()
+    # 角色/状态/邮箱可能已变更，按用户ID清除缓存（同时覆盖旧邮箱）
+    invalidate_user(user_id=user_id)
+    # 封禁/暂停/停用后，已签发的令牌立即失效
+    if not db_user.is_active or db_user.status in (models.UserStatus.BANNED, models.UserStatus.SUSPENDED):
+        revoke_user_tokens(db, user_id)
     db.refresh(db_user)
     return db_user
 
@@ -261,5 +270,7 @@ def delete_user(user_id: int, current_user: models.User = Depends(require_admin_
     db_user.status = models.UserStatus.BANNED
     db_user.updated_at = datetime.utcnow()
     db.commit()
+    invalidate_user(user_id=user_id)
+    revoke_user_tokens(db, user_id)
     
     return db_user
\ No newline at end of file
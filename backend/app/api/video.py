@@ -3,21 +3,31 @@
 """
 import time
 import os
-from fastapi import APIRouter, Depends, HTTPException, status, Query, UploadFile, File, Form
+from fastapi import APIRouter, Depends, HTTPException, status, Query, UploadFile, File, Form, Request, Header
 from fastapi.responses import JSONResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import datetime
 
 from app import schemas, models
 from app.schemas.course import VideoStatus
-from app.database import get_db
+from app.database import get_db, get_async_db
 from app.core.video_security import video_security_service, video_watermark_service
 from app.core.permissions import get_current_user, require_admin_role
 from app.core.config import settings
+from app.core.enums_v2 import UploadSessionStatus
+from app.core.upload_stream import UploadRejectedError, UploadTooLargeError, save_upload_file
+from app.models.upload_session import UploadSession
+from app.services import video_upload
+from app.services.video_upload import (
+    ChunksMissingError, UploadSessionError, UploadSessionExpiredError, UploadSessionStateError
+)
 
 router = APIRouter(tags=["video"])
 
+ALLOWED_VIDEO_EXTENSIONS = {'.mp4', '.avi', '.mov', '.wmv', '.flv', '.webm'}
+
 @router.get("/lessons/{lesson_id}/play-url")
 def get_video_play_url(
     lesson_id: int,
@@ -325,9 +335,8 @@ async def upload_video(
         )
     
     # 检查文件类型
-    allowed_extensions = {'.mp4', '.avi', '.mov', '.wmv', '.flv', '.webm'}
     file_extension = os.path.splitext(file.filename)[1].lower()
-    if file_extension not in allowed_extensions:
+    if file_extension not in ALLOWED_VIDEO_EXTENSIONS:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="不支持的视频格式。支持的格式: mp4, avi, mov, wmv, flv, webm"
@@ -351,10 +360,14 @@ async def upload_video(
         filename = f"{timestamp}_{course_id}_{order}_{file.filename}"
         file_path = os.path.join(upload_dir, filename)
         
-        # 保存文件
-        with open(file_path, "wb") as buffer:
-            content = await file.read()
-            buffer.write(content)
+        # 分块保存文件
+        try:
+            stored = await save_upload_file(file, file_path, max_size)
+        except UploadTooLargeError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="视频文件过大，最大支持500MB"
+            )
         
         # 创建课程记录
         lesson_data = {
@@ -382,11 +395,13 @@ async def upload_video(
             "lesson": db_lesson,
             "file_info": {
                 "filename": filename,
-                "size": len(content),
+                "size": stored.size,
                 "path": file_path
             }
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         # 如果出错，尝试清理已上传的文件
         if 'file_path' in locals() and os.path.exists(file_path):
@@ -397,6 +412,208 @@ async def upload_video(
             detail=f"视频上传失败: {str(e)}"
         )
 
+# ==================== 视频分片上传（断点续传） ====================
+
+def _upload_session_response(db: Session, upload_session: UploadSession) -> dict:
+    """构造上传会话状态"""
+    received = []
+    if upload_session.status == UploadSessionStatus.UPLOADING:
+        received = video_upload.received_chunk_indexes(db, upload_session)
+    elif upload_session.status == UploadSessionStatus.COMPLETED:
+        received = list(range(upload_session.total_chunks))
+
+    return {
+        "upload_id": upload_session.id,
+        "lesson_id": upload_session.lesson_id,
+        "filename": upload_session.filename,
+        "total_size": upload_session.total_size,
+        "chunk_size": upload_session.chunk_size,
+        "total_chunks": upload_session.total_chunks,
+        "status": upload_session.status,
+        "received_chunks": received,
+        "missing_chunks": video_upload.missing_chunk_indexes(upload_session, received),
+        "video_url": f"/uploads/{upload_session.stored_path}" if upload_session.stored_path else None,
+        "error_message": upload_session.error_message,
+        "expires_at": upload_session.expires_at,
+    }
+
+
+def _raise_upload_session_error(e: Exception):
+    """把分片上传异常转换为HTTP错误"""
+    if isinstance(e, ChunksMissingError):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail={"message": str(e), "missing_chunks": e.missing}
+        )
+    if isinstance(e, UploadSessionExpiredError):
+        raise HTTPException(status_code=status.HTTP_410_GONE, detail=str(e))
+    if isinstance(e, UploadSessionStateError):
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    if isinstance(e, UploadTooLargeError):
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="分片大小超过会话声明的分片大小")
+    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+def _get_upload_session(db: Session, upload_id: str) -> UploadSession:
+    upload_session = db.get(UploadSession, upload_id)
+    if not upload_session:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="上传会话不存在"
+        )
+    return upload_session
+
+
+@router.post("/admin/lessons/uploads", response_model=schemas.VideoUploadSession)
+def create_video_upload(
+    upload_in: schemas.VideoUploadInit,
+    current_user: models.User = Depends(require_admin_role),
+    db: Session = Depends(get_db)
+):
+    """
+    创建视频分片上传会话
+
+    同时创建状态为 UPLOADING 的课时；返回分片大小和分片数量，
+    客户端随后按序号 PUT 各分片（顺序任意、可并行），断线后查询会话状态续传缺失分片。
+    """
+    course = db.query(models.Course).filter(models.Course.id == upload_in.course_id).first()
+    if not course:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="课程不存在"
+        )
+
+    file_extension = os.path.splitext(upload_in.filename)[1].lower()
+    if file_extension not in ALLOWED_VIDEO_EXTENSIONS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="不支持的视频格式。支持的格式: mp4, avi, mov, wmv, flv, webm"
+        )
+
+    max_size = settings.VIDEO_UPLOAD_MAX_SIZE
+    if upload_in.total_size <= 0 or upload_in.total_size > max_size:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"视频文件大小无效，最大支持{max_size // (1024 * 1024)}MB"
+        )
+
+    chunk_size = upload_in.chunk_size or settings.VIDEO_UPLOAD_CHUNK_SIZE
+    if not video_upload.MIN_CHUNK_SIZE <= chunk_size <= video_upload.MAX_CHUNK_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="分片大小需在 256KB ~ 64MB 之间"
+        )
+    if -(-upload_in.total_size // chunk_size) > video_upload.MAX_TOTAL_CHUNKS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"分片数量过多（最多{video_upload.MAX_TOTAL_CHUNKS}片），请增大分片大小"
+        )
+
+    if upload_in.sha256 and (len(upload_in.sha256) != 64 or any(c not in "0123456789abcdefABCDEF" for c in upload_in.sha256)):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="SHA-256格式不正确"
+        )
+
+    upload_session = video_upload.create_session(
+        db,
+        current_user,
+        course,
+        title=upload_in.title,
+        description=upload_in.description,
+        order=upload_in.order,
+        is_free=upload_in.is_free,
+        filename=upload_in.filename,
+        total_size=upload_in.total_size,
+        chunk_size=chunk_size,
+        sha256=upload_in.sha256,
+        content_type=upload_in.content_type
+    )
+    return _upload_session_response(db, upload_session)
+
+
+@router.get("/admin/lessons/uploads/{upload_id}", response_model=schemas.VideoUploadSession)
+def get_video_upload(
+    upload_id: str,
+    current_user: models.User = Depends(require_admin_role),
+    db: Session = Depends(get_db)
+):
+    """查询上传会话状态（已接收 / 缺失的分片）"""
+    return _upload_session_response(db, _get_upload_session(db, upload_id))
+
+
+@router.put("/admin/lessons/uploads/{upload_id}/chunks/{chunk_index}")
+async def upload_video_chunk(
+    upload_id: str,
+    chunk_index: int,
+    request: Request,
+    x_chunk_sha256: Optional[str] = Header(None, description="分片SHA-256（可选，服务端校验）"),
+    current_user: models.User = Depends(require_admin_role),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    上传一个分片（请求体为分片原始字节）
+
+    同一序号可重复上传，后到的覆盖先到的；分片流式写盘，不整体读入内存。
+    """
+    upload_session = await db.get(UploadSession, upload_id)
+    if not upload_session:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="上传会话不存在"
+        )
+
+    try:
+        expected_size = video_upload.expected_chunk_size(upload_session, chunk_index)
+        content_length = request.headers.get("content-length")
+        if content_length and content_length.isdigit() and int(content_length) > expected_size:
+            raise UploadTooLargeError(expected_size)
+
+        chunk = await video_upload.receive_chunk(
+            db, upload_session, chunk_index, request.stream(), x_chunk_sha256
+        )
+    except (UploadSessionError, UploadRejectedError) as e:
+        _raise_upload_session_error(e)
+
+    return {
+        "upload_id": upload_id,
+        "chunk_index": chunk_index,
+        "size": chunk.size,
+        "sha256": chunk.sha256
+    }
+
+
+@router.post("/admin/lessons/uploads/{upload_id}/complete", response_model=schemas.VideoUploadSession)
+def complete_video_upload(
+    upload_id: str,
+    current_user: models.User = Depends(require_admin_role),
+    db: Session = Depends(get_db)
+):
+    """完成上传：合并分片、校验SHA-256，课时状态置为 READY"""
+    upload_session = _get_upload_session(db, upload_id)
+    try:
+        upload_session = video_upload.finalize_session(db, upload_session)
+    except (UploadSessionError, UploadRejectedError) as e:
+        _raise_upload_session_error(e)
+
+    return _upload_session_response(db, upload_session)
+
+
+@router.delete("/admin/lessons/uploads/{upload_id}", response_model=schemas.VideoUploadSession)
+def abort_video_upload(
+    upload_id: str,
+    current_user: models.User = Depends(require_admin_role),
+    db: Session = Depends(get_db)
+):
+    """取消上传，删除已接收的分片和占位课时"""
+    upload_session = _get_upload_session(db, upload_id)
+    try:
+        upload_session = video_upload.abort_session(db, upload_session)
+    except UploadSessionError as e:
+        _raise_upload_session_error(e)
+
+    return _upload_session_response(db, upload_session)
+
 @router.get("/admin/lessons/{lesson_id}/info", response_model=schemas.Lesson)
 def get_lesson_info(
     lesson_id: int,
@@ -4,18 +4,21 @@
 """
 from fastapi import APIRouter, Depends, HTTPException, Request, Body
 from fastapi.responses import HTMLResponse, PlainTextResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from pydantic import BaseModel, Field
 from typing import Optional, Literal
+from datetime import datetime, timedelta, timezone
 from decimal import Decimal
 import logging
-import xml.etree.ElementTree as ET
 
-from app.database import get_db
+from app.database import get_db, get_async_db
 from app import models
-from app.core.wechat_pay import get_wechat_pay_service
+from app.core.wechat_pay import MIN_PREPAY_EXPIRE_MINUTES, get_wechat_pay_service
 from app.core.permissions import get_current_user
 from app.core.enums_v2 import OrderStatus
+from app.services.inventory_service import commit_reservations, payment_deadline
+from app.services.payment_notify import NotifyError, process_notify
 
 logger = logging.getLogger(__name__)
 
@@ -48,6 +51,17 @@ class QueryPaymentRequest(BaseModel):
     order_number: str = Field(..., description="商户订单号")
 
 
+def _prepay_expires_at(db: Session, order: models.Order) -> datetime:
+    """
+    预支付单失效时间：订单的支付截止时间（库存预占到期），到期后订单会被取消，不能再支付成功
+    剩余时间不足微信要求的最短有效期时不再发起支付
+    """
+    expires_at = payment_deadline(db, order)
+    if expires_at - datetime.now(timezone.utc) < timedelta(minutes=MIN_PREPAY_EXPIRE_MINUTES):
+        raise HTTPException(status_code=400, detail="订单即将超时取消，请重新下单")
+    return expires_at
+
+
 # ==================== API 端点 ====================
 
 @router.get("/config")
@@ -87,13 +101,16 @@ def create_native_payment(
     if order.status != OrderStatus.PENDING:
         raise HTTPException(status_code=400, detail=f"订单状态不允许支付: {order.status}")
 
+    expires_at = _prepay_expires_at(db, order)
+
     # 创建支付
     service = get_wechat_pay_service()
     result = service.create_native_payment(
         order_id=order.order_number,
         amount=order.total_amount,
         subject=f"订单 {order.order_number}",
-        detail=request.detail
+        detail=request.detail,
+        expires_at=expires_at
     )
 
     if not result.get("success"):
@@ -135,6 +152,8 @@ def create_h5_payment(
     # 获取客户端IP
     client_ip = client_request.client.host if client_request.client else "127.0.0.1"
 
+    expires_at = _prepay_expires_at(db, order)
+
     # 创建支付
     service = get_wechat_pay_service()
     result = service.create_h5_payment(
@@ -142,7 +161,8 @@ def create_h5_payment(
         amount=order.total_amount,
         subject=f"订单 {order.order_number}",
         client_ip=client_ip,
-        detail=request.detail
+        detail=request.detail,
+        expires_at=expires_at
     )
 
     if not result.get("success"):
@@ -180,6 +200,8 @@ def create_jsapi_payment(
     if order.status != OrderStatus.PENDING:
         raise HTTPException(status_code=400, detail=f"订单状态不允许支付: {order.status}")
 
+    expires_at = _prepay_expires_at(db, order)
+
     # 创建支付
     service = get_wechat_pay_service()
     result = service.create_jsapi_payment(
@@ -187,7 +209,8 @@ def create_jsapi_payment(
         amount=order.total_amount,
         subject=f"订单 {order.order_number}",
         openid=request.openid,
-        detail=request.detail
+        detail=request.detail,
+        expires_at=expires_at
     )
 
     if not result.get("success"):
@@ -242,6 +265,7 @@ def query_payment_status(
         if result.get("trade_state") == "SUCCESS" and order.status == OrderStatus.PENDING:
             order.status = OrderStatus.PAID
             order.paid_at = result.get("paid_at")
+            commit_reservations(db, order.id)
             db.commit()
             logger.info(f"✅ 订单支付成功 - 订单号: {order.order_number}")
 
@@ -258,58 +282,22 @@ def query_payment_status(
 
 
 @router.post("/notify", response_class=PlainTextResponse)
-async def payment_notify(request: Request, db: Session = Depends(get_db)):
+async def payment_notify(request: Request, db: AsyncSession = Depends(get_async_db)):
     """
     微信支付回调通知
 
-    微信服务器会POST XML格式的支付结果
+    微信服务器会POST XML格式的支付结果，同一笔支付可能推送多次（幂等处理见 payment_notify 服务）
     """
     try:
-        # 读取XML数据
         body = await request.body()
-        xml_data = body.decode("utf-8")
-
-        # 解析XML
-        root = ET.fromstring(xml_data)
-        data = {child.tag: child.text for child in root}
-
-        logger.info(f"收到微信支付回调: {data.get('out_trade_no')}")
-
-        # 验证签名
-        service = get_wechat_pay_service()
-        if not service.verify_notify(data.copy()):
-            logger.error("❌ 微信支付回调签名验证失败")
-            return _generate_notify_response(False, "签名验证失败")
-
-        # 验证返回码
-        return_code = data.get("return_code")
-        result_code = data.get("result_code")
-
-        if return_code != "SUCCESS" or result_code != "SUCCESS":
-            logger.error(f"❌ 微信支付失败: {data.get('err_code_des')}")
-            return _generate_notify_response(True, "OK")
-
-        # 查询订单
-        order_number = data.get("out_trade_no")
-        order = db.query(models.Order).filter(
-            models.Order.order_number == order_number
-        ).first()
-
-        if not order:
-            logger.error(f"❌ 订单不存在: {order_number}")
-            return _generate_notify_response(False, "订单不存在")
-
-        # 更新订单状态
-        if order.status == OrderStatus.PENDING:
-            order.status = OrderStatus.PAID
-            order.transaction_id = data.get("transaction_id")  # 微信支付订单号
-            order.paid_at = data.get("time_end")
-            db.commit()
-            logger.info(f"✅ 订单支付成功（回调） - 订单号: {order_number}")
-
-        # 返回成功响应
+        result = await process_notify(db, body)
+        if result == "duplicate":
+            logger.info("收到重复的微信支付回调，已按处理记录应答")
         return _generate_notify_response(True, "OK")
 
+    except NotifyError as e:
+        logger.error(f"❌ 微信支付回调处理失败: {e}")
+        return _generate_notify_response(False, str(e))
     except Exception as e:
         logger.error(f"❌ 处理微信支付回调异常: {e}")
         return _generate_notify_response(False, f"处理失败: {str(e)}")
@@ -351,6 +339,7 @@ def simulate_payment_success(
         order.transaction_id = f"MOCK_{order_number}"
         from datetime import datetime
         order.paid_at = datetime.now()
+        commit_reservations(db, order.id)
         db.commit()
 
     logger.info(f"🧪 模拟支付成功 - 订单号: {order_number}")
@@ -0,0 +1,175 @@
+"""
+认证上下文：JWT 解码缓存与用户主体缓存
+
+每个需要登录的请求原本都要解码一次 JWT 并按邮箱查询一次用户表：
+- TokenCache：按 token 的 SHA-256 缓存解码结果，有效期不超过 TTL 和 token 自身的 exp
+- PrincipalCache：按邮箱缓存鉴权所需的用户字段（id、角色、状态、是否启用），不保留 ORM 对象
+- 两者都是有界 LRU，超过容量时淘汰最久未用的条目
+- 用户角色/状态变更后调用 invalidate_user 立即失效；查询期间发生失效的结果不写入缓存
+- 缓存按进程独立，多进程部署时其他进程最多在 AUTH_PRINCIPAL_CACHE_TTL 秒后看到变更
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from app.core.config import settings
+from app.models.user import UserRole, UserStatus
+
+
+@dataclass(frozen=True)
+class Principal:
+    """已认证用户的鉴权信息（与 ORM 会话无关，可跨请求缓存）"""
+    id: int
+    email: str
+    username: str
+    role: UserRole
+    status: UserStatus
+    is_active: bool
+
+    @property
+    def is_admin(self) -> bool:
+        return self.role in (UserRole.ADMIN, UserRole.SUPER_ADMIN)
+
+    @property
+    def is_super_admin(self) -> bool:
+        return self.role == UserRole.SUPER_ADMIN
+
+    @classmethod
+    def from_user(cls, user) -> "Principal":
+        return cls(
+            id=user.id,
+            email=user.email,
+            username=user.username,
+            role=user.role,
+            status=user.status,
+            is_active=bool(user.is_active)
+        )
+
+
+class TTLCache:
+    """线程安全的有界 LRU 缓存，每个条目有独立的过期时间"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max(int(max_size), 1)
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: Hashable, value: Any, expires_at: float):
+        with self._lock:
+            self._set_locked(key, value, expires_at)
+
+    def _set_locked(self, key: Hashable, value: Any, expires_at: float):
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+class TokenCache(TTLCache):
+    """JWT 解码结果缓存，键为 token 的哈希（不在内存中保留 token 原文）"""
+
+    def __init__(self, max_size: int, ttl_seconds: float):
+        super().__init__(max_size)
+        self.ttl_seconds = ttl_seconds
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def decode(self, token: str, decoder: Callable[[str], Optional[dict]]) -> Optional[dict]:
+        """返回缓存的解码结果；未命中时调用 decoder 解码，只缓存验证通过的 token"""
+        if self.ttl_seconds <= 0:
+            return decoder(token)
+
+        key = self._key(token)
+        payload = self.get(key)
+        if payload is not None:
+            return payload
+
+        payload = decoder(token)
+        if payload is None:
+            return None
+        expires_at = time.time() + self.ttl_seconds
+        exp = payload.get("exp")
+        if isinstance(exp, (int, float)):
+            expires_at = min(expires_at, exp)
+        self.set(key, payload, expires_at)
+        return payload
+
+
+class PrincipalCache(TTLCache):
+    """用户主体缓存，键为邮箱（即 token 中的 sub）"""
+
+    def __init__(self, max_size: int, ttl_seconds: float):
+        super().__init__(max_size)
+        self.ttl_seconds = ttl_seconds
+        self._generation = 0
+
+    def resolve(self, email: str, loader: Callable[[], Any]) -> Optional[Principal]:
+        """返回缓存的主体；未命中时调用 loader 查询用户（返回 ORM 对象或 None）"""
+        if self.ttl_seconds > 0:
+            principal = self.get(email)
+            if principal is not None:
+                return principal
+
+        generation = self._generation
+        user = loader()
+        if user is None:
+            return None
+        principal = Principal.from_user(user)
+
+        if self.ttl_seconds > 0:
+            with self._lock:
+                # 查询期间发生过失效则不缓存，避免把变更前的角色/状态放回缓存
+                if generation == self._generation:
+                    self._set_locked(email, principal, time.time() + self.ttl_seconds)
+        return principal
+
+    def invalidate(self, user_id: Optional[int] = None, email: Optional[str] = None):
+        with self._lock:
+            self._generation += 1
+            if email is not None:
+                self._entries.pop(email, None)
+            if user_id is not None:
+                for key in [key for key, (_, principal) in self._entries.items() if principal.id == user_id]:
+                    del self._entries[key]
+
+
+token_cache = TokenCache(
+    max_size=settings.AUTH_TOKEN_CACHE_SIZE,
+    ttl_seconds=settings.AUTH_TOKEN_CACHE_TTL
+)
+principal_cache = PrincipalCache(
+    max_size=settings.AUTH_PRINCIPAL_CACHE_SIZE,
+    ttl_seconds=settings.AUTH_PRINCIPAL_CACHE_TTL
+)
+
+
+def invalidate_user(user_id: Optional[int] = None, email: Optional[str] = None):
+    """用户角色、状态或邮箱变更后调用，下一次请求重新从数据库读取"""
+    principal_cache.invalidate(user_id=user_id, email=email)
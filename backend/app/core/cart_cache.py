@@ -0,0 +1,54 @@
+"""
+购物车读取缓存
+
+结算页、导航栏反复读取购物车，每次都要查询购物车、明细和商品：
+- 按用户ID缓存组装好的购物车响应（dict），有效期 CART_CACHE_TTL 秒
+- 购物车增删改接口提交后调用 invalidate 立即失效；查询期间发生失效的结果不写入缓存
+- 商品价格、库存变化不主动失效，最多延迟 CART_CACHE_TTL 秒；下单时以商品表为准
+- 缓存按进程独立，TTL 为 0 时关闭
+"""
+import time
+from typing import Any, Callable, Dict, Optional
+
+from app.core.auth_context import TTLCache
+from app.core.config import settings
+
+
+class CartCache(TTLCache):
+    """用户购物车响应缓存，键为用户ID"""
+
+    def __init__(self, max_size: int, ttl_seconds: float):
+        super().__init__(max_size)
+        self.ttl_seconds = ttl_seconds
+        self._generation = 0
+
+    def resolve(self, user_id: int, loader: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+        """返回缓存的购物车；未命中时调用 loader 查询并组装"""
+        if self.ttl_seconds <= 0:
+            return loader()
+
+        cart = self.get(user_id)
+        if cart is not None:
+            return cart
+
+        generation = self._generation
+        cart = loader()
+        with self._lock:
+            # 查询期间购物车被修改过则不缓存
+            if generation == self._generation:
+                self._set_locked(user_id, cart, time.time() + self.ttl_seconds)
+        return cart
+
+    def invalidate(self, user_id: Optional[int] = None):
+        with self._lock:
+            self._generation += 1
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_id, None)
+
+
+cart_cache = CartCache(
+    max_size=settings.CART_CACHE_SIZE,
+    ttl_seconds=settings.CART_CACHE_TTL
+)
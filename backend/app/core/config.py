@@ -24,13 +24,23 @@ class Settings(BaseSettings):
         "DATABASE_URL", 
         "sqlite:///./tcm_backend.db"  # 开发环境默认使用SQLite
     )
+    # 异步引擎连接串，留空时由 DATABASE_URL 推导（postgresql -> asyncpg, sqlite -> aiosqlite）
+    ASYNC_DATABASE_URL: str = os.getenv("ASYNC_DATABASE_URL", "")
+
+    # 数据库连接池配置（SQLite不使用）
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "10"))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+    DB_POOL_RECYCLE: int = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+    DB_POOL_TIMEOUT: int = int(os.getenv("DB_POOL_TIMEOUT", "30"))
     
     # JWT配置
     SECRET_KEY: str = os.getenv("SECRET_KEY")
     if not SECRET_KEY:
         raise ValueError("❌ SECRET_KEY未配置！生产环境必须在.env中设置强密钥")
     ALGORITHM: str = "HS256"
-    ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    # 访问令牌有效期（分钟）；前端支持刷新令牌后可缩短到 15~30 分钟
+    ACCESS_TOKEN_EXPIRE_MINUTES: int = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "1440"))
+    REFRESH_TOKEN_EXPIRE_DAYS: int = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "30"))
     
     # 腾讯云配置（VOD视频加密需要）
     TENCENT_SECRET_ID: str = os.getenv("TENCENT_SECRET_ID", "")
@@ -45,6 +55,17 @@ class Settings(BaseSettings):
     VIDEO_DOMAIN: str = os.getenv("VIDEO_DOMAIN", "your-video-domain.com")
     VIDEO_TOKEN_EXPIRE: int = 3600  # 视频token过期时间（秒）
 
+    # 视频分片上传配置
+    VIDEO_UPLOAD_MAX_SIZE: int = int(os.getenv("VIDEO_UPLOAD_MAX_SIZE", str(2 * 1024 * 1024 * 1024)))  # 2GB
+    VIDEO_UPLOAD_CHUNK_SIZE: int = int(os.getenv("VIDEO_UPLOAD_CHUNK_SIZE", str(8 * 1024 * 1024)))  # 8MB
+    VIDEO_UPLOAD_SESSION_TTL_HOURS: int = int(os.getenv("VIDEO_UPLOAD_SESSION_TTL_HOURS", "24"))
+
+    # 上传文件访问（/uploads）
+    # 非内容寻址文件的缓存时间（秒）；内容寻址文件始终一年 immutable
+    UPLOADS_CACHE_MAX_AGE: int = int(os.getenv("UPLOADS_CACHE_MAX_AGE", "3600"))
+    # 设置后（如 /_protected_uploads）只返回 X-Accel-Redirect，由 nginx 发送文件
+    UPLOADS_ACCEL_REDIRECT_PREFIX: str = os.getenv("UPLOADS_ACCEL_REDIRECT_PREFIX", "")
+
     # 微信支付配置（唯一支付方式）
     WECHAT_APP_ID: str = os.getenv("WECHAT_APP_ID", "")
     WECHAT_MCH_ID: str = os.getenv("WECHAT_MCH_ID", "")
@@ -53,6 +74,9 @@ class Settings(BaseSettings):
     WECHAT_H5_DOMAIN: str = os.getenv("WECHAT_H5_DOMAIN", "")
     WECHAT_PAYMENT_TYPE: str = os.getenv("WECHAT_PAYMENT_TYPE", "JSAPI")
     WECHAT_MOCK_MODE: bool = os.getenv("WECHAT_MOCK_MODE", "false").lower() == "true"
+    # 已处理的支付回调在内存中保留的数量和时长（秒），微信重复推送时不访问数据库
+    WECHAT_NOTIFY_CACHE_SIZE: int = int(os.getenv("WECHAT_NOTIFY_CACHE_SIZE", "10000"))
+    WECHAT_NOTIFY_CACHE_TTL: float = float(os.getenv("WECHAT_NOTIFY_CACHE_TTL", "86400"))
 
     # 快递鸟物流查询API配置
     KDNIAO_EBUSINESS_ID: str = os.getenv("KDNIAO_EBUSINESS_ID", "")
@@ -61,6 +85,60 @@ class Settings(BaseSettings):
     # 服务器配置
     SERVER_HOST: str = os.getenv("SERVER_HOST", "http://localhost:8000")
     
+    # 速率限制配置
+    # memory: 进程内LRU（单worker）；sqlite: 本机共享WAL文件（多worker共用限额）
+    RATE_LIMIT_BACKEND: str = os.getenv("RATE_LIMIT_BACKEND", "memory")
+    RATE_LIMIT_SQLITE_PATH: str = os.getenv("RATE_LIMIT_SQLITE_PATH", "./rate_limit.db")
+    RATE_LIMIT_MAX_KEYS: int = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+
+    # 性能监控（事件循环阻塞检测 + 接口耗时统计，默认关闭）
+    PERF_MONITOR_ENABLED: bool = os.getenv("PERF_MONITOR_ENABLED", "false").lower() == "true"
+    PERF_LOOP_LAG_THRESHOLD_MS: float = float(os.getenv("PERF_LOOP_LAG_THRESHOLD_MS", "100"))
+    PERF_LOOP_SAMPLE_INTERVAL_MS: float = float(os.getenv("PERF_LOOP_SAMPLE_INTERVAL_MS", "50"))
+
+    # 诊断记录后台批量写入（攒够批大小或到达刷新间隔即写入一次）
+    DIAGNOSIS_RECORD_ENABLED: bool = os.getenv("DIAGNOSIS_RECORD_ENABLED", "true").lower() == "true"
+    DIAGNOSIS_RECORD_BATCH_SIZE: int = int(os.getenv("DIAGNOSIS_RECORD_BATCH_SIZE", "200"))
+    DIAGNOSIS_RECORD_FLUSH_MS: float = float(os.getenv("DIAGNOSIS_RECORD_FLUSH_MS", "500"))
+    DIAGNOSIS_RECORD_MAX_PENDING: int = int(os.getenv("DIAGNOSIS_RECORD_MAX_PENDING", "20000"))
+
+    # 密码哈希：bcrypt 在专用线程池中执行，排队数超过上限时直接返回503
+    BCRYPT_ROUNDS: int = int(os.getenv("BCRYPT_ROUNDS", "12"))
+    PASSWORD_HASH_WORKERS: int = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+    PASSWORD_HASH_MAX_PENDING: int = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "32"))
+    PASSWORD_HASH_RETRY_AFTER: int = int(os.getenv("PASSWORD_HASH_RETRY_AFTER", "1"))
+
+    # 认证缓存：JWT 解码结果和用户主体（角色/状态）缓存，TTL 为 0 时关闭
+    AUTH_TOKEN_CACHE_TTL: float = float(os.getenv("AUTH_TOKEN_CACHE_TTL", "300"))
+    AUTH_TOKEN_CACHE_SIZE: int = int(os.getenv("AUTH_TOKEN_CACHE_SIZE", "10000"))
+    AUTH_PRINCIPAL_CACHE_TTL: float = float(os.getenv("AUTH_PRINCIPAL_CACHE_TTL", "60"))
+    AUTH_PRINCIPAL_CACHE_SIZE: int = int(os.getenv("AUTH_PRINCIPAL_CACHE_SIZE", "5000"))
+
+    # 购物车读取缓存（秒），增删改时立即失效，商品价格/库存变化最多延迟该时长；设为 0 关闭
+    CART_CACHE_TTL: float = float(os.getenv("CART_CACHE_TTL", "30"))
+    CART_CACHE_SIZE: int = int(os.getenv("CART_CACHE_SIZE", "10000"))
+
+    # 令牌吊销：各进程内存副本的同步间隔、过期记录清理间隔（秒）和布隆过滤器容量
+    REVOCATION_SYNC_SECONDS: float = float(os.getenv("REVOCATION_SYNC_SECONDS", "5"))
+    REVOCATION_PURGE_SECONDS: float = float(os.getenv("REVOCATION_PURGE_SECONDS", "3600"))
+    REVOCATION_BLOOM_CAPACITY: int = int(os.getenv("REVOCATION_BLOOM_CAPACITY", "100000"))
+    REVOCATION_BLOOM_ERROR_RATE: float = float(os.getenv("REVOCATION_BLOOM_ERROR_RATE", "0.001"))
+
+    # 库存预占：下单后多久未支付释放库存并取消订单（分钟）
+    INVENTORY_RESERVATION_TTL_MINUTES: int = int(os.getenv("INVENTORY_RESERVATION_TTL_MINUTES", "30"))
+    # 微信预支付单在预占到期时失效；到期后再等这段时间（秒）才取消订单，留给到期前完成的支付回调送达
+    ORDER_PAYMENT_GRACE_SECONDS: int = int(os.getenv("ORDER_PAYMENT_GRACE_SECONDS", "120"))
+
+    # 订单清理：过期预订单、超时未支付订单；多进程部署时由持有数据库锁的进程执行
+    ORDER_SWEEPER_ENABLED: bool = os.getenv("ORDER_SWEEPER_ENABLED", "True").lower() == "true"
+    ORDER_SWEEP_INTERVAL_SECONDS: float = float(os.getenv("ORDER_SWEEP_INTERVAL_SECONDS", "60"))
+    ORDER_SWEEP_BATCH_SIZE: int = int(os.getenv("ORDER_SWEEP_BATCH_SIZE", "200"))
+    ORDER_SWEEP_MAX_BATCHES: int = int(os.getenv("ORDER_SWEEP_MAX_BATCHES", "50"))
+    ORDER_SWEEP_LOCK_KEY: int = int(os.getenv("ORDER_SWEEP_LOCK_KEY", "720001"))
+
+    # 管理后台统计快照缓存时间（秒）
+    ADMIN_STATS_CACHE_TTL: int = int(os.getenv("ADMIN_STATS_CACHE_TTL", "60"))
+
     # 调试模式
     DEBUG: bool = os.getenv("DEBUG", "True").lower() == "true"
     
@@ -391,6 +391,14 @@ class VideoStatus(str, Enum):
     ERROR = "ERROR"
 
 
+class UploadSessionStatus(str, Enum):
+    UPLOADING = "UPLOADING"      # 接收分片中
+    ASSEMBLING = "ASSEMBLING"    # 合并校验中
+    COMPLETED = "COMPLETED"
+    FAILED = "FAILED"
+    ABORTED = "ABORTED"
+
+
 class VerificationStatus(str, Enum):
     PENDING = "PENDING"
     VERIFIED = "VERIFIED"
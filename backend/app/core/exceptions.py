@@ -168,6 +168,18 @@ class ExternalServiceException(TCMException):
         )
 
 
+class ServiceBusyException(TCMException):
+    """服务繁忙（排队已满），客户端应在 Retry-After 秒后重试"""
+    
+    def __init__(self, detail: str = "服务繁忙，请稍后重试", retry_after: int = 1, error_code: str = "SERVICE_BUSY"):
+        super().__init__(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=detail,
+            headers={"Retry-After": str(retry_after)},
+            error_code=error_code
+        )
+
+
 class ThirdPartyAPIException(TCMException):
     """第三方API异常"""
     
@@ -0,0 +1,141 @@
+"""
+流式数据导出
+
+按批次从数据库游标读取（yield_per，PostgreSQL下使用服务端游标），
+边读边编码为 CSV / NDJSON 输出，可选 gzip 压缩，内存占用与表大小无关。
+"""
+import csv
+import io
+import json
+import zlib
+from datetime import date, datetime
+from decimal import Decimal
+from enum import Enum
+from typing import Callable, Iterable, Iterator, List, Optional
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy.sql import Select
+
+from app.database import SessionLocal
+
+EXPORT_BATCH_SIZE = 1000
+
+EXPORT_FORMATS = {
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "json": ("application/x-ndjson", "ndjson"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+}
+
+
+def format_datetime(value: Optional[datetime]) -> str:
+    """CSV中的时间格式"""
+    return value.strftime("%Y-%m-%d %H:%M:%S") if value else ""
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, Enum):
+        return value.value
+    raise TypeError(f"无法序列化类型: {type(value).__name__}")
+
+
+def iter_rows(statement: Select, batch_size: int = EXPORT_BATCH_SIZE) -> Iterator:
+    """
+    分批迭代查询结果
+
+    使用独立会话：StreamingResponse 在路由返回后才开始输出，
+    此时请求依赖注入的会话可能已经关闭。
+    """
+    db = SessionLocal()
+    try:
+        result = db.execute(statement.execution_options(yield_per=batch_size))
+        for partition in result.partitions():
+            yield from partition
+    finally:
+        db.close()
+
+
+def iter_csv(header: List[str], rows: Iterable[list], batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[bytes]:
+    """逐批把行编码为CSV字节（带UTF-8 BOM，Excel可直接打开）"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    yield buffer.getvalue().encode("utf-8-sig")
+    buffer.seek(0)
+    buffer.truncate()
+
+    pending = 0
+    for row in rows:
+        writer.writerow(row)
+        pending += 1
+        if pending >= batch_size:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    if pending:
+        yield buffer.getvalue().encode("utf-8")
+
+
+def iter_ndjson(records: Iterable[dict], batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[bytes]:
+    """逐批把记录编码为NDJSON（每行一个JSON对象）"""
+    lines = []
+    for record in records:
+        lines.append(json.dumps(record, ensure_ascii=False, default=_json_default))
+        if len(lines) >= batch_size:
+            yield ("\n".join(lines) + "\n").encode("utf-8")
+            lines = []
+    if lines:
+        yield ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def iter_gzip(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """增量gzip压缩"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def export_response(
+    statement: Select,
+    format: str,
+    filename_prefix: str,
+    csv_header: List[str],
+    to_csv_row: Callable[[object], list],
+    to_record: Callable[[object], dict],
+    gzip: bool = False
+) -> StreamingResponse:
+    """
+    构造流式导出响应
+
+    statement: 查询语句（建议只选取需要的列）
+    to_csv_row / to_record: 把一行查询结果转换为CSV行 / JSON对象
+    """
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"不支持的导出格式: {format}")
+    media_type, extension = EXPORT_FORMATS[format]
+
+    rows = iter_rows(statement)
+    if extension == "csv":
+        body = iter_csv(csv_header, (to_csv_row(row) for row in rows))
+    else:
+        body = iter_ndjson(to_record(row) for row in rows)
+
+    filename = f"{filename_prefix}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}"
+    if gzip:
+        body = iter_gzip(body)
+        media_type = "application/gzip"
+        filename += ".gz"
+
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
@@ -0,0 +1,70 @@
+"""
+密码哈希专用线程池
+
+bcrypt 单次计算需要 100~300ms CPU，在事件循环里执行会卡住同一进程的所有请求：
+- 哈希/校验统一提交到固定大小的线程池（bcrypt 计算期间释放 GIL，线程可并行占用多核）
+- 在途 + 排队的任务数有上限，超过时立即抛出 ServiceBusyException（503 + Retry-After），
+  登录洪峰只会让部分登录快速失败，不会无限排队拖垮其他接口
+- async 接口通过 asyncio.wrap_future 等待结果，同步接口（线程池中的 def 路由、脚本）直接等待
+"""
+import asyncio
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+from app.core.exceptions import ServiceBusyException
+
+
+class PasswordHasher:
+    """有界的密码哈希执行器"""
+
+    def __init__(self, workers: int = 2, max_pending: int = 32, retry_after: int = 1):
+        self.workers = max(int(workers), 1)
+        self.max_pending = max(int(max_pending), self.workers)
+        self.retry_after = retry_after
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password-hash")
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._lock = threading.Lock()
+        self._pending = 0
+
+        # 运行统计
+        self.completed = 0
+        self.rejected = 0
+
+    def submit(self, fn: Callable[..., Any], *args: Any) -> Future:
+        """提交一次哈希计算；排队已满时抛出 ServiceBusyException"""
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise ServiceBusyException("登录请求过多，请稍后重试", retry_after=self.retry_after)
+
+        with self._lock:
+            self._pending += 1
+        try:
+            future = self._executor.submit(fn, *args)
+        except BaseException:
+            self._release(None)
+            raise
+        future.add_done_callback(self._release)
+        return future
+
+    def _release(self, future):
+        with self._lock:
+            self._pending -= 1
+            if future is not None and not future.cancelled():
+                self.completed += 1
+        self._slots.release()
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        return await asyncio.wrap_future(self.submit(fn, *args))
+
+    def run_sync(self, fn: Callable[..., Any], *args: Any) -> Any:
+        return self.submit(fn, *args).result()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "workers": self.workers,
+            "pending": self._pending,
+            "completed": self.completed,
+            "rejected": self.rejected
+        }
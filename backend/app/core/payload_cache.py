@@ -0,0 +1,114 @@
+"""
+预编码响应缓存
+
+内容只随部署变化的接口（问卷、知识库等）构建一次后缓存为 JSON 字节：
+- 按 (名称, 版本) 缓存，每个版本只构建一次
+- 强 ETag 取自内容哈希，If-None-Match 命中时返回 304
+- 同时缓存 gzip 版本，客户端支持时直接返回压缩后的字节
+"""
+import gzip
+import hashlib
+import json
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from starlette.requests import Request
+from starlette.responses import Response
+
+DEFAULT_CACHE_CONTROL = "public, max-age=300"
+GZIP_MIN_SIZE = 1024
+
+
+def encode_json(data: Any) -> bytes:
+    """与 FastAPI 默认 JSONResponse 相同的编码方式"""
+    return json.dumps(
+        data,
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":")
+    ).encode("utf-8")
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if if_none_match is None:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
+
+class CompiledPayload:
+    """预编码的 JSON 响应体"""
+
+    __slots__ = ("body", "gzip_body", "etag", "gzip_etag", "cache_control")
+
+    def __init__(self, body: bytes, cache_control: str = DEFAULT_CACHE_CONTROL):
+        digest = hashlib.sha256(body).hexdigest()[:32]
+        self.body = body
+        self.etag = f'"{digest}"'
+        self.cache_control = cache_control
+        if len(body) >= GZIP_MIN_SIZE:
+            self.gzip_body = gzip.compress(body, compresslevel=9, mtime=0)
+            self.gzip_etag = f'"{digest}-gzip"'
+        else:
+            self.gzip_body = None
+            self.gzip_etag = None
+
+    @classmethod
+    def from_data(cls, data: Any, cache_control: str = DEFAULT_CACHE_CONTROL) -> "CompiledPayload":
+        return cls(encode_json(data), cache_control)
+
+    def _accepts_gzip(self, request: Request) -> bool:
+        return self.gzip_body is not None and "gzip" in request.headers.get("accept-encoding", "")
+
+    def response(self, request: Request) -> Response:
+        """返回完整响应，或在客户端缓存仍有效时返回 304"""
+        use_gzip = self._accepts_gzip(request)
+        etag = self.gzip_etag if use_gzip else self.etag
+        headers = {"ETag": etag, "Cache-Control": self.cache_control}
+        if self.gzip_body is not None:
+            headers["Vary"] = "Accept-Encoding"
+
+        if_none_match = request.headers.get("if-none-match")
+        if _etag_matches(if_none_match, self.etag) or (
+            self.gzip_etag is not None and _etag_matches(if_none_match, self.gzip_etag)
+        ):
+            return Response(status_code=304, headers=headers)
+
+        if use_gzip:
+            headers["Content-Encoding"] = "gzip"
+            return Response(self.gzip_body, media_type="application/json", headers=headers)
+        return Response(self.body, media_type="application/json", headers=headers)
+
+
+class PayloadCache:
+    """按 (名称, 版本) 缓存预编码响应，每个键只构建一次"""
+
+    def __init__(self):
+        self._payloads: Dict[Hashable, CompiledPayload] = {}
+        self._lock = threading.Lock()
+
+    def get(
+        self,
+        key: Hashable,
+        builder: Callable[[], Any],
+        cache_control: str = DEFAULT_CACHE_CONTROL
+    ) -> CompiledPayload:
+        payload = self._payloads.get(key)
+        if payload is not None:
+            return payload
+        with self._lock:
+            payload = self._payloads.get(key)
+            if payload is None:
+                payload = self._payloads[key] = CompiledPayload.from_data(builder(), cache_control)
+            return payload
+
+    def invalidate(self, key: Optional[Hashable] = None):
+        with self._lock:
+            if key is None:
+                self._payloads.clear()
+            else:
+                self._payloads.pop(key, None)
+
+
+payload_cache = PayloadCache()
@@ -0,0 +1,224 @@
+"""
+性能监控 - 事件循环阻塞检测与慢接口统计（可选开启）
+
+- LoopLagMonitor: 后台协程按固定间隔休眠，实际唤醒延迟即事件循环延迟；
+  延迟超过阈值时记录当时正在处理的请求，用于定位在 async 路由里做了阻塞操作的接口
+- PerfMonitorMiddleware: 按路由模板记录请求耗时，写入固定大小的对数分桶直方图（HDR风格）
+- 未开启时不注册中间件、不启动采样协程，没有额外开销
+"""
+import asyncio
+import logging
+import time
+from typing import Dict, Optional
+
+logger = logging.getLogger("performance")
+
+
+class LatencyHistogram:
+    """
+    固定大小的对数-线性分桶直方图（单位：微秒）
+
+    每个2的幂区间再均分为 2^(SUB_BITS-1) 个子桶，相对误差约 1/2^SUB_BITS，
+    记录和查询都不分配内存，桶数量固定，与样本数无关。
+    """
+
+    SUB_BITS = 5
+    SUB_COUNT = 1 << SUB_BITS          # 32
+    HALF_SUB_COUNT = SUB_COUNT >> 1    # 16
+    MAX_VALUE = (1 << 36) - 1          # 约19小时
+    BUCKET_COUNT = SUB_COUNT + (36 - SUB_BITS) * HALF_SUB_COUNT
+
+    __slots__ = ("counts", "total", "sum", "max")
+
+    def __init__(self):
+        self.counts = [0] * self.BUCKET_COUNT
+        self.total = 0
+        self.sum = 0
+        self.max = 0
+
+    @classmethod
+    def _index(cls, value: int) -> int:
+        if value < cls.SUB_COUNT:
+            return value
+        shift = value.bit_length() - cls.SUB_BITS
+        mantissa = value >> shift
+        return cls.SUB_COUNT + (shift - 1) * cls.HALF_SUB_COUNT + (mantissa - cls.HALF_SUB_COUNT)
+
+    @classmethod
+    def _bucket_value(cls, index: int) -> int:
+        """桶的代表值（区间中点）"""
+        if index < cls.SUB_COUNT:
+            return index
+        offset = index - cls.SUB_COUNT
+        shift = offset // cls.HALF_SUB_COUNT + 1
+        mantissa = offset % cls.HALF_SUB_COUNT + cls.HALF_SUB_COUNT
+        low = mantissa << shift
+        return low + ((1 << shift) >> 1)
+
+    def record(self, value_us: int):
+        value_us = min(max(int(value_us), 0), self.MAX_VALUE)
+        self.counts[self._index(value_us)] += 1
+        self.total += 1
+        self.sum += value_us
+        if value_us > self.max:
+            self.max = value_us
+
+    def percentile(self, p: float) -> int:
+        """返回第p百分位的近似值（微秒）"""
+        if self.total == 0:
+            return 0
+        target = max(1, int(self.total * p / 100.0 + 0.5))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if count:
+                seen += count
+                if seen >= target:
+                    return min(self._bucket_value(index), self.max)
+        return self.max
+
+    def summary(self) -> dict:
+        """汇总（毫秒）"""
+        return {
+            "count": self.total,
+            "mean_ms": round(self.sum / self.total / 1000, 3) if self.total else 0,
+            "p50_ms": round(self.percentile(50) / 1000, 3),
+            "p95_ms": round(self.percentile(95) / 1000, 3),
+            "p99_ms": round(self.percentile(99) / 1000, 3),
+            "max_ms": round(self.max / 1000, 3),
+        }
+
+
+def route_key_for(scope: dict) -> str:
+    """
+    统计用的路由键
+    路由匹配后 scope 中带有路由对象，按模板聚合，避免路径参数导致键无限增长
+    """
+    route = scope.get("route")
+    if route is not None:
+        return f"{scope['method']} {route.path}"
+    return f"{scope['method']} <unmatched>"
+
+
+class PerfRegistry:
+    """性能数据汇总：路由耗时直方图、事件循环延迟、进行中的请求"""
+
+    def __init__(self, lag_threshold_ms: float = 100):
+        self.lag_threshold_ms = lag_threshold_ms
+        self.routes: Dict[str, LatencyHistogram] = {}
+        self.loop_lag = LatencyHistogram()
+        self.blocking_events: Dict[str, dict] = {}
+        self.in_flight: Dict[int, dict] = {}  # 请求ID -> ASGI scope
+        self._next_request_id = 0
+
+    def begin(self, scope: dict) -> int:
+        self._next_request_id += 1
+        self.in_flight[self._next_request_id] = scope
+        return self._next_request_id
+
+    def end(self, request_id: int, elapsed_us: int):
+        scope = self.in_flight.pop(request_id, None)
+        if scope is None:
+            return
+        route_key = route_key_for(scope)
+        histogram = self.routes.get(route_key)
+        if histogram is None:
+            histogram = self.routes[route_key] = LatencyHistogram()
+        histogram.record(elapsed_us)
+
+    def record_lag(self, lag_ms: float):
+        self.loop_lag.record(lag_ms * 1000)
+        if lag_ms < self.lag_threshold_ms:
+            return
+
+        # 阻塞期间正在处理的请求即为嫌疑路由
+        suspects = sorted({route_key_for(scope) for scope in self.in_flight.values()})
+        for route in suspects:
+            event = self.blocking_events.setdefault(route, {"count": 0, "max_lag_ms": 0.0})
+            event["count"] += 1
+            event["max_lag_ms"] = round(max(event["max_lag_ms"], lag_ms), 3)
+        logger.warning(
+            f"事件循环阻塞 {lag_ms:.1f}ms（阈值 {self.lag_threshold_ms}ms），"
+            f"进行中的请求: {', '.join(suspects) or '无'}"
+        )
+
+    def snapshot(self) -> dict:
+        routes = {
+            key: histogram.summary()
+            for key, histogram in sorted(self.routes.items(), key=lambda item: -item[1].percentile(99))
+        }
+        return {
+            "enabled": True,
+            "loop_lag": {**self.loop_lag.summary(), "threshold_ms": self.lag_threshold_ms},
+            "blocking_routes": self.blocking_events,
+            "in_flight": len(self.in_flight),
+            "routes": routes,
+        }
+
+
+class LoopLagMonitor:
+    """事件循环延迟采样器"""
+
+    def __init__(self, registry: PerfRegistry, interval_ms: float = 50):
+        self.registry = registry
+        self.interval = interval_ms / 1000
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag_ms = (time.perf_counter() - start - self.interval) * 1000
+            self.registry.record_lag(max(lag_ms, 0.0))
+
+
+class PerfMonitorMiddleware:
+    """按路由模板统计请求耗时的ASGI中间件"""
+
+    def __init__(self, app, registry: "PerfRegistry"):
+        self.app = app
+        self.registry = registry
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = self.registry.begin(scope)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.registry.end(request_id, int((time.perf_counter() - start) * 1_000_000))
+
+
+# 全局单例（仅在开启时创建）
+perf_registry: Optional[PerfRegistry] = None
+loop_lag_monitor: Optional[LoopLagMonitor] = None
+
+
+def init_perf_monitor(lag_threshold_ms: float, sample_interval_ms: float) -> PerfRegistry:
+    """创建全局性能监控实例"""
+    global perf_registry, loop_lag_monitor
+    perf_registry = PerfRegistry(lag_threshold_ms=lag_threshold_ms)
+    loop_lag_monitor = LoopLagMonitor(perf_registry, interval_ms=sample_interval_ms)
+    return perf_registry
+
+
+def get_perf_snapshot() -> dict:
+    """获取性能数据快照"""
+    if perf_registry is None:
+        return {"enabled": False}
+    return perf_registry.snapshot()
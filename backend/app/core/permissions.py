@@ -6,27 +6,27 @@ from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
 import jwt
+from app.core.auth_context import Principal, principal_cache, token_cache
 from app.core.config import settings
+from app.core.revocation_store import revocation_store
 from app.database import get_db
 from app.models import User
 from app.models.user import UserRole, UserStatus
 
 security = HTTPBearer()
 
-def verify_token(token: str) -> Optional[dict]:
-    """验证JWT token"""
+def _decode_token(token: str) -> Optional[dict]:
     try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        return payload
+        return jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
     except jwt.PyJWTError:
         return None
 
-def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
-):
-    """获取当前用户"""
-    token = credentials.credentials
+def verify_token(token: str) -> Optional[dict]:
+    """验证JWT token（解码结果按 token 哈希缓存）"""
+    return token_cache.decode(token, _decode_token)
+
+def resolve_principal(token: str, db: Session) -> Principal:
+    """由 token 得到当前用户的鉴权信息，缓存命中时不访问数据库"""
     payload = verify_token(token)
     
     if payload is None:
@@ -36,22 +36,39 @@ def get_current_user(
         )
     
     user_email = payload.get("sub")
-    if not user_email:
+    if not user_email or payload.get("type", "access") != "access":
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid token payload"
         )
     
-    user = db.query(User).filter(User.email == user_email).first()
-    if not user:
+    # 注销/封禁/改密后吊销的令牌（内存判断，不访问数据库）
+    if revocation_store.is_revoked(payload):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token revoked"
+        )
+    
+    principal = principal_cache.resolve(
+        user_email,
+        lambda: db.query(User).filter(User.email == user_email).first()
+    )
+    if principal is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found"
         )
     
-    return user
+    return principal
 
-def get_current_active_user(current_user: User = Depends(get_current_user)):
+def get_current_user(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: Session = Depends(get_db)
+) -> Principal:
+    """获取当前用户（Principal，只含 id/邮箱/用户名/角色/状态）"""
+    return resolve_principal(credentials.credentials, db)
+
+def get_current_active_user(current_user: Principal = Depends(get_current_user)) -> Principal:
     """获取当前活跃用户"""
     if not current_user.is_active or current_user.status == UserStatus.BANNED:
         raise HTTPException(
@@ -73,9 +90,22 @@ def get_current_active_user(current_user: User = Depends(get_current_user)):
     
     return current_user
 
+def get_current_db_user(
+    current_user: Principal = Depends(get_current_user),
+    db: Session = Depends(get_db)
+) -> User:
+    """获取当前用户的 ORM 对象（需要读写完整用户资料时使用）"""
+    user = db.query(User).filter(User.id == current_user.id).first()
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found"
+        )
+    return user
+
 def require_roles(required_roles: List[UserRole]):
     """要求特定角色权限的装饰器工厂"""
-    def role_checker(current_user: User = Depends(get_current_active_user)):
+    def role_checker(current_user: Principal = Depends(get_current_active_user)):
         if current_user.role not in required_roles:
             role_names = [role.value for role in required_roles]
             raise HTTPException(
@@ -85,11 +115,11 @@ def require_roles(required_roles: List[UserRole]):
         return current_user
     return role_checker
 
-def require_user_role(current_user: User = Depends(get_current_active_user)):
+def require_user_role(current_user: Principal = Depends(get_current_active_user)):
     """要求用户角色"""
     return current_user  # 已通过 get_current_active_user 验证
 
-def require_vip_role(current_user: User = Depends(get_current_active_user)):
+def require_vip_role(current_user: Principal = Depends(get_current_active_user)):
     """要求VIP角色"""
     if current_user.role not in [UserRole.VIP, UserRole.DOCTOR, UserRole.ADMIN, UserRole.SUPER_ADMIN]:
         raise HTTPException(
@@ -98,7 +128,7 @@ def require_vip_role(current_user: User = Depends(get_current_active_user)):
         )
     return current_user
 
-def require_doctor_role(current_user: User = Depends(get_current_active_user)):
+def require_doctor_role(current_user: Principal = Depends(get_current_active_user)):
     """要求医生角色"""
     if current_user.role not in [UserRole.DOCTOR, UserRole.ADMIN, UserRole.SUPER_ADMIN]:
         raise HTTPException(
@@ -107,7 +137,7 @@ def require_doctor_role(current_user: User = Depends(get_current_active_user)):
         )
     return current_user
 
-def require_admin_role(current_user: User = Depends(get_current_active_user)):
+def require_admin_role(current_user: Principal = Depends(get_current_active_user)):
     """要求管理员角色"""
     if current_user.role not in [UserRole.ADMIN, UserRole.SUPER_ADMIN]:
         raise HTTPException(
@@ -116,7 +146,7 @@ def require_admin_role(current_user: User = Depends(get_current_active_user)):
         )
     return current_user
 
-def require_super_admin_role(current_user: User = Depends(get_current_active_user)):
+def require_super_admin_role(current_user: Principal = Depends(get_current_active_user)):
     """要求超级管理员角色"""
     if current_user.role != UserRole.SUPER_ADMIN:
         raise HTTPException(
@@ -126,7 +156,7 @@ def require_super_admin_role(current_user: User = Depends(get_current_active_use
     return current_user
 
 # 为了向后兼容，保留旧的函数名
-def require_admin(current_user: User = Depends(get_current_user)):
+def require_admin(current_user: Principal = Depends(get_current_user)):
     """要求管理员权限（兼容性）"""
     if not current_user.is_admin and current_user.role not in [UserRole.ADMIN, UserRole.SUPER_ADMIN]:
         raise HTTPException(
@@ -135,7 +165,7 @@ def require_admin(current_user: User = Depends(get_current_user)):
         )
     return current_user
 
-def require_super_admin(current_user: User = Depends(get_current_user)):
+def require_super_admin(current_user: Principal = Depends(get_current_user)):
     """要求超级管理员权限（兼容性）"""
     if not current_user.is_super_admin and current_user.role != UserRole.SUPER_ADMIN:
         raise HTTPException(
@@ -144,7 +174,7 @@ def require_super_admin(current_user: User = Depends(get_current_user)):
         )
     return current_user
 
-def check_resource_ownership(current_user: User, resource_user_id: int):
+def check_resource_ownership(current_user: Principal, resource_user_id: int):
     """检查资源所有权"""
     if current_user.role not in [UserRole.ADMIN, UserRole.SUPER_ADMIN] and current_user.id != resource_user_id:
         raise HTTPException(
@@ -1,123 +1,514 @@
 """
 API速率限制中间件
+
+限流算法采用滑动窗口计数器（sliding window counter）：
+每个键只保存"当前窗口计数 + 上一窗口计数"，按时间比例加权估算，
+单次检查 O(1)，不再为每个IP保存时间戳列表。
+
+存储后端：
+- MemoryBackend: 进程内存，LRU淘汰空闲键，内存有上限（单worker）
+- SQLiteBackend: SQLite WAL共享文件，同一节点所有uvicorn worker共用一个限额
+  （检查在线程池中执行，不阻塞事件循环；数据库繁忙或出错时放行请求并记录警告）
 """
+import logging
+import math
+import sqlite3
+import threading
 import time
-from collections import defaultdict
-from typing import Dict, Optional
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Set, Tuple
 from fastapi import Request, HTTPException, status
 from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
 from starlette.middleware.base import BaseHTTPMiddleware
 
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class RateLimitResult:
+    """单次限流检查结果"""
+    allowed: bool
+    limit: int
+    remaining: int
+    reset_at: int  # 当前窗口结束的时间戳（秒）
+
+
+def _slide(entry: Optional[Tuple[int, int, int]], window_index: int) -> Tuple[int, int]:
+    """
+    把存储的 (窗口序号, 当前计数, 上一窗口计数) 滑动到 window_index
+    返回: (当前窗口计数, 上一窗口计数)
+    """
+    if entry is None:
+        return 0, 0
+    stored_index, current, previous = entry
+    if stored_index == window_index:
+        return current, previous
+    if stored_index == window_index - 1:
+        return 0, current
+    return 0, 0
+
+
+def _evaluate(current: int, previous: int, now: float, window_index: int,
+              max_requests: int, window_seconds: int) -> Tuple[bool, int]:
+    """
+    滑动窗口计数器估算
+    返回: (是否允许, 本次之后的剩余次数)
+    """
+    elapsed_ratio = (now - window_index * window_seconds) / window_seconds
+    estimated = previous * (1.0 - elapsed_ratio) + current
+    if estimated + 1 > max_requests:
+        return False, 0
+    return True, max(0, int(max_requests - estimated - 1))
+
+
+class RateLimitBackend:
+    """限流存储后端基类"""
+
+    def hit(self, key: str, max_requests: int, window_seconds: int,
+            now: Optional[float] = None) -> RateLimitResult:
+        """检查并（允许时）记录一次请求"""
+        raise NotImplementedError
+
+    def peek(self, key: str, max_requests: int, window_seconds: int,
+             now: Optional[float] = None) -> int:
+        """查询剩余次数，不记录请求"""
+        raise NotImplementedError
+
+    def reset(self, key: Optional[str] = None):
+        """清除指定键（或全部键）的计数"""
+        raise NotImplementedError
+
+
+class MemoryBackend(RateLimitBackend):
+    """进程内存后端 - 有界LRU，超出上限时淘汰最久未访问的键"""
+
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        self._entries: "OrderedDict[str, Tuple[int, int, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def hit(self, key: str, max_requests: int, window_seconds: int,
+            now: Optional[float] = None) -> RateLimitResult:
+        now = time.time() if now is None else now
+        window_index = int(now // window_seconds)
+        reset_at = (window_index + 1) * window_seconds
+
+        with self._lock:
+            current, previous = _slide(self._entries.get(key), window_index)
+            allowed, remaining = _evaluate(
+                current, previous, now, window_index, max_requests, window_seconds
+            )
+            if allowed:
+                current += 1
+
+            self._entries[key] = (window_index, current, previous)
+            self._entries.move_to_end(key)
+
+            # 淘汰最久未访问的键
+            while len(self._entries) > self.max_keys:
+                self._entries.popitem(last=False)
+
+        return RateLimitResult(allowed, max_requests, remaining, reset_at)
+
+    def peek(self, key: str, max_requests: int, window_seconds: int,
+             now: Optional[float] = None) -> int:
+        now = time.time() if now is None else now
+        window_index = int(now // window_seconds)
+        with self._lock:
+            current, previous = _slide(self._entries.get(key), window_index)
+        elapsed_ratio = (now - window_index * window_seconds) / window_seconds
+        estimated = previous * (1.0 - elapsed_ratio) + current
+        return max(0, int(max_requests - estimated))
+
+    def reset(self, key: Optional[str] = None):
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteBackend(RateLimitBackend):
+    """
+    SQLite WAL共享后端 - 同一节点上的所有worker进程共用同一个限额
+
+    每次检查在一个 BEGIN IMMEDIATE 事务内完成"读-算-写"，
+    过期键按 expires_at 索引定期批量清理，表大小只与活跃IP数相关。
+    """
+
+    PURGE_EVERY = 1000  # 每处理多少次请求清理一次过期键
+
+    def __init__(self, path: str, busy_timeout_ms: int = 2000):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            path, timeout=busy_timeout_ms / 1000, isolation_level=None, check_same_thread=False
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(f"PRAGMA busy_timeout={int(busy_timeout_ms)}")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS rate_limits ("
+            "key TEXT PRIMARY KEY, window_index INTEGER NOT NULL, "
+            "current_count INTEGER NOT NULL, previous_count INTEGER NOT NULL, "
+            "expires_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS ix_rate_limits_expires_at ON rate_limits (expires_at)"
+        )
+        self._hits = 0
+
+    def hit(self, key: str, max_requests: int, window_seconds: int,
+            now: Optional[float] = None) -> RateLimitResult:
+        now = time.time() if now is None else now
+        window_index = int(now // window_seconds)
+        reset_at = (window_index + 1) * window_seconds
+
+        with self._lock:
+            conn = self._conn
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT window_index, current_count, previous_count FROM rate_limits WHERE key = ?",
+                    (key,)
+                ).fetchone()
+                current, previous = _slide(row, window_index)
+                allowed, remaining = _evaluate(
+                    current, previous, now, window_index, max_requests, window_seconds
+                )
+                if allowed:
+                    current += 1
+                conn.execute(
+                    "INSERT OR REPLACE INTO rate_limits "
+                    "(key, window_index, current_count, previous_count, expires_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (key, window_index, current, previous, reset_at + window_seconds)
+                )
+
+                self._hits += 1
+                if self._hits % self.PURGE_EVERY == 0:
+                    conn.execute("DELETE FROM rate_limits WHERE expires_at < ?", (now,))
+
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+        return RateLimitResult(allowed, max_requests, remaining, reset_at)
+
+    def peek(self, key: str, max_requests: int, window_seconds: int,
+             now: Optional[float] = None) -> int:
+        now = time.time() if now is None else now
+        window_index = int(now // window_seconds)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT window_index, current_count, previous_count FROM rate_limits WHERE key = ?",
+                (key,)
+            ).fetchone()
+        current, previous = _slide(row, window_index)
+        elapsed_ratio = (now - window_index * window_seconds) / window_seconds
+        estimated = previous * (1.0 - elapsed_ratio) + current
+        return max(0, int(max_requests - estimated))
+
+    def reset(self, key: Optional[str] = None):
+        with self._lock:
+            if key is None:
+                self._conn.execute("DELETE FROM rate_limits")
+            else:
+                self._conn.execute("DELETE FROM rate_limits WHERE key = ?", (key,))
+
+
+# 全局单例
+_rate_limit_backend: Optional[RateLimitBackend] = None
+
+
+def get_rate_limit_backend() -> RateLimitBackend:
+    """根据配置获取限流存储后端单例（RATE_LIMIT_BACKEND: memory / sqlite）"""
+    global _rate_limit_backend
+    if _rate_limit_backend is None:
+        if settings.RATE_LIMIT_BACKEND == "sqlite":
+            _rate_limit_backend = SQLiteBackend(settings.RATE_LIMIT_SQLITE_PATH)
+        else:
+            _rate_limit_backend = MemoryBackend(max_keys=settings.RATE_LIMIT_MAX_KEYS)
+    return _rate_limit_backend
+
 
 class RateLimiter:
-    def __init__(self, max_requests: int = 100, window_seconds: int = 60):
+    def __init__(self, max_requests: int = 100, window_seconds: int = 60,
+                 name: str = "default", backend: Optional[RateLimitBackend] = None):
         self.max_requests = max_requests
         self.window_seconds = window_seconds
-        self.requests: Dict[str, list] = defaultdict(list)
-    
+        self.name = name
+        self._backend = backend
+
+    @property
+    def backend(self) -> RateLimitBackend:
+        """未显式指定后端时，延迟使用全局共享后端"""
+        if self._backend is None:
+            self._backend = get_rate_limit_backend()
+        return self._backend
+
+    def _key(self, client_ip: str) -> str:
+        return f"{self.name}:{client_ip}"
+
+    def check(self, client_ip: str) -> RateLimitResult:
+        """检查并记录一次请求"""
+        return self.backend.hit(self._key(client_ip), self.max_requests, self.window_seconds)
+
     def is_allowed(self, client_ip: str) -> tuple[bool, Optional[int]]:
         """
         检查IP是否在速率限制内
         返回: (是否允许, 重置时间戳)
         """
-        now = time.time()
-        window_start = now - self.window_seconds
-        
-        # 清理过期请求
-        self.requests[client_ip] = [
-            req_time for req_time in self.requests[client_ip] 
-            if req_time > window_start
-        ]
-        
-        # 检查当前窗口内的请求数
-        if len(self.requests[client_ip]) >= self.max_requests:
-            # 计算重置时间
-            reset_time = int(self.requests[client_ip][0] + self.window_seconds)
-            return False, reset_time
-        
-        # 记录当前请求
-        self.requests[client_ip].append(now)
+        result = self.check(client_ip)
+        if not result.allowed:
+            return False, result.reset_at
         return True, None
-    
+
     def get_remaining(self, client_ip: str) -> int:
         """获取剩余请求次数"""
-        return max(0, self.max_requests - len(self.requests[client_ip]))
+        return self.backend.peek(self._key(client_ip), self.max_requests, self.window_seconds)
+
+
+# 不同API的速率限制策略
+class APIRateLimits:
+    # 登录接口 - 防暴力破解，最严格
+    LOGIN_LIMITER = RateLimiter(max_requests=5, window_seconds=60, name="login")
+
+    # 认证相关API - 更严格的限制
+    AUTH_LIMITER = RateLimiter(max_requests=10, window_seconds=60, name="auth")
+
+    # 支付相关API - 非常严格的限制
+    PAYMENT_LIMITER = RateLimiter(max_requests=5, window_seconds=60, name="payment")
+
+    # 下单接口
+    ORDER_LIMITER = RateLimiter(max_requests=20, window_seconds=60, name="order")
+
+    # 文件上传API - 限制上传频率
+    UPLOAD_LIMITER = RateLimiter(max_requests=20, window_seconds=60, name="upload")
+
+    # 普通API
+    GENERAL_LIMITER = RateLimiter(max_requests=100, window_seconds=60, name="general")
+
+
+# 路由策略规则：(HTTP方法集合 / None表示全部方法, 路由模板前缀, 限流器属性名 / None表示不限流)
+# 按顺序匹配，第一条命中的规则生效；只在编译路由表时使用一次
+ROUTE_POLICY_RULES: List[Tuple[Optional[Set[str]], str, Optional[str]]] = [
+    ({"POST"}, "/api/auth/login", "LOGIN_LIMITER"),
+    ({"POST"}, "/api/auth/simple-login", "LOGIN_LIMITER"),
+    ({"POST"}, "/api/users/login", "LOGIN_LIMITER"),
+    ({"POST"}, "/api/users/token", "LOGIN_LIMITER"),
+    ({"PUT"}, "/api/users/me/password", "LOGIN_LIMITER"),
+    (None, "/api/auth/", "AUTH_LIMITER"),
+    ({"POST"}, "/api/users/register", "AUTH_LIMITER"),
+    # 微信支付回调来自微信服务器，不能按IP限流，否则会丢通知
+    (None, "/api/wechat-pay/notify", None),
+    ({"POST"}, "/api/wechat-pay/native", "PAYMENT_LIMITER"),
+    ({"POST"}, "/api/wechat-pay/h5", "PAYMENT_LIMITER"),
+    ({"POST"}, "/api/wechat-pay/jsapi", "PAYMENT_LIMITER"),
+    ({"POST"}, "/api/orders/", "ORDER_LIMITER"),
+    ({"POST"}, "/api/draft-orders/", "ORDER_LIMITER"),
+    ({"POST"}, "/api/simple-orders", "ORDER_LIMITER"),
+    ({"POST"}, "/api/simple/orders/", "ORDER_LIMITER"),
+    (None, "/api/upload", "UPLOAD_LIMITER"),
+    (None, "/api/admin/upload/", "UPLOAD_LIMITER"),
+    # 视频分片由管理员并行上传，一个文件可达数百片，按IP限流会打断上传
+    ({"PUT"}, "/api/video/admin/lessons/uploads/", None),
+]
+
+_NO_LIMIT = object()  # 规则显式豁免限流的标记
+
+
+class _RouteNode:
+    """路由前缀树节点（按路径段分层）"""
+    __slots__ = ("children", "param", "catch_all", "policies")
+
+    def __init__(self):
+        self.children: Dict[str, "_RouteNode"] = {}
+        self.param: Optional["_RouteNode"] = None      # {xxx} 单段参数
+        self.catch_all: Optional[Dict[str, object]] = None  # {xxx:path} 剩余路径
+        self.policies: Optional[Dict[str, object]] = None   # 方法 -> 限流器
+
+
+class RoutePolicyTable:
+    """
+    路由限流策略表
+
+    处理首个请求前把应用的路由模板编译成按路径段分层的前缀树，
+    请求到来时按路径段逐层查找，耗时只与路径长度相关，与路由数量无关。
+    未命中任何路由的请求（静态文件、404等）使用默认限流器。
+    """
+
+    def __init__(self, default_limiter: Optional[RateLimiter] = None):
+        self.default_limiter = default_limiter or APIRateLimits.GENERAL_LIMITER
+        self._root = _RouteNode()
+
+    @classmethod
+    def compile(cls, routes, rules=None, default_limiter: Optional[RateLimiter] = None) -> "RoutePolicyTable":
+        """根据应用路由和策略规则编译策略表"""
+        table = cls(default_limiter)
+        rules = ROUTE_POLICY_RULES if rules is None else rules
+        for route in routes:
+            path = getattr(route, "path", None)
+            methods = getattr(route, "methods", None)
+            if not path or not methods:
+                continue
+            for method in methods:
+                table.add(path, method, table._match_rule(rules, path, method))
+        return table
+
+    def _match_rule(self, rules, path: str, method: str):
+        for rule_methods, prefix, limiter_name in rules:
+            if rule_methods is not None and method not in rule_methods:
+                continue
+            if path.startswith(prefix):
+                return getattr(APIRateLimits, limiter_name) if limiter_name else _NO_LIMIT
+        return self.default_limiter
+
+    def add(self, path_template: str, method: str, policy):
+        """注册一条路由模板的策略"""
+        node = self._root
+        for segment in _split_path(path_template):
+            if segment.startswith("{") and segment.endswith("}"):
+                if segment.endswith(":path}"):
+                    if node.catch_all is None:
+                        node.catch_all = {}
+                    node.catch_all[method] = policy
+                    return
+                if node.param is None:
+                    node.param = _RouteNode()
+                node = node.param
+            else:
+                node = node.children.setdefault(segment, _RouteNode())
+        if node.policies is None:
+            node.policies = {}
+        node.policies[method] = policy
+
+    def resolve(self, path: str, method: str) -> Optional[RateLimiter]:
+        """查找请求对应的限流器，返回None表示该路由豁免限流"""
+        policy = self._lookup(self._root, _split_path(path), 0, method)
+        if policy is None:
+            return self.default_limiter
+        if policy is _NO_LIMIT:
+            return None
+        return policy
+
+    def _lookup(self, node: _RouteNode, segments: List[str], index: int, method: str):
+        if index == len(segments):
+            if node.policies is not None:
+                return node.policies.get(method)
+            return None
+
+        # 字面段优先，其次单段参数，最后剩余路径参数（与路由声明的常见写法一致）
+        child = node.children.get(segments[index])
+        if child is not None:
+            policy = self._lookup(child, segments, index + 1, method)
+            if policy is not None:
+                return policy
+        if node.param is not None:
+            policy = self._lookup(node.param, segments, index + 1, method)
+            if policy is not None:
+                return policy
+        if node.catch_all is not None:
+            return node.catch_all.get(method)
+        return None
+
+
+def _split_path(path: str) -> List[str]:
+    """按"/"切分路径；保留末尾斜杠的空段，以区分 /api/orders 与 /api/orders/"""
+    return path.split("/")[1:]
+
+
+# 全局路由策略表（限流中间件处理首个请求时编译）
+_route_policy_table: Optional[RoutePolicyTable] = None
+
+
+def compile_route_policies(routes, rules=None, default_limiter: Optional[RateLimiter] = None) -> RoutePolicyTable:
+    """编译并设置全局路由策略表，应在所有路由注册完成后调用"""
+    global _route_policy_table
+    _route_policy_table = RoutePolicyTable.compile(routes, rules, default_limiter)
+    return _route_policy_table
+
+
+def get_rate_limiter(endpoint: str, method: str = "GET") -> Optional[RateLimiter]:
+    """根据API端点返回对应的速率限制器，返回None表示不限流"""
+    if _route_policy_table is None:
+        return APIRateLimits.GENERAL_LIMITER
+    return _route_policy_table.resolve(endpoint, method)
 
 
 class RateLimitMiddleware(BaseHTTPMiddleware):
     def __init__(self, app, calls_per_minute: int = 100):
         super().__init__(app)
-        self.limiter = RateLimiter(max_requests=calls_per_minute, window_seconds=60)
-    
+        # 未命中专用策略的请求使用本中间件自己的限流器，不修改共享的 GENERAL_LIMITER
+        self.default_limiter = RateLimiter(max_requests=calls_per_minute, window_seconds=60, name="general")
+        self._policy_table: Optional[RoutePolicyTable] = None
+
     async def dispatch(self, request: Request, call_next):
+        # 首次请求时所有路由都已注册，按本中间件的默认限流器编译策略表
+        if self._policy_table is None:
+            self._policy_table = compile_route_policies(request.app.routes, default_limiter=self.default_limiter)
+
+        limiter = self._policy_table.resolve(request.url.path, request.method)
+        if limiter is None:
+            return await call_next(request)
+
         # 获取客户端IP
         client_ip = self.get_client_ip(request)
-        
-        # 检查速率限制
-        allowed, reset_time = self.limiter.is_allowed(client_ip)
-        
-        if not allowed:
+
+        # 检查速率限制（SQLite 后端会等待文件锁，放到线程池中执行）
+        try:
+            if isinstance(limiter.backend, SQLiteBackend):
+                result = await run_in_threadpool(limiter.check, client_ip)
+            else:
+                result = limiter.check(client_ip)
+        except sqlite3.OperationalError as e:
+            # 限流存储不可用时放行，不影响正常请求
+            logger.warning(f"速率限制检查失败，放行请求 - {request.method} {request.url.path}: {e}")
+            return await call_next(request)
+
+        if not result.allowed:
+            retry_after = max(1, math.ceil(result.reset_at - time.time()))
             return JSONResponse(
                 status_code=status.HTTP_429_TOO_MANY_REQUESTS,
                 content={
                     "detail": "请求过于频繁，请稍后重试",
-                    "retry_after": reset_time - int(time.time()) if reset_time else 60
+                    "retry_after": retry_after
                 },
                 headers={
-                    "X-RateLimit-Limit": str(self.limiter.max_requests),
+                    "X-RateLimit-Limit": str(result.limit),
                     "X-RateLimit-Remaining": "0",
-                    "X-RateLimit-Reset": str(reset_time) if reset_time else "",
-                    "Retry-After": str(60)
+                    "X-RateLimit-Reset": str(result.reset_at),
+                    "Retry-After": str(retry_after)
                 }
             )
-        
+
         # 执行请求
         response = await call_next(request)
-        
+
         # 添加速率限制头
-        remaining = self.limiter.get_remaining(client_ip)
-        response.headers["X-RateLimit-Limit"] = str(self.limiter.max_requests)
-        response.headers["X-RateLimit-Remaining"] = str(remaining)
-        
+        response.headers["X-RateLimit-Limit"] = str(result.limit)
+        response.headers["X-RateLimit-Remaining"] = str(result.remaining)
+
         return response
-    
+
     def get_client_ip(self, request: Request) -> str:
         """获取客户端真实IP"""
         # 优先使用代理头
         forwarded_for = request.headers.get("X-Forwarded-For")
         if forwarded_for:
             return forwarded_for.split(",")[0].strip()
-        
+
         real_ip = request.headers.get("X-Real-IP")
         if real_ip:
             return real_ip
-        
+
         # 最后使用连接IP
         return request.client.host if request.client else "unknown"
-
-
-# 不同API的速率限制策略
-class APIRateLimits:
-    # 认证相关API - 更严格的限制
-    AUTH_LIMITER = RateLimiter(max_requests=10, window_seconds=60)
-    
-    # 支付相关API - 非常严格的限制  
-    PAYMENT_LIMITER = RateLimiter(max_requests=5, window_seconds=60)
-    
-    # 文件上传API - 限制上传频率
-    UPLOAD_LIMITER = RateLimiter(max_requests=20, window_seconds=60)
-    
-    # 普通API
-    GENERAL_LIMITER = RateLimiter(max_requests=100, window_seconds=60)
-
-
-def get_rate_limiter(endpoint: str) -> RateLimiter:
-    """根据API端点返回对应的速率限制器"""
-    if "/auth/" in endpoint:
-        return APIRateLimits.AUTH_LIMITER
-    elif "/payment/" in endpoint or "/orders/" in endpoint:
-        return APIRateLimits.PAYMENT_LIMITER
-    elif "/upload/" in endpoint:
-        return APIRateLimits.UPLOAD_LIMITER
-    else:
-        return APIRateLimits.GENERAL_LIMITER
\ No newline at end of file
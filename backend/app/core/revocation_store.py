@@ -0,0 +1,254 @@
+"""
+令牌吊销集合（内存）
+
+吊销记录以 token_revocations 表为准，每个进程在内存中维护一份副本，鉴权时只做内存查找：
+- 布隆过滤器：收录全部未过期的吊销项（会话 sid、已轮换的刷新令牌 jti），未命中即可确定未吊销
+- 精确集合：近期吊销的会话（只保留到其访问令牌全部过期为止）和按用户的吊销时间点，
+  访问令牌校验在布隆过滤器命中后以它为准，不访问数据库
+- 刷新令牌的 jti 只进布隆过滤器（数量随轮换增长），刷新时命中后再查数据库确认
+- 本进程的吊销立即生效；其他进程写入的吊销由后台协程按自增ID增量同步，
+  延迟不超过 REVOCATION_SYNC_SECONDS
+"""
+import asyncio
+import hashlib
+import logging
+import math
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+from sqlalchemy import delete, select
+
+from app.core.config import settings
+from app.database import AsyncSessionLocal
+from app.models.token_revocation import TokenRevocation
+
+logger = logging.getLogger(__name__)
+
+SYNC_BATCH_SIZE = 5000
+
+KIND_TOKEN = "token"
+KIND_SESSION = "session"
+KIND_USER = "user"
+
+
+def _timestamp(value: Optional[datetime]) -> Optional[float]:
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+class BloomFilter:
+    """按容量和误判率确定位数组大小和哈希次数的布隆过滤器"""
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = max(int(capacity), 1)
+        self.error_rate = min(max(error_rate, 1e-9), 0.5)
+        self.size = max(int(-self.capacity * math.log(self.error_rate) / math.log(2) ** 2), 8)
+        self.hashes = max(int(round(self.size / self.capacity * math.log(2))), 1)
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str):
+        # 双重哈希：一次 blake2b 派生出全部位置
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, item: str):
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        bits = self._bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class RevocationStore:
+    """进程内吊销集合"""
+
+    def __init__(self, bloom_capacity: int = 100000, bloom_error_rate: float = 0.001, session_horizon: float = 86400):
+        self.bloom_capacity = bloom_capacity
+        self.bloom_error_rate = bloom_error_rate
+        self.session_horizon = session_horizon  # 访问令牌有效期：会话吊销超过该时长后不会再有其访问令牌
+
+        self._lock = threading.Lock()
+        self._bloom = BloomFilter(bloom_capacity, bloom_error_rate)
+        self._rebuilding: Optional[BloomFilter] = None  # 全量重建期间同时写入，完成后替换
+        self._sessions: Dict[str, float] = {}  # sid -> 可从内存移除的时间
+        self._user_cutoffs: Dict[int, tuple] = {}  # user_id -> (not_before, 记录过期时间)
+        self._last_id = 0
+
+        self._task: Optional[asyncio.Task] = None
+        self._stop: Optional[asyncio.Event] = None
+        self.sync_interval = 5.0
+        self.purge_interval = 3600.0
+
+    @staticmethod
+    def _key(kind: str, value: str) -> str:
+        return f"{kind}:{value}"
+
+    # ===== 写入 =====
+
+    def add(
+        self,
+        kind: str,
+        value: str,
+        user_id: Optional[int] = None,
+        not_before: Optional[float] = None,
+        expires_at: Optional[float] = None,
+        created_at: Optional[float] = None
+    ):
+        """登记一条吊销（本进程写库后立即调用，或由同步协程从数据库加载）"""
+        now = time.time()
+        with self._lock:
+            if kind == KIND_USER:
+                if user_id is None or not_before is None:
+                    return
+                current = self._user_cutoffs.get(user_id)
+                if current is None or not_before > current[0]:
+                    self._user_cutoffs[user_id] = (not_before, expires_at or now + self.session_horizon)
+                return
+
+            key = self._key(kind, value)
+            self._bloom.add(key)
+            if self._rebuilding is not None:
+                self._rebuilding.add(key)
+            if kind == KIND_SESSION:
+                forget_at = (created_at or now) + self.session_horizon
+                if expires_at is not None:
+                    forget_at = min(forget_at, expires_at)
+                if forget_at > now:
+                    self._sessions[value] = forget_at
+
+    def _apply_row(self, row: TokenRevocation):
+        self.add(
+            row.kind, row.value, row.user_id,
+            not_before=_timestamp(row.not_before),
+            expires_at=_timestamp(row.expires_at),
+            created_at=_timestamp(row.created_at)
+        )
+        self._last_id = max(self._last_id, row.id)
+
+    # ===== 查询 =====
+
+    def is_revoked(self, payload: dict) -> bool:
+        """访问令牌是否已被吊销（纯内存判断）"""
+        sid = payload.get("sid")
+        if sid is not None and self._key(KIND_SESSION, sid) in self._bloom and sid in self._sessions:
+            return True
+        return self.is_user_revoked(payload)
+
+    def is_user_revoked(self, payload: dict) -> bool:
+        cutoff = self._user_cutoffs.get(payload.get("user_id"))
+        if cutoff is None:
+            return False
+        issued_at = payload.get("iat")
+        return not isinstance(issued_at, (int, float)) or issued_at < cutoff[0]
+
+    def might_be_revoked(self, kind: str, value: str) -> bool:
+        """布隆过滤器判断：False 表示一定未吊销，True 需要查数据库确认"""
+        return self._key(kind, value) in self._bloom
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "bloom_items": self._bloom.count,
+            "sessions": len(self._sessions),
+            "user_cutoffs": len(self._user_cutoffs),
+            "last_id": self._last_id
+        }
+
+    # ===== 同步 =====
+
+    def _purge_memory(self):
+        now = time.time()
+        with self._lock:
+            self._sessions = {sid: forget_at for sid, forget_at in self._sessions.items() if forget_at > now}
+            self._user_cutoffs = {
+                user_id: cutoff for user_id, cutoff in self._user_cutoffs.items() if cutoff[1] > now
+            }
+
+    async def sync(self, full: bool = False):
+        """
+        从数据库增量加载吊销记录
+        full 时重新加载全部未过期记录并重建布隆过滤器（清除已过期的项），重建完成前旧过滤器继续生效
+        """
+        if full:
+            with self._lock:
+                self._rebuilding = BloomFilter(self.bloom_capacity, self.bloom_error_rate)
+                self._last_id = 0
+
+        now = datetime.now(timezone.utc)
+        try:
+            async with AsyncSessionLocal() as db:
+                while True:
+                    query = select(TokenRevocation).where(TokenRevocation.id > self._last_id)
+                    if full:
+                        query = query.where(TokenRevocation.expires_at > now)
+                    result = await db.execute(query.order_by(TokenRevocation.id).limit(SYNC_BATCH_SIZE))
+                    rows = result.scalars().all()
+                    for row in rows:
+                        self._apply_row(row)
+                    if len(rows) < SYNC_BATCH_SIZE:
+                        break
+            if full:
+                with self._lock:
+                    self._bloom = self._rebuilding
+        finally:
+            if full:
+                self._rebuilding = None
+
+    async def purge(self):
+        """删除数据库中已无意义的吊销记录，并清理内存；布隆过滤器超出容量时重建"""
+        async with AsyncSessionLocal() as db:
+            await db.execute(delete(TokenRevocation).where(TokenRevocation.expires_at <= datetime.now(timezone.utc)))
+            await db.commit()
+        self._purge_memory()
+        if self._bloom.count > self.bloom_capacity:
+            await self.sync(full=True)
+
+    def start(self, sync_interval: float, purge_interval: float):
+        """启动后台同步协程（首次为全量加载）"""
+        if self._task is not None:
+            return
+        self.sync_interval = max(sync_interval, 0.1)
+        self.purge_interval = max(purge_interval, self.sync_interval)
+        self._stop = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._stop.set()
+        await self._task
+        self._task = None
+        self._stop = None
+
+    async def _run(self):
+        full = True
+        next_purge = time.monotonic() + self.purge_interval
+        while not self._stop.is_set():
+            try:
+                if time.monotonic() >= next_purge:
+                    next_purge = time.monotonic() + self.purge_interval
+                    await self.purge()
+                await self.sync(full=full)
+                full = False
+            except Exception as e:
+                logger.error(f"令牌吊销记录同步失败: {e}")
+            try:
+                await asyncio.wait_for(self._stop.wait(), timeout=self.sync_interval)
+            except asyncio.TimeoutError:
+                pass
+
+
+revocation_store = RevocationStore(
+    bloom_capacity=settings.REVOCATION_BLOOM_CAPACITY,
+    bloom_error_rate=settings.REVOCATION_BLOOM_ERROR_RATE,
+    session_horizon=settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60
+)
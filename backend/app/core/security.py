@@ -1,39 +1,67 @@
 """
 安全相关工具函数
 """
+import time
+import uuid
 from passlib.context import CryptContext
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple
 from app.core.config import settings
+from app.core.password_hasher import PasswordHasher
 
-# 密码加密上下文
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# 密码加密上下文（BCRYPT_ROUNDS 变更后，旧哈希在下次登录时由 verify_and_update 重新生成）
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.BCRYPT_ROUNDS)
+
+# bcrypt 计算统一在专用线程池中执行，避免阻塞事件循环
+password_hasher = PasswordHasher(
+    workers=settings.PASSWORD_HASH_WORKERS,
+    max_pending=settings.PASSWORD_HASH_MAX_PENDING,
+    retry_after=settings.PASSWORD_HASH_RETRY_AFTER
+)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """验证密码"""
-    return pwd_context.verify(plain_password, hashed_password)
+    return password_hasher.run_sync(pwd_context.verify, plain_password, hashed_password)
+
+def verify_password_and_update(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """验证密码；哈希参数已过时则同时返回按当前参数生成的新哈希，否则为 None"""
+    return password_hasher.run_sync(pwd_context.verify_and_update, plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
     """获取密码哈希值"""
-    return pwd_context.hash(password)
+    return password_hasher.run_sync(pwd_context.hash, password)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """验证密码（async 路由使用，不阻塞事件循环）"""
+    return await password_hasher.run(pwd_context.verify, plain_password, hashed_password)
+
+async def verify_password_and_update_async(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """verify_password_and_update 的 async 版本"""
+    return await password_hasher.run(pwd_context.verify_and_update, plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    """获取密码哈希值（async 路由使用）"""
+    return await password_hasher.run(pwd_context.hash, password)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
-    """创建访问令牌"""
+    """创建访问令牌（带 jti；由 issue_token_pair 签发时还带会话ID sid，用于注销）"""
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
     else:
-        expire = datetime.utcnow() + timedelta(hours=24)  # 延长到24小时
-    to_encode.update({"exp": expire, "iat": datetime.utcnow()})
+        expire = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+    to_encode.setdefault("jti", uuid.uuid4().hex)
+    to_encode.update({"exp": expire, "iat": time.time(), "type": "access"})  # iat 保留小数，按用户吊销时精确到微秒
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
 def create_refresh_token(data: dict) -> str:
-    """创建刷新令牌"""
+    """创建刷新令牌（每次刷新都会轮换，旧令牌立即吊销）"""
     to_encode = data.copy()
-    expire = datetime.utcnow() + timedelta(days=30)  # 30天有效期
-    to_encode.update({"exp": expire, "iat": datetime.utcnow(), "type": "refresh"})
+    expire = datetime.utcnow() + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
+    to_encode.setdefault("jti", uuid.uuid4().hex)
+    to_encode.update({"exp": expire, "iat": time.time(), "type": "refresh"})
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
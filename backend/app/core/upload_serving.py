@@ -0,0 +1,94 @@
+"""
+上传文件静态服务（/uploads）
+
+在 StaticFiles 基础上：
+- 内容寻址文件（文件名为 SHA-256）用内容哈希作强 ETag，并返回一年的 immutable 缓存头；
+  其他文件使用短期缓存，过期后按 ETag / Last-Modified 协商返回 304
+- 条件请求按 RFC 9110 处理：带 If-None-Match 时忽略 If-Modified-Since
+- Range（单段/多段）与 If-Range 由 FileResponse 处理；服务器支持 ASGI pathsend 扩展时由服务器直接发送文件
+- 配置 UPLOADS_ACCEL_REDIRECT_PREFIX 后只返回 X-Accel-Redirect 头，文件内容和 Range 都交给 nginx（sendfile）
+- 以 "." 开头的路径（.staging / .chunks 等内部目录）一律 404
+"""
+import os
+import re
+from typing import Optional
+from urllib.parse import quote
+
+from starlette.datastructures import Headers
+from starlette.exceptions import HTTPException
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Scope
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# 内容寻址文件名：<64位十六进制哈希><扩展名>
+_CONTENT_ADDRESSED_NAME = re.compile(r"^([0-9a-f]{64})(\.[0-9a-z]+)?$")
+
+
+class UploadFileResponse(FileResponse):
+    """大块读取的文件响应（视频 Range 请求时减少线程池往返次数）"""
+    chunk_size = 256 * 1024
+
+
+def content_hash_of(path: str) -> Optional[str]:
+    """内容寻址文件返回其哈希，其他文件返回 None"""
+    match = _CONTENT_ADDRESSED_NAME.match(os.path.basename(path))
+    return match.group(1) if match else None
+
+
+class UploadFiles(StaticFiles):
+    """/uploads 静态文件服务"""
+
+    def __init__(self, directory: str, max_age: int = 3600, accel_redirect_prefix: str = ""):
+        super().__init__(directory=directory)
+        self.max_age = max_age
+        self.accel_redirect_prefix = accel_redirect_prefix.rstrip("/")
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        # 内部目录（暂存区、分片）不对外提供
+        if any(part.startswith(".") for part in path.replace("\\", "/").split("/")):
+            raise HTTPException(status_code=404)
+        return await super().get_response(path, scope)
+
+    def file_response(
+        self,
+        full_path,
+        stat_result: os.stat_result,
+        scope: Scope,
+        status_code: int = 200,
+    ) -> Response:
+        headers = {}
+        content_hash = content_hash_of(str(full_path))
+        if content_hash is not None:
+            headers["etag"] = f'"{content_hash}"'
+            headers["cache-control"] = IMMUTABLE_CACHE_CONTROL
+        else:
+            headers["cache-control"] = f"public, max-age={self.max_age}"
+
+        response = UploadFileResponse(full_path, status_code=status_code, headers=headers, stat_result=stat_result)
+        if self.is_not_modified(response.headers, Headers(scope=scope)):
+            return NotModifiedResponse(response.headers)
+
+        if self.accel_redirect_prefix:
+            return self._accel_redirect_response(response, self.get_path(scope))
+        return response
+
+    def _accel_redirect_response(self, response: FileResponse, path: str) -> Response:
+        """只返回响应头，由 nginx 的 internal location 发送文件内容"""
+        headers = {
+            name: value
+            for name, value in response.headers.items()
+            if name in ("content-type", "etag", "last-modified", "cache-control")
+        }
+        headers["x-accel-redirect"] = quote(f"{self.accel_redirect_prefix}/{path.replace(os.sep, '/')}")
+        return Response(status_code=response.status_code, headers=headers)
+
+    def is_not_modified(self, response_headers: Headers, request_headers: Headers) -> bool:
+        if_none_match = request_headers.get("if-none-match")
+        if if_none_match is None:
+            return super().is_not_modified(response_headers, request_headers)
+
+        etag = response_headers.get("etag")
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return etag is not None and ("*" in tags or etag in tags)
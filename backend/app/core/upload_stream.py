@@ -0,0 +1,225 @@
+"""
+流式文件上传
+
+按固定大小分块读取上传文件，边读边完成：
+- 首块嗅探文件类型（MIME）
+- 增量计算哈希
+- 滚动窗口扫描危险特征（可跨块匹配）
+- 超出大小限制立即中止
+- 写入同目录临时文件，完成后原子重命名
+
+整个过程在线程池中执行，不阻塞事件循环，单个上传的内存占用约为一个分块大小。
+"""
+import hashlib
+import os
+import tempfile
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Callable, Dict, Iterable, Optional, Sequence
+
+from fastapi import UploadFile
+from starlette.concurrency import run_in_threadpool
+
+UPLOAD_CHUNK_SIZE = 256 * 1024  # 256KB
+
+
+class UploadRejectedError(Exception):
+    """上传内容校验未通过"""
+
+
+class UploadTooLargeError(UploadRejectedError):
+    """上传文件超过大小限制"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        super().__init__(f"文件大小超过限制 ({max_size // (1024 * 1024)}MB)")
+
+
+class UploadEmptyError(UploadRejectedError):
+    """上传文件为空"""
+
+    def __init__(self):
+        super().__init__("文件不能为空")
+
+
+class RollingSignatureScanner:
+    """
+    滚动窗口特征扫描（不区分大小写）
+
+    每块只保留上一块末尾 (最长特征长度-1) 字节与当前块拼接后查找，
+    保证跨块边界的特征也能命中，而不需要整份文件的副本。
+    """
+
+    def __init__(self, signatures: Iterable[bytes]):
+        self.signatures = [signature.lower() for signature in signatures]
+        self.overlap = max((len(signature) for signature in self.signatures), default=1) - 1
+        self._tail = b""
+        self.matched: Optional[bytes] = None
+
+    def feed(self, chunk: bytes) -> bool:
+        """扫描一块数据，命中任一特征时返回True"""
+        if self.matched is not None:
+            return True
+        window = self._tail + chunk.lower()
+        for signature in self.signatures:
+            if signature in window:
+                self.matched = signature
+                return True
+        self._tail = window[-self.overlap:] if self.overlap else b""
+        return False
+
+
+@dataclass
+class StoredUpload:
+    """已保存的上传文件信息"""
+    path: str
+    size: int
+    hashes: Dict[str, str] = field(default_factory=dict)
+    head: bytes = b""  # 文件首块（用于后续的类型识别）
+
+    @property
+    def sha256(self) -> Optional[str]:
+        return self.hashes.get("sha256")
+
+
+class HashingFileWriter:
+    """
+    写入同目录临时文件并增量计算哈希，commit 时原子重命名为目标文件
+
+    同步实现，调用方负责在线程池中执行写入。
+    """
+
+    def __init__(self, dest_path: str, hash_names: Sequence[str] = ("sha256",)):
+        self.dest_path = dest_path
+        dest_dir = os.path.dirname(dest_path) or "."
+        os.makedirs(dest_dir, exist_ok=True)
+        self.hashers = {name: hashlib.new(name) for name in hash_names}
+        self.size = 0
+        self.head = b""
+        fd, self.temp_path = tempfile.mkstemp(dir=dest_dir, prefix=".upload-", suffix=".part")
+        self._output = os.fdopen(fd, "wb")
+
+    def write(self, chunk: bytes):
+        if not self.head:
+            self.head = chunk[:8192]
+        self.size += len(chunk)
+        for hasher in self.hashers.values():
+            hasher.update(chunk)
+        self._output.write(chunk)
+
+    def commit(self, allow_empty: bool = False) -> StoredUpload:
+        self._output.close()
+        if self.size == 0 and not allow_empty:
+            self.discard()
+            raise UploadEmptyError()
+        os.replace(self.temp_path, self.dest_path)
+        return StoredUpload(
+            path=self.dest_path,
+            size=self.size,
+            hashes={name: hasher.hexdigest() for name, hasher in self.hashers.items()},
+            head=self.head
+        )
+
+    def discard(self):
+        """放弃写入，删除临时文件"""
+        self._output.close()
+        if os.path.exists(self.temp_path):
+            os.remove(self.temp_path)
+
+
+def stream_to_file(
+    source,
+    dest_path: str,
+    max_size: int,
+    head_check: Optional[Callable[[bytes], None]] = None,
+    scanner: Optional[RollingSignatureScanner] = None,
+    hash_names: Sequence[str] = ("sha256",),
+    chunk_size: int = UPLOAD_CHUNK_SIZE,
+    allow_empty: bool = False,
+) -> StoredUpload:
+    """
+    把文件对象分块写入 dest_path（同步，应在线程池中调用）
+
+    head_check: 接收首块数据，校验失败时抛出 UploadRejectedError
+    scanner: 危险特征扫描器，命中时抛出 UploadRejectedError
+    """
+    writer = HashingFileWriter(dest_path, hash_names)
+    try:
+        while True:
+            chunk = source.read(chunk_size)
+            if not chunk:
+                break
+
+            if not writer.head and head_check is not None:
+                head_check(chunk)
+
+            if writer.size + len(chunk) > max_size:
+                raise UploadTooLargeError(max_size)
+
+            if scanner is not None and scanner.feed(chunk):
+                raise UploadRejectedError("检测到潜在恶意文件，上传被拒绝")
+
+            writer.write(chunk)
+
+        return writer.commit(allow_empty)
+    except BaseException:
+        writer.discard()
+        raise
+
+
+async def save_upload_file(
+    file: UploadFile,
+    dest_path: str,
+    max_size: int,
+    head_check: Optional[Callable[[bytes], None]] = None,
+    scanner: Optional[RollingSignatureScanner] = None,
+    hash_names: Sequence[str] = ("sha256",),
+    allow_empty: bool = False,
+) -> StoredUpload:
+    """流式保存 UploadFile（在线程池中执行，不阻塞事件循环）"""
+    # 请求声明的大小已超限时直接拒绝，无需读取
+    if file.size is not None and file.size > max_size:
+        raise UploadTooLargeError(max_size)
+
+    await file.seek(0)
+    return await run_in_threadpool(
+        stream_to_file,
+        file.file,
+        dest_path,
+        max_size,
+        head_check,
+        scanner,
+        hash_names,
+        UPLOAD_CHUNK_SIZE,
+        allow_empty,
+    )
+
+
+async def save_stream(
+    stream: AsyncIterator[bytes],
+    dest_path: str,
+    max_size: int,
+    hash_names: Sequence[str] = ("sha256",),
+    allow_empty: bool = False,
+) -> StoredUpload:
+    """
+    流式保存原始请求体（如 request.stream()）
+
+    网络数据攒够一个分块后再交给线程池写盘，内存占用约为一个分块大小。
+    """
+    writer = await run_in_threadpool(HashingFileWriter, dest_path, hash_names)
+    try:
+        buffer = bytearray()
+        async for piece in stream:
+            if writer.size + len(buffer) + len(piece) > max_size:
+                raise UploadTooLargeError(max_size)
+            buffer += piece
+            if len(buffer) >= UPLOAD_CHUNK_SIZE:
+                data = bytes(buffer)
+                buffer.clear()
+                await run_in_threadpool(writer.write, data)
+        if buffer:
+            await run_in_threadpool(writer.write, bytes(buffer))
+        return await run_in_threadpool(writer.commit, allow_empty)
+    except BaseException:
+        writer.discard()
+        raise
@@ -8,7 +8,7 @@ import logging
 import uuid
 from typing import Dict, Optional
 from decimal import Decimal
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 
 from wechatpy.pay import WeChatPay
 from wechatpy.pay.utils import calculate_signature
@@ -17,6 +17,10 @@ from wechatpy.exceptions import WeChatPayException
 
 logger = logging.getLogger(__name__)
 
+# 微信支付使用北京时间；预支付单最短有效期（分钟）
+WECHAT_TIMEZONE = timezone(timedelta(hours=8))
+MIN_PREPAY_EXPIRE_MINUTES = 5
+
 
 class WeChatPayService:
     """微信支付服务 - 统一封装"""
@@ -74,7 +78,8 @@ class WeChatPayService:
         order_id: str,
         amount: Decimal,
         subject: str,
-        detail: Optional[str] = None
+        detail: Optional[str] = None,
+        expires_at: Optional[datetime] = None
     ) -> Dict:
         """
         创建Native扫码支付
@@ -84,6 +89,7 @@ class WeChatPayService:
             amount: 支付金额（元）
             subject: 商品描述
             detail: 商品详情（可选）
+            expires_at: 预支付单失效时间（可选，默认2小时）
 
         Returns:
             包含支付二维码URL和支付信息的字典
@@ -98,6 +104,7 @@ class WeChatPayService:
             # 调用统一下单接口
             result = self.client.order.create(
                 trade_type='NATIVE',
+                time_expire=self._time_expire(expires_at),
                 body=subject,
                 total_fee=total_fee,
                 out_trade_no=order_id,
@@ -116,7 +123,7 @@ class WeChatPayService:
                 "qr_code_url": result.get("code_url"),  # 二维码链接
                 "prepay_id": result.get("prepay_id"),
                 "subject": subject,
-                "expires_at": datetime.now().timestamp() + 7200  # 2小时有效期
+                "expires_at": (expires_at or datetime.now() + timedelta(hours=2)).timestamp()
             }
 
         except WeChatPayException as e:
@@ -139,7 +146,8 @@ class WeChatPayService:
         amount: Decimal,
         subject: str,
         client_ip: str = "127.0.0.1",
-        detail: Optional[str] = None
+        detail: Optional[str] = None,
+        expires_at: Optional[datetime] = None
     ) -> Dict:
         """
         创建H5支付
@@ -150,6 +158,7 @@ class WeChatPayService:
             subject: 商品描述
             client_ip: 用户IP地址
             detail: 商品详情（可选）
+            expires_at: 预支付单失效时间（可选，默认2小时）
 
         Returns:
             包含支付跳转URL的字典
@@ -171,6 +180,7 @@ class WeChatPayService:
 
             result = self.client.order.create(
                 trade_type='MWEB',  # H5支付
+                time_expire=self._time_expire(expires_at),
                 body=subject,
                 total_fee=total_fee,
                 out_trade_no=order_id,
@@ -212,7 +222,8 @@ class WeChatPayService:
         amount: Decimal,
         subject: str,
         openid: str,
-        detail: Optional[str] = None
+        detail: Optional[str] = None,
+        expires_at: Optional[datetime] = None
     ) -> Dict:
         """
         创建JSAPI支付（公众号/小程序支付）
@@ -223,6 +234,7 @@ class WeChatPayService:
             subject: 商品描述
             openid: 用户的OpenID
             detail: 商品详情（可选）
+            expires_at: 预支付单失效时间（可选，默认2小时）
 
         Returns:
             包含JSAPI支付参数的字典
@@ -235,6 +247,7 @@ class WeChatPayService:
 
             result = self.client.order.create(
                 trade_type='JSAPI',
+                time_expire=self._time_expire(expires_at),
                 body=subject,
                 total_fee=total_fee,
                 out_trade_no=order_id,
@@ -341,6 +354,15 @@ class WeChatPayService:
             logger.error(f"❌ 签名验证失败: {e}")
             return False
 
+    @staticmethod
+    def _time_expire(expires_at: Optional[datetime]) -> Optional[datetime]:
+        """预支付单失效时间转换为北京时间（wechatpy 按原样格式化）"""
+        if expires_at is None:
+            return None
+        if expires_at.tzinfo is None:
+            expires_at = expires_at.replace(tzinfo=timezone.utc)
+        return expires_at.astimezone(WECHAT_TIMEZONE)
+
     def _create_mock_payment(
         self,
         order_id: str,
@@ -1,21 +1,69 @@
 """
 数据库连接和会话管理
+
+同时提供两套会话：
+- SessionLocal / get_db: 同步会话，供 def 路由使用（FastAPI 在线程池中执行）
+- AsyncSessionLocal / get_async_db: 异步会话，供 async def 路由使用，不阻塞事件循环
 """
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from app.core.config import settings
 
+
+def _pool_options(url: str) -> dict:
+    """连接池参数（SQLite 使用默认连接池，不支持这些参数）"""
+    if "sqlite" in url:
+        return {}
+    return {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+    }
+
+
+def _async_database_url(url: str) -> str:
+    """由同步连接串推导异步驱动连接串"""
+    if settings.ASYNC_DATABASE_URL:
+        return settings.ASYNC_DATABASE_URL
+    scheme, sep, rest = url.partition("://")
+    driver_map = {
+        "sqlite": "sqlite+aiosqlite",
+        "postgresql": "postgresql+asyncpg",
+        "postgresql+psycopg2": "postgresql+asyncpg",
+        "postgres": "postgresql+asyncpg",
+        "mysql": "mysql+aiomysql",
+        "mysql+pymysql": "mysql+aiomysql",
+    }
+    return f"{driver_map.get(scheme, scheme)}{sep}{rest}"
+
+
 # 创建数据库引擎
 engine = create_engine(
     settings.DATABASE_URL, 
     connect_args={"check_same_thread": False} if "sqlite" in settings.DATABASE_URL else {},
-    pool_pre_ping=True
+    pool_pre_ping=True,
+    **_pool_options(settings.DATABASE_URL)
 )
 
 # 创建会话工厂
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# 创建异步数据库引擎
+ASYNC_DATABASE_URL = _async_database_url(settings.DATABASE_URL)
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    pool_pre_ping=True,
+    **_pool_options(ASYNC_DATABASE_URL)
+)
+
+# 创建异步会话工厂（提交后不过期，便于直接序列化已提交的对象）
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, autoflush=False, expire_on_commit=False
+)
+
 # 声明基类
 Base = declarative_base()
 
@@ -25,4 +73,10 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+async def get_async_db():
+    """获取异步数据库会话"""
+    async with AsyncSessionLocal() as db:
+        yield db
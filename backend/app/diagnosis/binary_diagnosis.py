@@ -1,6 +1,20 @@
 from typing import Dict, List, Tuple
+from app.diagnosis.symptom_index import SymptomIndex
 from app.models.insomnia_models import DiagnosticScores, FinalSyndromeType, Symptoms
 
+# 维度顺序与 DiagnosticScores 字段一一对应
+DIMENSION_FIELDS = (
+    ("骨髓空虚", "bone_marrow_score"),
+    ("脑髓空虚", "brain_marrow_score"),
+    ("肝血不足", "liver_blood_score"),
+    ("肝阴不足", "liver_yin_score"),
+    ("肾阴虚", "kidney_yin_score"),
+    ("肾阳虚", "kidney_yang_score"),
+    ("肝气郁滞", "liver_qi_stagnation_score"),
+    ("肾内血瘀", "kidney_blood_stasis_score"),
+    ("精气衰竭", "essence_deficiency_score"),
+)
+
 class BinaryDiagnosisEngine:
     """二元诊断推理引擎"""
     
@@ -122,82 +136,19 @@ class BinaryDiagnosisEngine:
     
     @classmethod
     def calculate_scores(cls, symptoms: Symptoms) -> DiagnosticScores:
-        """计算各证型得分"""
-        scores = DiagnosticScores()
-        
-        # 计算症状得分
-        all_symptoms = symptoms.primary_symptoms + symptoms.secondary_symptoms
-        
-        # 骨髓空虚得分
-        scores.bone_marrow_score = cls._calculate_dimension_score(
-            "骨髓空虚", all_symptoms, symptoms.tongue_appearance, symptoms.pulse_condition
-        )
-        
-        # 脑髓空虚得分
-        scores.brain_marrow_score = cls._calculate_dimension_score(
-            "脑髓空虚", all_symptoms, symptoms.tongue_appearance, symptoms.pulse_condition
-        )
-        
-        # 肝血不足得分
-        scores.liver_blood_score = cls._calculate_dimension_score(
-            "肝血不足", all_symptoms, symptoms.tongue_appearance, symptoms.pulse_condition
-        )
-        
-        # 肝阴不足得分
-        scores.liver_yin_score = cls._calculate_dimension_score(
-            "肝阴不足", all_symptoms, symptoms.tongue_appearance, symptoms.pulse_condition
-        )
-        
-        # 肾阴虚得分
-        scores.kidney_yin_score = cls._calculate_dimension_score(
-            "肾阴虚", all_symptoms, symptoms.tongue_appearance, symptoms.pulse_condition
-        )
-        
-        # 肾阳虚得分
-        scores.kidney_yang_score = cls._calculate_dimension_score(
-            "肾阳虚", all_symptoms, symptoms.tongue_appearance, symptoms.pulse_condition
-        )
-        
-        # 肝气郁滞得分
-        scores.liver_qi_stagnation_score = cls._calculate_dimension_score(
-            "肝气郁滞", all_symptoms, symptoms.tongue_appearance, symptoms.pulse_condition
-        )
-        
-        # 肾内血瘀得分
-        scores.kidney_blood_stasis_score = cls._calculate_dimension_score(
-            "肾内血瘀", all_symptoms, symptoms.tongue_appearance, symptoms.pulse_condition
-        )
-        
-        # 精气衰竭得分
-        scores.essence_deficiency_score = cls._calculate_dimension_score(
-            "精气衰竭", all_symptoms, symptoms.tongue_appearance, symptoms.pulse_condition
-        )
-        
-        return scores
-    
+        """计算各证型得分（查倒排索引，只遍历一遍患者的症状和舌脉）"""
+        vector = cls._score_vector(symptoms)
+        return DiagnosticScores(**{field: score for (_, field), score in zip(DIMENSION_FIELDS, vector)})
+
     @classmethod
-    def _calculate_dimension_score(cls, dimension: str, symptoms: List[str], 
-                                   tongue: str, pulse: str) -> float:
-        """计算单个维度得分"""
-        total_score = 0.0
-        
-        # 症状得分
-        symptom_weights = cls.SYMPTOM_WEIGHTS.get(dimension, {})
-        for symptom in symptoms:
-            if symptom in symptom_weights:
-                total_score += symptom_weights[symptom]
-        
-        # 舌象得分
-        tongue_weights = cls.TONGUE_PULSE_WEIGHTS.get(dimension, {}).get("tongue", {})
-        if tongue in tongue_weights:
-            total_score += tongue_weights[tongue]
-        
-        # 脉象得分
-        pulse_weights = cls.TONGUE_PULSE_WEIGHTS.get(dimension, {}).get("pulse", {})
-        if pulse in pulse_weights:
-            total_score += pulse_weights[pulse]
-        
-        return total_score
+    def rank_dimensions(cls, symptoms: Symptoms, top_k: int = 3) -> List[Tuple[str, float]]:
+        """得分最高的 top_k 个维度 [(维度, 得分)]，同分按维度顺序"""
+        return SYMPTOM_INDEX.top_k(cls._score_vector(symptoms), top_k)
+
+    @classmethod
+    def _score_vector(cls, symptoms: Symptoms) -> List[float]:
+        all_symptoms = symptoms.primary_symptoms + symptoms.secondary_symptoms
+        return SYMPTOM_INDEX.score(all_symptoms, symptoms.tongue_appearance, symptoms.pulse_condition)
     
     @classmethod
     def determine_final_syndrome(cls, scores: DiagnosticScores) -> FinalSyndromeType:
@@ -224,4 +175,12 @@ class BinaryDiagnosisEngine:
         
         # 这里需要医师提供维度组合到最终证型的映射规则
         # 暂时返回证型1
-        return FinalSyndromeType.SYNDROME_1
\ No newline at end of file
+        return FinalSyndromeType.SYNDROME_1
+
+
+# 症状/舌象/脉象 -> [(维度, 权重)] 的倒排索引，导入时构建一次
+SYMPTOM_INDEX = SymptomIndex.from_weights(
+    BinaryDiagnosisEngine.SYMPTOM_WEIGHTS,
+    BinaryDiagnosisEngine.TONGUE_PULSE_WEIGHTS,
+    dimensions=[dimension for dimension, _ in DIMENSION_FIELDS]
+)
@@ -1,7 +1,9 @@
-from typing import Dict, List, Tuple, Optional
+from typing import Dict, List, Tuple, Optional, Sequence
 from dataclasses import dataclass
 from enum import Enum
 
+import numpy as np
+
 class InsomniaLevel(str, Enum):
     """失眠等级"""
     NO_TREATMENT = "无需治疗"  # ≥103分
@@ -165,175 +167,138 @@ class InsomniaDiagnosisEngine:
         }
     }
     
+    # 特殊流程：(题号, 首个答案) -> 标记
+    SPECIAL_FLOWS = (
+        (1, "A", "perfect_sleep"),          # 第1题选"好"：直接结束
+        (9, "C", "long_term_medication"),   # 第9题选"3个月以上"：建议定制流程
+    )
+
+    # 失眠等级分数线（从高到低）
+    LEVEL_THRESHOLDS = (
+        (103, InsomniaLevel.NO_TREATMENT),
+        (60, InsomniaLevel.PRIMARY),
+        (45, InsomniaLevel.MIDDLE),
+    )
+
+    # 特殊流程的治疗方案（导入时冻结为共享只读结构，见 SPECIAL_FLOW_PLAN_TABLE）
+    SPECIAL_FLOW_TREATMENT_PLANS = {
+        "perfect_sleep": {
+            "level": "睡眠质量很好",
+            "recommendation": "恭喜您！",
+            "message": "您的睡眠质量很好，请继续保持良好的作息习惯。祝您身体健康！",
+            "products": [],
+            "therapy": [],
+            "special": "perfect_sleep"
+        },
+        "long_term_medication": {
+            "level": "长期用药失眠",
+            "recommendation": "建议咨询专业医师",
+            "message": "您长期使用安眠药物，建议寻求高级咨询师的专业指导，制定个性化的减药和治疗方案。",
+            "products": ["专业咨询服务"],
+            "therapy": ["高级咨询师定制流程"],
+            "special": "long_term_medication"
+        }
+    }
+
     @classmethod
-    def _check_special_flows(cls, answers: Dict) -> Optional[DiagnosisResult]:
-        """检查特殊流程：第1题选很好、第9题选3个月以上"""
-        
-        # 检查第1题：如果选择"很好"，直接退出
-        if "1" in answers:
-            answer_1 = answers["1"][0] if isinstance(answers["1"], list) else answers["1"]
-            if answer_1 == "A":  # "好"选项
-                return DiagnosisResult(
-                    base_score=100,
-                    level=InsomniaLevel.NO_TREATMENT,
-                    syndrome=SyndromeType.LIVER_KIDNEY_DEFICIENCY,  # 占位
-                    syndrome_scores=SyndromeScores(),
-                    treatment_plan={
-                        "level": "睡眠质量很好",
-                        "recommendation": "恭喜您！",
-                        "message": "您的睡眠质量很好，请继续保持良好的作息习惯。祝您身体健康！",
-                        "products": [],
-                        "therapy": [],
-                        "special": "perfect_sleep"
-                    },
-                    confidence=1.0
-                )
-        
-        # 检查第9题：如果选择"3个月以上"，建议定制流程
-        if "9" in answers:
-            answer_9 = answers["9"][0] if isinstance(answers["9"], list) else answers["9"]
-            if answer_9 == "C":  # "3个月以上"选项
-                return DiagnosisResult(
-                    base_score=30,  # 低分表示严重
-                    level=InsomniaLevel.ADVANCED,
-                    syndrome=SyndromeType.LIVER_KIDNEY_DEFICIENCY,  # 占位
-                    syndrome_scores=SyndromeScores(),
-                    treatment_plan={
-                        "level": "长期用药失眠",
-                        "recommendation": "建议咨询专业医师",
-                        "message": "您长期使用安眠药物，建议寻求高级咨询师的专业指导，制定个性化的减药和治疗方案。",
-                        "products": ["专业咨询服务"],
-                        "therapy": ["高级咨询师定制流程"],
-                        "special": "long_term_medication"
-                    },
-                    confidence=1.0
-                )
-        
-        return None
-    
+    def _special_flow_result(cls, special: str) -> DiagnosisResult:
+        """特殊流程的诊断结果"""
+        if special == "perfect_sleep":
+            return DiagnosisResult(
+                base_score=100,
+                level=InsomniaLevel.NO_TREATMENT,
+                syndrome=SyndromeType.LIVER_KIDNEY_DEFICIENCY,  # 占位
+                syndrome_scores=SyndromeScores(),
+                treatment_plan=SPECIAL_FLOW_PLAN_TABLE["perfect_sleep"],
+                confidence=1.0
+            )
+        return DiagnosisResult(
+            base_score=30,  # 低分表示严重
+            level=InsomniaLevel.ADVANCED,
+            syndrome=SyndromeType.LIVER_KIDNEY_DEFICIENCY,  # 占位
+            syndrome_scores=SyndromeScores(),
+            treatment_plan=SPECIAL_FLOW_PLAN_TABLE["long_term_medication"],
+            confidence=1.0
+        )
+
     @classmethod
-    def analyze_questionnaire(cls, answers: Dict) -> DiagnosisResult:
-        """分析19题问卷，返回完整诊断结果"""
-        
-        # 0. 特殊流程检查
-        special_result = cls._check_special_flows(answers)
-        if special_result:
-            return special_result
-        
-        # 1. 计算基础分数（1-8题，第9题不参与评分）
-        base_score = cls._calculate_base_score(answers)
-        
-        # 2. 确定失眠等级
-        level = cls._determine_insomnia_level(base_score)
-        
-        # 3. 计算证型分数（10-19题）
-        syndrome_scores = cls._calculate_syndrome_scores(answers)
-        
-        # 4. 确定证型组合
-        syndrome = cls._determine_syndrome_type(syndrome_scores)
-        
-        # 5. 生成治疗方案
-        treatment_plan = cls._generate_treatment_plan(base_score, syndrome, syndrome_scores)
-        
-        # 6. 计算置信度
-        confidence = cls._calculate_confidence(base_score, syndrome_scores)
-        
+    def _build_result(cls, base_score: int, syndrome_scores: SyndromeScores,
+                      syndrome: SyndromeType, level: InsomniaLevel, confidence: float) -> DiagnosisResult:
         return DiagnosisResult(
             base_score=base_score,
             level=level,
             syndrome=syndrome,
             syndrome_scores=syndrome_scores,
-            treatment_plan=treatment_plan,
+            treatment_plan=cls._generate_treatment_plan(base_score, syndrome, syndrome_scores),
             confidence=confidence
         )
-    
+
     @classmethod
-    def _calculate_base_score(cls, answers: Dict) -> int:
-        """计算基础睡眠评分（1-8题，第9题不参与评分）"""
-        total_score = 0
-        
-        # 处理1-6题（单选题）
-        for q_id in range(1, 7):
-            if str(q_id) in answers and answers[str(q_id)]:
-                answer = answers[str(q_id)][0] if isinstance(answers[str(q_id)], list) else answers[str(q_id)]
-                score = cls.BASE_SCORING[q_id].get(answer, 0)
-                total_score += score
-        
-        # 处理第7题（睡眠困扰，多选，累加减分）
-        if "7" in answers and answers["7"]:
-            selected_options = answers["7"] if isinstance(answers["7"], list) else [answers["7"]]
-            for opt in selected_options:
-                total_score += cls.BASE_SCORING[7].get(opt, 0)
-        
-        # 处理第8题（安眠药，多选，累加减分）
-        if "8" in answers and answers["8"]:
-            selected_options = answers["8"] if isinstance(answers["8"], list) else [answers["8"]]
-            for opt in selected_options:
-                total_score += cls.BASE_SCORING[8].get(opt, 0)
-        
-        # 第9题（服药时长）不参与基础评分计算，仅用于治疗方案参考
-        
-        return total_score
-    
+    def analyze_questionnaire(cls, answers: Dict) -> DiagnosisResult:
+        """分析19题问卷，返回完整诊断结果"""
+        table = scoring_table()
+        cells = table.encode(answers)
+
+        # 0. 特殊流程检查
+        special = table.special_flow(cells)
+        if special:
+            return cls._special_flow_result(special)
+
+        # 1. 查表累加：基础分数（1-8题）与证型分数（10-19题）
+        totals = table.sum_cells(cells)
+        base_score = totals[0]
+        syndrome_scores = SyndromeScores(*totals[1:])
+
+        # 2. 确定失眠等级、证型组合与置信度，生成治疗方案
+        return cls._build_result(
+            base_score,
+            syndrome_scores,
+            cls._determine_syndrome_type(syndrome_scores),
+            cls._determine_insomnia_level(base_score),
+            cls._calculate_confidence(base_score, syndrome_scores)
+        )
+
+    @classmethod
+    def score_batch(cls, answer_sets: Sequence[Dict]) -> "BatchScores":
+        """
+        批量计分：所有问卷编码为一个计数矩阵，与计分表做一次矩阵乘法
+        返回各问卷的基础分、证型分数及等级/证型下标（NumPy数组）
+        """
+        return scoring_table().score_batch(answer_sets)
+
+    @classmethod
+    def analyze_batch(cls, answer_sets: Sequence[Dict]) -> List[DiagnosisResult]:
+        """批量分析问卷，结果与逐份调用 analyze_questionnaire 一致"""
+        scores = cls.score_batch(answer_sets)
+        base_scores = scores.base_scores.tolist()
+        syndrome_rows = scores.syndrome_scores.tolist()
+        level_indexes = scores.level_indexes.tolist()
+        syndrome_indexes = scores.syndrome_indexes.tolist()
+        confidences = scores.confidences.tolist()
+        specials = scores.specials
+
+        results = []
+        for i in range(len(base_scores)):
+            if specials[i]:
+                results.append(cls._special_flow_result(specials[i]))
+                continue
+            results.append(cls._build_result(
+                base_scores[i],
+                SyndromeScores(*syndrome_rows[i]),
+                SYNDROME_GRID[syndrome_indexes[i]],
+                LEVELS[level_indexes[i]],
+                round(confidences[i], 2)
+            ))
+        return results
+
     @classmethod
     def _determine_insomnia_level(cls, base_score: int) -> InsomniaLevel:
         """根据基础分数确定失眠等级"""
-        if base_score >= 103:
-            return InsomniaLevel.NO_TREATMENT
-        elif base_score >= 60:
-            return InsomniaLevel.PRIMARY
-        elif base_score >= 45:
-            return InsomniaLevel.MIDDLE
-        else:
-            return InsomniaLevel.ADVANCED
-    
-    @classmethod
-    def _calculate_syndrome_scores(cls, answers: Dict) -> SyndromeScores:
-        """计算证型分数（10-19题）"""
-        scores = SyndromeScores()
-        
-        # 肝肠分：问题10 + 问题15
-        for q_id in cls.SYNDROME_SCORING["liver_intestine"]:
-            if str(q_id) in answers and answers[str(q_id)]:
-                if answers[str(q_id)] == "是" or (isinstance(answers[str(q_id)], list) and "是" in answers[str(q_id)]):
-                    scores.liver_intestine += 1
-                elif isinstance(answers[str(q_id)], list):
-                    scores.liver_intestine += len(answers[str(q_id)])  # 多选题按选中项数计分
-        
-        # 血液分：问题11 + 问题16
-        for q_id in cls.SYNDROME_SCORING["blood"]:
-            if str(q_id) in answers and answers[str(q_id)]:
-                if answers[str(q_id)] == "是" or (isinstance(answers[str(q_id)], list) and "是" in answers[str(q_id)]):
-                    scores.blood += 1
-                elif isinstance(answers[str(q_id)], list):
-                    scores.blood += len(answers[str(q_id)])
-        
-        # 神内分：问题12 + 问题17
-        for q_id in cls.SYNDROME_SCORING["neural"]:
-            if str(q_id) in answers and answers[str(q_id)]:
-                if answers[str(q_id)] == "是" or (isinstance(answers[str(q_id)], list) and "是" in answers[str(q_id)]):
-                    scores.neural += 1
-                elif isinstance(answers[str(q_id)], list):
-                    scores.neural += len(answers[str(q_id)])
-        
-        # 骨髓分：问题13 + 问题18
-        for q_id in cls.SYNDROME_SCORING["bone_marrow"]:
-            if str(q_id) in answers and answers[str(q_id)]:
-                if answers[str(q_id)] == "是" or (isinstance(answers[str(q_id)], list) and "是" in answers[str(q_id)]):
-                    scores.bone_marrow += 1
-                elif isinstance(answers[str(q_id)], list):
-                    scores.bone_marrow += len(answers[str(q_id)])
-        
-        # 脑髓分：问题14 + 问题19
-        for q_id in cls.SYNDROME_SCORING["brain_marrow"]:
-            if str(q_id) in answers and answers[str(q_id)]:
-                if answers[str(q_id)] == "是" or (isinstance(answers[str(q_id)], list) and "是" in answers[str(q_id)]):
-                    scores.brain_marrow += 1
-                elif isinstance(answers[str(q_id)], list):
-                    scores.brain_marrow += len(answers[str(q_id)])
-        
-        return scores
-    
+        for threshold, level in cls.LEVEL_THRESHOLDS:
+            if base_score >= threshold:
+                return level
+        return InsomniaLevel.ADVANCED
+
     @classmethod
     def _determine_syndrome_type(cls, scores: SyndromeScores) -> SyndromeType:
         """根据证型分数确定证型组合（矩阵匹配）"""
@@ -358,37 +323,54 @@ class InsomniaDiagnosisEngine:
         return cls.SYNDROME_MATRIX.get(syndrome_key, SyndromeType.LIVER_KIDNEY_DEFICIENCY)
     
     @classmethod
-    def _generate_treatment_plan(cls, base_score: int, syndrome: SyndromeType, syndrome_scores: SyndromeScores) -> Dict:
-        """根据分数和证型生成治疗方案"""
-        
-        # 根据分数等级确定治疗方案
+    def _treatment_plan_key(cls, base_score: int, syndrome: SyndromeType, syndrome_scores: SyndromeScores) -> Tuple:
+        """治疗方案只取决于分数档位，以及初级档的肝血神最高项、中级档的证型"""
         if base_score >= 103:
+            return ("no_treatment",)
+        elif base_score == 74:
+            return ("primary_74",)
+        elif base_score >= 60:
+            return ("primary", cls._dominant_row_syndrome(syndrome_scores))
+        elif base_score >= 45:
+            return ("middle", syndrome)
+        return ("advanced",)
+
+    @classmethod
+    def _generate_treatment_plan(cls, base_score: int, syndrome: SyndromeType, syndrome_scores: SyndromeScores) -> Dict:
+        """根据分数和证型查预编译的方案表（返回共享的只读方案）"""
+        return TREATMENT_PLAN_TABLE[cls._treatment_plan_key(base_score, syndrome, syndrome_scores)]
+
+    @classmethod
+    def _build_treatment_plan(cls, key: Tuple) -> Dict:
+        """生成一种治疗方案（导入时编译方案表用）"""
+        bucket = key[0]
+        if bucket == "no_treatment":
             return {
                 "level": "无需治疗",
                 "recommendation": "保持现状",
                 "products": [],
                 "therapy": []
             }
-        elif base_score == 74:
+        elif bucket == "primary_74":
             return {
                 "level": "初级失眠(74分)",
                 "recommendation": "保持",
                 "products": ["茶包1"],
                 "therapy": []
             }
-        elif base_score >= 60:
+        elif bucket == "primary":
             # 初级失眠 60-73分，茶包3（根据肝血神最高分）+ 奶粉
-            syndrome_tea = cls._get_syndrome_tea_for_primary(syndrome_scores)
+            syndrome_tea = cls._get_syndrome_tea_for_primary(key[1])
             return {
                 "level": "初级失眠(60-73分)",
                 "recommendation": "茶包3 + 奶粉",
                 "products": [syndrome_tea, "奶粉"],
                 "therapy": []
             }
-        elif base_score >= 45:
+        elif bucket == "middle":
             # 中级失眠，奶粉 + 坚果/鱼油 + 证型穴位
-            syndrome_products, additional_products = cls._get_syndrome_products_with_supplements(syndrome)
-            acupoint_therapy = cls._get_syndrome_acupoints(syndrome)
+            syndrome_products, additional_products = cls._get_syndrome_products_with_supplements(key[1])
+            acupoint_therapy = cls._get_syndrome_acupoints(key[1])
             return {
                 "level": "中级失眠(45-59分)", 
                 "recommendation": "奶粉+营养补充+理疗",
@@ -404,26 +386,21 @@ class InsomniaDiagnosisEngine:
                 "therapy": [],
                 "special": "定制流程"
             }
-    
+
+    @classmethod
+    def _dominant_row_syndrome(cls, syndrome_scores: SyndromeScores) -> str:
+        """肝肠、血液、神内中得分最高的一项（同分取靠前的）"""
+        return max(ROW_SYNDROMES, key=lambda field: getattr(syndrome_scores, field))
+
     @classmethod
-    def _get_syndrome_tea_for_primary(cls, syndrome_scores: SyndromeScores) -> str:
+    def _get_syndrome_tea_for_primary(cls, dominant_row: str) -> str:
         """初级失眠(60-73分)根据肝血神最高分获取对应的茶包3"""
-        # 食疗逻辑：看肝肠、血液、神内哪个最高分
-        scores = {
-            "肝肠": syndrome_scores.liver_intestine,
-            "血液": syndrome_scores.blood,
-            "神内": syndrome_scores.neural
-        }
-        
-        max_syndrome = max(scores.items(), key=lambda x: x[1])[0]
-        
         tea_map = {
-            "肝肠": "茶包3(养肝)",
-            "血液": "茶包3(养血)",
-            "神内": "茶包3(养神)"
+            "liver_intestine": "茶包3(养肝)",
+            "blood": "茶包3(养血)",
+            "neural": "茶包3(养神)"
         }
-        
-        return tea_map.get(max_syndrome, "茶包3(养肝)")
+        return tea_map.get(dominant_row, "茶包3(养肝)")
         
     @classmethod
     def _get_syndrome_products_with_supplements(cls, syndrome: SyndromeType) -> Tuple[List[str], List[str]]:
@@ -469,4 +446,246 @@ class InsomniaDiagnosisEngine:
         
         # 综合置信度
         confidence = (score_confidence + syndrome_confidence) / 2.0
-        return round(confidence, 2)
\ No newline at end of file
+        return round(confidence, 2)
+
+
+# ==================== 编译后的计分表 ====================
+
+# 证型分数列顺序（与 SyndromeScores 字段一致）
+SYNDROME_FIELDS = ("liver_intestine", "blood", "neural", "bone_marrow", "brain_marrow")
+ROW_SYNDROMES = SYNDROME_FIELDS[:3]   # 主证型
+COL_SYNDROMES = SYNDROME_FIELDS[3:]   # 次证型
+
+# 证型网格：下标 = 主证型下标 * 2 + 次证型下标
+SYNDROME_GRID = tuple(
+    InsomniaDiagnosisEngine.SYNDROME_MATRIX[(row, col)]
+    for row in ROW_SYNDROMES for col in COL_SYNDROMES
+)
+# 等级下标：0..2 对应 LEVEL_THRESHOLDS，3 为高级失眠
+LEVELS = tuple(level for _, level in InsomniaDiagnosisEngine.LEVEL_THRESHOLDS) + (InsomniaLevel.ADVANCED,)
+
+
+# ==================== 预编译的治疗方案表 ====================
+
+class FrozenPlan(dict):
+    """
+    只读的治疗方案：所有诊断结果共享同一对象，修改会抛出 TypeError
+    仍是 dict 子类，JSON 序列化、dataclasses.asdict 都不受影响；需要修改时先 dict(plan) 复制
+    """
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("治疗方案是共享的只读对象，请先复制再修改")
+
+    __setitem__ = __delitem__ = __ior__ = _readonly
+    clear = pop = popitem = setdefault = update = _readonly
+
+    def __reduce__(self):
+        return (FrozenPlan, (dict(self),))
+
+
+def freeze_plan(plan: Dict) -> FrozenPlan:
+    """方案冻结为 FrozenPlan，其中的 list 转为 tuple"""
+    return FrozenPlan({
+        key: tuple(value) if isinstance(value, list) else value
+        for key, value in plan.items()
+    })
+
+
+def _compile_treatment_plans() -> Dict[Tuple, FrozenPlan]:
+    """按 (分数档位, 证型/肝血神最高项) 枚举全部方案，每种只构建一次"""
+    engine = InsomniaDiagnosisEngine
+    keys = [("no_treatment",), ("primary_74",), ("advanced",)]
+    keys += [("primary", row) for row in ROW_SYNDROMES]
+    keys += [("middle", syndrome) for syndrome in SyndromeType]
+    return {key: freeze_plan(engine._build_treatment_plan(key)) for key in keys}
+
+
+TREATMENT_PLAN_TABLE = _compile_treatment_plans()
+SPECIAL_FLOW_PLAN_TABLE = {
+    special: freeze_plan(plan)
+    for special, plan in InsomniaDiagnosisEngine.SPECIAL_FLOW_TREATMENT_PLANS.items()
+}
+
+SINGLE_CHOICE_QUESTIONS = (1, 2, 3, 4, 5, 6, 9)  # 取首个答案
+MULTIPLE_CHOICE_QUESTIONS = (7, 8)               # 每个选中项都计分
+
+
+@dataclass
+class BatchScores:
+    """批量计分结果（每行对应一份问卷）"""
+    base_scores: np.ndarray        # (N,) 基础分数
+    syndrome_scores: np.ndarray    # (N, 5) 证型分数，列顺序同 SYNDROME_FIELDS
+    level_indexes: np.ndarray      # (N,) LEVELS 下标
+    syndrome_indexes: np.ndarray   # (N,) SYNDROME_GRID 下标
+    confidences: np.ndarray        # (N,) 置信度（未取整）
+    specials: List[Optional[str]]  # 特殊流程标记，无则为 None
+
+
+class ScoringTable:
+    """
+    把 BASE_SCORING / SYNDROME_SCORING 编译为稠密计分表
+
+    特征列：
+    - 1-9题每个 (题号, 选项) 一列：单选题首个答案记1，多选题按选中次数计数
+    - 10-19题每题一列：选"是"记1，否则多选题按选中项数计分
+    weights[列] = [基础分增量, 肝肠, 血液, 神内, 骨髓, 脑髓]
+    计分即 计数向量 × weights。
+    """
+
+    def __init__(self, engine=InsomniaDiagnosisEngine):
+        self.option_columns: Dict[Tuple[int, str], int] = {}
+        weight_rows: List[List[int]] = []
+
+        for question_id, options in sorted(engine.BASE_SCORING.items()):
+            for option, delta in options.items():
+                self.option_columns[(question_id, option)] = len(weight_rows)
+                # 第9题只用于特殊流程判断，不参与基础评分
+                weight_rows.append([0 if question_id == 9 else delta, 0, 0, 0, 0, 0])
+
+        self.syndrome_columns: Dict[int, int] = {}
+        for syndrome_index, field_name in enumerate(SYNDROME_FIELDS):
+            for question_id in engine.SYNDROME_SCORING[field_name]:
+                self.syndrome_columns[question_id] = len(weight_rows)
+                row = [0, 0, 0, 0, 0, 0]
+                row[1 + syndrome_index] = 1
+                weight_rows.append(row)
+
+        self.width = len(weight_rows)
+        self.weights = np.array(weight_rows, dtype=np.int64)
+        # 每列只影响一个分量：列 -> (分量下标, 增量)，供单份问卷累加
+        self.column_effects = [
+            next(((k, delta) for k, delta in enumerate(row) if delta), (0, 0))
+            for row in weight_rows
+        ]
+
+        # 编码用的查找表（按答案字典的字符串题号）
+        self._single_lookups = [
+            (str(question_id), {
+                option: column for (q, option), column in self.option_columns.items() if q == question_id
+            })
+            for question_id in SINGLE_CHOICE_QUESTIONS
+        ]
+        self._multiple_lookups = [
+            (str(question_id), {
+                option: column for (q, option), column in self.option_columns.items() if q == question_id
+            })
+            for question_id in MULTIPLE_CHOICE_QUESTIONS
+        ]
+        self._syndrome_lookups = [
+            (str(question_id), column) for question_id, column in self.syndrome_columns.items()
+        ]
+        self.special_columns = tuple(
+            (self.option_columns[(question_id, option)], special)
+            for question_id, option, special in engine.SPECIAL_FLOWS
+        )
+        self.level_thresholds = np.array([threshold for threshold, _ in engine.LEVEL_THRESHOLDS], dtype=np.int64)
+
+    def encode(self, answers: Dict) -> List[Tuple[int, int]]:
+        """把一份答案编码为稀疏的 (列, 计数) 列表"""
+        cells = []
+        get = answers.get
+
+        for key, columns in self._single_lookups:
+            value = get(key)
+            if value:
+                first = value[0] if isinstance(value, list) else value
+                column = columns.get(first) if isinstance(first, str) else None
+                if column is not None:
+                    cells.append((column, 1))
+
+        for key, columns in self._multiple_lookups:
+            value = get(key)
+            if value:
+                for option in (value if isinstance(value, list) else (value,)):
+                    column = columns.get(option) if isinstance(option, str) else None
+                    if column is not None:
+                        cells.append((column, 1))
+
+        for key, column in self._syndrome_lookups:
+            value = get(key)
+            if not value:
+                continue
+            if value == "是" or (isinstance(value, list) and "是" in value):
+                cells.append((column, 1))
+            elif isinstance(value, list):
+                cells.append((column, len(value)))  # 多选题按选中项数计分
+
+        return cells
+
+    def special_flow(self, cells: List[Tuple[int, int]]) -> Optional[str]:
+        present = {column for column, _ in cells}
+        for column, special in self.special_columns:
+            if column in present:
+                return special
+        return None
+
+    def sum_cells(self, cells: List[Tuple[int, int]]) -> List[int]:
+        """单份问卷查表累加：[基础分, 五个证型分]"""
+        totals = [0, 0, 0, 0, 0, 0]
+        column_effects = self.column_effects
+        for column, count in cells:
+            k, delta = column_effects[column]
+            totals[k] += delta * count
+        return totals
+
+    def count_matrix(self, answer_sets: Sequence[Dict]) -> np.ndarray:
+        """把多份答案编码为 (N, 列数) 的计数矩阵"""
+        flat_indexes = []
+        counts = []
+        for row_index, answers in enumerate(answer_sets):
+            offset = row_index * self.width
+            for column, count in self.encode(answers):
+                flat_indexes.append(offset + column)
+                counts.append(count)
+
+        total = len(answer_sets) * self.width
+        matrix = np.bincount(
+            np.asarray(flat_indexes, dtype=np.int64),
+            weights=np.asarray(counts, dtype=np.float64),
+            minlength=total
+        )
+        return matrix.astype(np.int64).reshape(len(answer_sets), self.width)
+
+    def score_batch(self, answer_sets: Sequence[Dict]) -> BatchScores:
+        counts = self.count_matrix(answer_sets)
+        totals = counts @ self.weights
+        base_scores = totals[:, 0]
+        syndrome_scores = totals[:, 1:]
+
+        # 与标量逻辑一致：按配置顺序取最高分（并列取靠前者）
+        row_indexes = np.argmax(syndrome_scores[:, :len(ROW_SYNDROMES)], axis=1)
+        col_indexes = np.argmax(syndrome_scores[:, len(ROW_SYNDROMES):], axis=1)
+        syndrome_indexes = row_indexes * len(COL_SYNDROMES) + col_indexes
+
+        # 未达到任何分数线的下标为 len(thresholds)，即高级失眠
+        level_indexes = (base_scores[:, None] < self.level_thresholds[None, :]).sum(axis=1)
+
+        confidences = (
+            np.minimum(base_scores / 100.0, 1.0)
+            + np.minimum(syndrome_scores.max(axis=1) / 4.0, 1.0)
+        ) / 2.0
+
+        specials: List[Optional[str]] = [None] * len(answer_sets)
+        for column, special in reversed(self.special_columns):
+            for row_index in np.flatnonzero(counts[:, column]).tolist():
+                specials[row_index] = special
+
+        return BatchScores(
+            base_scores=base_scores,
+            syndrome_scores=syndrome_scores,
+            level_indexes=level_indexes,
+            syndrome_indexes=syndrome_indexes,
+            confidences=confidences,
+            specials=specials
+        )
+
+
+_scoring_table: Optional[ScoringTable] = None
+
+
+def scoring_table() -> ScoringTable:
+    """计分表（首次使用时编译）"""
+    global _scoring_table
+    if _scoring_table is None:
+        _scoring_table = ScoringTable()
+    return _scoring_table
@@ -0,0 +1,330 @@
+"""
+声明式问卷诊断引擎
+
+新病种只需在 specs/ 下增加一个 JSON 问卷规格，不需要写问卷类和计分循环：
+- 启动时把规格编译为查找表：(题号, 选项值或标签) -> (严重度分, 各维度分...) 的预先求和行
+- 诊断时每个答案查一次表并累加，证型得分由维度得分乘以编译好的证型权重矩阵得到
+- 等级 x 证型 的治疗方案在编译时全部生成并冻结，诊断结果共享只读方案
+- 规格有误时在启动时抛出 SpecError，不会等到用户提交问卷才发现
+
+规格格式（示例见 specs/stomach.json）:
+{
+  "disease": "stomach", "name": "胃病", "version": "1.0", "order": 2, "title": "...",
+  "dimensions": [{"key": "spleen_qi", "name": "脾气虚"}, ...],
+  "questions": [{
+      "id": 1, "text": "...", "type": "single | multiple | yes_no", "category": "...",
+      "required": true,
+      "options": [{"value": "A", "label": "...", "score": 3, "dimensions": {"spleen_qi": 2}}]
+  }],
+  "levels": [{"min_score": 20, "name": "重度", "advice": "..."}, ...],
+  "syndromes": [{"key": "...", "name": "脾胃气虚", "weights": {"spleen_qi": 1, "stomach_qi": 1},
+                 "treatment": {"products": [...], "acupoints": [...], "diet_therapy": [...], "lifestyle": [...]}}]
+}
+"""
+import json
+import os
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from app.diagnosis.base import DiagnosisBase, DiseaseType
+from app.diagnosis.insomnia_diagnosis_engine import FrozenPlan, freeze_plan
+
+SPEC_DIRECTORY = os.path.join(os.path.dirname(__file__), "specs")
+QUESTION_TYPES = {"single": "单选题", "multiple": "多选题", "yes_no": "是非题"}
+
+
+class SpecError(ValueError):
+    """问卷规格错误"""
+
+
+@dataclass(frozen=True)
+class SpecDiagnosisResult:
+    """声明式问卷的诊断结果"""
+    disease: str
+    total_score: float                          # 严重度总分
+    level: str                                  # 严重程度
+    dimension_scores: Dict[str, float]          # 维度key -> 得分
+    syndrome_ranking: List[Tuple[str, float]]   # [(证型key, 得分)]，从高到低
+    syndrome: str                               # 主证型key
+    treatment_plan: FrozenPlan
+    confidence: float
+    answered: int                               # 有效作答的题数
+
+
+def _require(condition: bool, disease: str, message: str):
+    if not condition:
+        raise SpecError(f"问卷规格 {disease}: {message}")
+
+
+class CompiledDiagnosis(DiagnosisBase):
+    """编译后的声明式问卷诊断引擎（实例只读，可在多个请求间共享）"""
+
+    def __init__(self, spec: Dict):
+        self.spec = spec
+        self.key = spec.get("disease")
+        _require(isinstance(self.key, str) and self.key, "<unknown>", "缺少 disease")
+        try:
+            disease_type = DiseaseType[self.key.upper()]
+        except KeyError:
+            raise SpecError(f"问卷规格 {self.key}: DiseaseType 中没有对应的病种")
+        super().__init__(disease_type)
+
+        self.name = spec.get("name", disease_type.value)
+        self.version = str(spec.get("version", "1"))
+        self.title = spec.get("title", f"{self.name}问卷")
+        self.order = spec.get("order", 100)  # 病种列表中的排序
+        self._compile_dimensions()
+        self._compile_questions()
+        self._compile_levels()
+        self._compile_syndromes()
+
+    # ---------- 编译 ----------
+
+    def _compile_dimensions(self):
+        dimensions = self.spec.get("dimensions") or []
+        _require(len(dimensions) > 0, self.key, "至少需要一个维度")
+        self.dimension_keys: Tuple[str, ...] = tuple(d["key"] for d in dimensions)
+        self.dimension_names: Dict[str, str] = {d["key"]: d.get("name", d["key"]) for d in dimensions}
+        _require(len(set(self.dimension_keys)) == len(self.dimension_keys), self.key, "维度 key 重复")
+        self._dimension_indexes = {key: i for i, key in enumerate(self.dimension_keys)}
+
+    def _compile_questions(self):
+        questions = self.spec.get("questions") or []
+        _require(len(questions) > 0, self.key, "至少需要一道题")
+        width = 1 + len(self.dimension_keys)  # 第0列为严重度分
+
+        # (题号字符串, 选项值或标签) -> 分值行；单选题只取首个答案
+        self._option_rows: Dict[Tuple[str, str], Tuple[float, ...]] = {}
+        self._multiple_choice: Dict[str, bool] = {}
+        self._dimension_ceiling = [0.0] * len(self.dimension_keys)  # 各维度可能的最高分
+
+        seen_ids = set()
+        for question in questions:
+            question_id = question.get("id")
+            _require(isinstance(question_id, int) and question_id not in seen_ids, self.key,
+                     f"题号无效或重复: {question_id}")
+            seen_ids.add(question_id)
+            question_type = question.get("type", "single")
+            _require(question_type in QUESTION_TYPES, self.key, f"第{question_id}题题型无效: {question_type}")
+            options = question.get("options") or []
+            _require(len(options) > 0, self.key, f"第{question_id}题没有选项")
+
+            multiple = question_type == "multiple"
+            self._multiple_choice[str(question_id)] = multiple
+            option_rows = []
+            for option in options:
+                row = [0.0] * width
+                row[0] = float(option.get("score", 0))
+                for dimension, weight in (option.get("dimensions") or {}).items():
+                    _require(dimension in self._dimension_indexes, self.key,
+                             f"第{question_id}题选项 {option.get('value')} 引用了未定义的维度 {dimension}")
+                    row[1 + self._dimension_indexes[dimension]] += float(weight)
+                row = tuple(row)
+                option_rows.append(row)
+                for key in {str(option["value"]), str(option.get("label", option["value"]))}:
+                    self._option_rows[(str(question_id), key)] = row
+
+            # 维度上限：单选题取各选项最大值，多选题累加所有正分
+            for i in range(len(self.dimension_keys)):
+                values = [row[1 + i] for row in option_rows]
+                if multiple:
+                    self._dimension_ceiling[i] += sum(value for value in values if value > 0)
+                else:
+                    self._dimension_ceiling[i] += max(max(values), 0.0)
+
+        self.question_count = len(questions)
+        self._zero_row = (0.0,) * width
+
+    def _compile_levels(self):
+        levels = self.spec.get("levels") or []
+        _require(len(levels) > 0, self.key, "至少需要一个严重程度分级")
+        # 按分数线从高到低匹配，最后一级兜底
+        self.levels: Tuple[Dict, ...] = tuple(sorted(levels, key=lambda level: level.get("min_score", 0), reverse=True))
+
+    def _compile_syndromes(self):
+        syndromes = self.spec.get("syndromes") or []
+        _require(len(syndromes) > 0, self.key, "至少需要一个证型")
+        self.syndrome_keys: Tuple[str, ...] = tuple(s["key"] for s in syndromes)
+        _require(len(set(self.syndrome_keys)) == len(self.syndrome_keys), self.key, "证型 key 重复")
+        self.syndromes: Dict[str, Dict] = {s["key"]: s for s in syndromes}
+
+        # 证型权重矩阵：每个证型一行稀疏的 (维度下标, 权重)
+        self._syndrome_weights: List[Tuple[Tuple[int, float], ...]] = []
+        self._syndrome_ceiling: List[float] = []
+        for syndrome in syndromes:
+            weights = syndrome.get("weights") or {}
+            _require(len(weights) > 0, self.key, f"证型 {syndrome['key']} 没有维度权重")
+            row = []
+            for dimension, weight in weights.items():
+                _require(dimension in self._dimension_indexes, self.key,
+                         f"证型 {syndrome['key']} 引用了未定义的维度 {dimension}")
+                row.append((self._dimension_indexes[dimension], float(weight)))
+            self._syndrome_weights.append(tuple(row))
+            self._syndrome_ceiling.append(sum(self._dimension_ceiling[i] * w for i, w in row if w > 0))
+
+        # 等级 x 证型 的治疗方案全部预先生成
+        self._plans: Dict[Tuple[str, str], FrozenPlan] = {}
+        for level in self.levels:
+            for syndrome in syndromes:
+                self._plans[(level["name"], syndrome["key"])] = freeze_plan({
+                    "level": level["name"],
+                    "recommendation": level.get("advice", ""),
+                    "syndrome": syndrome["name"],
+                    **(syndrome.get("treatment") or {})
+                })
+
+    # ---------- 诊断 ----------
+
+    def _sum_answers(self, answers: Dict) -> Tuple[List[float], int]:
+        """查表累加：answers 为 题号字符串 -> 选项（单个值或列表）"""
+        rows = [self._zero_row]
+        answered = 0
+        option_rows = self._option_rows
+        for question_id, selected in answers.items():
+            question_id = str(question_id)
+            multiple = self._multiple_choice.get(question_id)
+            if multiple is None:
+                continue
+            if not isinstance(selected, list):
+                selected = [selected]
+            elif not multiple:
+                selected = selected[:1]
+            matched = False
+            for option in (dict.fromkeys(selected) if multiple else selected):
+                row = option_rows.get((question_id, str(option)))
+                if row is not None:
+                    rows.append(row)
+                    matched = True
+            answered += matched
+        # 按列求和在C层完成
+        return [sum(column) for column in zip(*rows)], answered
+
+    def _syndrome_scores(self, dimension_values: Sequence[float]) -> List[float]:
+        return [
+            sum(dimension_values[i] * weight for i, weight in row)
+            for row in self._syndrome_weights
+        ]
+
+    def _level_for(self, total_score: float) -> Dict:
+        for level in self.levels:
+            if total_score >= level.get("min_score", 0):
+                return level
+        return self.levels[-1]
+
+    def analyze(self, answers: Dict, top_k: int = 3) -> SpecDiagnosisResult:
+        """分析问卷，answers 为 题号字符串 -> 选项值/标签（多选题为列表）"""
+        totals, answered = self._sum_answers(answers)
+        dimension_values = totals[1:]
+        syndrome_scores = self._syndrome_scores(dimension_values)
+
+        # 同分取规格中靠前的证型
+        order = sorted(range(len(syndrome_scores)), key=lambda i: -syndrome_scores[i])
+        best = order[0]
+        level = self._level_for(totals[0])
+        ceiling = self._syndrome_ceiling[best]
+        confidence = round(min(syndrome_scores[best] / ceiling, 1.0), 2) if ceiling > 0 else 0.0
+
+        return SpecDiagnosisResult(
+            disease=self.key,
+            total_score=totals[0],
+            level=level["name"],
+            dimension_scores=dict(zip(self.dimension_keys, dimension_values)),
+            syndrome_ranking=[(self.syndrome_keys[i], syndrome_scores[i]) for i in order[:top_k]],
+            syndrome=self.syndrome_keys[best],
+            treatment_plan=self._plans[(level["name"], self.syndrome_keys[best])],
+            confidence=confidence,
+            answered=answered
+        )
+
+    # ---------- DiagnosisBase 接口 ----------
+
+    def get_questionnaire(self) -> List[Dict]:
+        return [
+            {
+                "id": question["id"],
+                "text": question["text"],
+                "type": question.get("type", "single"),
+                "type_display": QUESTION_TYPES[question.get("type", "single")],
+                "category": question.get("category", ""),
+                "required": question.get("required", True),
+                "options": [
+                    {"value": option["value"], "label": option.get("label", option["value"])}
+                    for option in question["options"]
+                ]
+            }
+            for question in self.spec["questions"]
+        ]
+
+    def calculate_scores(self, answers: List[Dict]) -> Dict[str, float]:
+        totals, _ = self._sum_answers(convert_answers(answers))
+        return dict(zip(self.dimension_keys, totals[1:]))
+
+    def determine_syndrome(self, scores: Dict[str, float]) -> Dict:
+        syndrome_scores = self._syndrome_scores([scores.get(key, 0.0) for key in self.dimension_keys])
+        best = max(range(len(syndrome_scores)), key=lambda i: syndrome_scores[i])
+        syndrome = self.syndromes[self.syndrome_keys[best]]
+        return {"key": syndrome["key"], "name": syndrome["name"], "score": syndrome_scores[best]}
+
+    def get_treatment_plan(self, syndrome: str) -> Dict:
+        return dict(self.syndromes[syndrome].get("treatment") or {})
+
+    def format_result(self, result: SpecDiagnosisResult) -> Dict:
+        """诊断结果的接口返回格式"""
+        return {
+            "total_score": result.total_score,
+            "level": result.level,
+            "syndrome_type": self.syndromes[result.syndrome]["name"],
+            "syndrome_key": result.syndrome,
+            "confidence_score": result.confidence,
+            "detailed_scores": {
+                key: {"name": self.dimension_names[key], "score": score}
+                for key, score in result.dimension_scores.items()
+            },
+            "syndrome_ranking": [
+                {"key": key, "name": self.syndromes[key]["name"], "score": score}
+                for key, score in result.syndrome_ranking
+            ],
+            "treatment_plan": result.treatment_plan,
+            "answered_questions": result.answered
+        }
+
+
+def convert_answers(answers: List[Dict]) -> Dict:
+    """前端答案 [{question_id, selected_options}] -> 题号字符串 -> 选项列表"""
+    return {
+        str(answer["question_id"]): list(answer.get("selected_options") or [])
+        for answer in answers
+    }
+
+
+class SpecRegistry:
+    """已编译的病种问卷（启动时从 specs/ 目录加载）"""
+
+    def __init__(self, directory: str = SPEC_DIRECTORY):
+        self.directory = directory
+        self._diagnoses: Dict[str, CompiledDiagnosis] = {}
+
+    def load(self) -> "SpecRegistry":
+        diagnoses = {}
+        for filename in sorted(os.listdir(self.directory)):
+            if not filename.endswith(".json"):
+                continue
+            with open(os.path.join(self.directory, filename), encoding="utf-8") as f:
+                try:
+                    spec = json.load(f)
+                except json.JSONDecodeError as e:
+                    raise SpecError(f"问卷规格 {filename} 不是有效的JSON: {e}")
+            diagnosis = CompiledDiagnosis(spec)
+            _require(diagnosis.key not in diagnoses, diagnosis.key, f"病种重复定义（{filename}）")
+            diagnoses[diagnosis.key] = diagnosis
+        self._diagnoses = dict(sorted(diagnoses.items(), key=lambda item: (item[1].order, item[0])))
+        return self
+
+    def get(self, disease: str) -> Optional[CompiledDiagnosis]:
+        return self._diagnoses.get(disease)
+
+    def all(self) -> List[CompiledDiagnosis]:
+        return list(self._diagnoses.values())
+
+
+spec_registry = SpecRegistry().load()
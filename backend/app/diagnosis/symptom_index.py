@@ -0,0 +1,88 @@
+"""
+症状倒排索引
+
+把 "维度 -> {症状: 权重}" 的配置倒排为 "症状/舌象/脉象 -> [(维度下标, 权重)]"：
+- 计分时只遍历患者的症状，每个症状查一次索引，累加到定长得分向量
+- 计分耗时只与患者症状数相关，与配置中的症状总数无关，医师增加症状不影响计分速度
+- 累加顺序与逐维度扫描一致（先症状按输入顺序，再舌象、脉象），浮点结果完全相同
+"""
+import heapq
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+Posting = Tuple[int, float]  # (维度下标, 权重)
+
+
+class SymptomIndex:
+    """症状 -> 证型维度 的倒排索引"""
+
+    KINDS = ("symptom", "tongue", "pulse")
+
+    def __init__(self, dimensions: Sequence[str]):
+        self.dimensions: Tuple[str, ...] = tuple(dimensions)
+        self._dimension_indexes = {dimension: i for i, dimension in enumerate(self.dimensions)}
+        self._postings: Dict[str, Dict[str, List[Posting]]] = {kind: {} for kind in self.KINDS}
+
+    def add(self, kind: str, finding: str, dimension: str, weight: float):
+        """登记一条 (症状/舌象/脉象, 维度, 权重)"""
+        postings = self._postings[kind].setdefault(finding, [])
+        postings.append((self._dimension_indexes[dimension], weight))
+
+    @classmethod
+    def from_weights(
+        cls,
+        symptom_weights: Mapping[str, Mapping[str, float]],
+        tongue_pulse_weights: Optional[Mapping[str, Mapping[str, Mapping[str, float]]]] = None,
+        dimensions: Optional[Sequence[str]] = None
+    ) -> "SymptomIndex":
+        """
+        从按维度组织的权重配置构建索引
+        symptom_weights: {维度: {症状: 权重}}
+        tongue_pulse_weights: {维度: {"tongue": {舌象: 权重}, "pulse": {脉象: 权重}}}
+        """
+        tongue_pulse_weights = tongue_pulse_weights or {}
+        index = cls(dimensions or list(dict.fromkeys([*symptom_weights, *tongue_pulse_weights])))
+        for dimension in index.dimensions:
+            for symptom, weight in symptom_weights.get(dimension, {}).items():
+                index.add("symptom", symptom, dimension, weight)
+            for kind in ("tongue", "pulse"):
+                for finding, weight in tongue_pulse_weights.get(dimension, {}).get(kind, {}).items():
+                    index.add(kind, finding, dimension, weight)
+        return index
+
+    @property
+    def vocabulary_size(self) -> int:
+        return sum(len(postings) for postings in self._postings.values())
+
+    def score(
+        self,
+        symptoms: Iterable[str],
+        tongue: Optional[str] = None,
+        pulse: Optional[str] = None
+    ) -> List[float]:
+        """单次遍历患者症状，返回与 dimensions 顺序一致的得分向量（重复的症状重复计分）"""
+        scores = [0.0] * len(self.dimensions)
+        symptom_postings = self._postings["symptom"]
+        for symptom in symptoms:
+            for dimension_index, weight in symptom_postings.get(symptom, ()):
+                scores[dimension_index] += weight
+        for kind, finding in (("tongue", tongue), ("pulse", pulse)):
+            if finding is None:
+                continue
+            for dimension_index, weight in self._postings[kind].get(finding, ()):
+                scores[dimension_index] += weight
+        return scores
+
+    def rank(
+        self,
+        symptoms: Iterable[str],
+        tongue: Optional[str] = None,
+        pulse: Optional[str] = None,
+        top_k: int = 3
+    ) -> List[Tuple[str, float]]:
+        """得分最高的 top_k 个维度（只含得分大于0的，同分按维度顺序）"""
+        return self.top_k(self.score(symptoms, tongue, pulse), top_k)
+
+    def top_k(self, scores: Sequence[float], top_k: int = 3) -> List[Tuple[str, float]]:
+        positive = [i for i, score in enumerate(scores) if score > 0]
+        best = heapq.nlargest(top_k, positive, key=scores.__getitem__)
+        return [(self.dimensions[i], scores[i]) for i in best]
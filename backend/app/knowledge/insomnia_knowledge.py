@@ -1,3 +1,6 @@
+from app.diagnosis.symptom_index import SymptomIndex
+
+
 class InsomniaKnowledgeBase:
     """失眠专病知识库"""
     
@@ -170,13 +173,30 @@ class InsomniaKnowledgeBase:
     }
     
     @classmethod
-    def get_syndrome_by_symptoms(cls, symptoms):
-        """根据症状判断证型"""
-        # 这里可以添加你的诊断逻辑
-        pass
+    def get_syndrome_by_symptoms(cls, symptoms, tongue=None, pulse=None, top_k=3):
+        """
+        根据症状判断证型：返回匹配度最高的 top_k 个证型 [(证型, 匹配数)]
+        主症、舌象、脉象每项命中记1分，查倒排索引，不逐个扫描证型
+        """
+        return SYNDROME_SYMPTOM_INDEX.rank(symptoms, tongue, pulse, top_k)
     
     @classmethod
     def get_treatment_plan(cls, syndrome_type):
         """根据证型获取治疗方案"""
         # 这里可以添加你的治疗方案逻辑
-        pass
\ No newline at end of file
+        pass
+
+
+def _build_syndrome_symptom_index() -> SymptomIndex:
+    index = SymptomIndex(list(InsomniaKnowledgeBase.SYNDROME_PATTERNS))
+    for syndrome, pattern in InsomniaKnowledgeBase.SYNDROME_PATTERNS.items():
+        for symptom in pattern.get("primary_symptoms", []):
+            index.add("symptom", symptom, syndrome, 1.0)
+        for kind in ("tongue", "pulse"):
+            if pattern.get(kind):
+                index.add(kind, pattern[kind], syndrome, 1.0)
+    return index
+
+
+# 症状/舌象/脉象 -> 证型 的倒排索引，导入时构建一次
+SYNDROME_SYMPTOM_INDEX = _build_syndrome_symptom_index()
@@ -22,7 +22,6 @@ from starlette.requests import Request
 
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
 from fastapi.responses import JSONResponse
 import time
 
@@ -30,6 +29,11 @@ from app.api.api import api_router
 from app.core.config import settings
 from app.core.logging_config import setup_logging
 from app.core.rate_limiter import RateLimitMiddleware
+from app.core import perf_monitor
+from app.core.revocation_store import revocation_store
+from app.core.upload_serving import UploadFiles
+from app.services import diagnosis_recorder
+from app.services.order_sweeper import order_sweeper
 
 # 初始化日志系统
 setup_logging()
@@ -154,12 +158,75 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# 性能监控中间件（可选，放在最外层以统计完整耗时）
+if settings.PERF_MONITOR_ENABLED:
+    app.add_middleware(
+        perf_monitor.PerfMonitorMiddleware,
+        registry=perf_monitor.init_perf_monitor(
+            lag_threshold_ms=settings.PERF_LOOP_LAG_THRESHOLD_MS,
+            sample_interval_ms=settings.PERF_LOOP_SAMPLE_INTERVAL_MS
+        )
+    )
+
+    @app.on_event("startup")
+    async def start_loop_lag_monitor():
+        perf_monitor.loop_lag_monitor.start()
+
+    @app.on_event("shutdown")
+    async def stop_loop_lag_monitor():
+        await perf_monitor.loop_lag_monitor.stop()
+
+# 诊断记录后台批量写入（关闭时先写完队列）
+if settings.DIAGNOSIS_RECORD_ENABLED:
+    diagnosis_recorder.init_diagnosis_recorder(
+        batch_size=settings.DIAGNOSIS_RECORD_BATCH_SIZE,
+        flush_interval_ms=settings.DIAGNOSIS_RECORD_FLUSH_MS,
+        max_pending=settings.DIAGNOSIS_RECORD_MAX_PENDING
+    )
+
+    @app.on_event("startup")
+    async def start_diagnosis_recorder():
+        diagnosis_recorder.diagnosis_recorder.start()
+
+    @app.on_event("shutdown")
+    async def stop_diagnosis_recorder():
+        recorder = diagnosis_recorder.diagnosis_recorder
+        await recorder.stop()
+        logger.info(f"诊断记录写入队列已关闭: {recorder.stats()}")
+
+# 令牌吊销集合：启动时全量加载，之后增量同步其他进程写入的吊销，并定期清理过期记录
+@app.on_event("startup")
+async def start_revocation_sync():
+    revocation_store.start(settings.REVOCATION_SYNC_SECONDS, settings.REVOCATION_PURGE_SECONDS)
+
+@app.on_event("shutdown")
+async def stop_revocation_sync():
+    await revocation_store.stop()
+
+# 过期预订单、超时未支付订单清理（多进程部署时只有一个进程执行）
+if settings.ORDER_SWEEPER_ENABLED:
+    @app.on_event("startup")
+    async def start_order_sweeper():
+        order_sweeper.start()
+
+    @app.on_event("shutdown")
+    async def stop_order_sweeper():
+        await order_sweeper.stop()
+
 # 创建上传目录
 os.makedirs("uploads/videos", exist_ok=True)
 os.makedirs("uploads/images", exist_ok=True)
 
-# 挂载静态文件
-app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
+# 挂载静态文件（支持 Range / 304 / X-Accel-Redirect）
+app.mount(
+    "/uploads",
+    UploadFiles(
+        directory="uploads",
+        max_age=settings.UPLOADS_CACHE_MAX_AGE,
+        accel_redirect_prefix=settings.UPLOADS_ACCEL_REDIRECT_PREFIX
+    ),
+    name="uploads"
+)
 
 # 包含API路由
 app.include_router(api_router, prefix="/api")
@@ -227,6 +294,9 @@ async def detailed_health_check():
             config_status = "unhealthy"
             config_errors.append(f"{config} not properly configured")
     
+    # 订单清理运行状态
+    health_status["checks"]["order_sweeper"] = order_sweeper.stats()
+
     health_status["checks"]["configuration"] = {
         "status": config_status,
         "errors": config_errors if config_errors else None
@@ -237,6 +307,11 @@ async def detailed_health_check():
     
     return health_status
 
+@app.get("/health/perf")
+async def perf_health_check():
+    """性能监控数据（事件循环延迟、阻塞路由、各路由耗时分位数）"""
+    return perf_monitor.get_perf_snapshot()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
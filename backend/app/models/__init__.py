@@ -2,7 +2,7 @@
 数据库模型初始化文件
 """
 from app.database import Base
-from .user import User
+from .user import User, UserRole, UserStatus
 from .consultation import Consultation, ConsultationMessage, ConsultationStatus, PaymentStatus
 from .course import Course, Lesson, Enrollment, WatchRecord, VideoStatus
 from .expert import Expert, ExpertSchedule, ExpertReview
@@ -10,14 +10,28 @@ from .product import Product, Order, OrderItem
 from .shipping import Shipping
 from .cart import Cart, CartItem
 from .audit_log import AuditLog
+from .stored_file import StoredFile
+from .upload_session import UploadSession, UploadChunk
+from .diagnosis_record import DiagnosisRecord
+from .token_revocation import TokenRevocation
+from .inventory_reservation import InventoryReservation
+from .draft_order import DraftOrder
+from .payment_notification import PaymentNotification
 
 __all__ = [
-    "Base", "User",
+    "Base", "User", "UserRole", "UserStatus",
     "Consultation", "ConsultationMessage", "ConsultationStatus", "PaymentStatus",
     "Course", "Lesson", "Enrollment", "WatchRecord", "VideoStatus",
     "Expert", "ExpertSchedule", "ExpertReview",
     "Product", "Order", "OrderItem",
     "Shipping",
     "Cart", "CartItem",
-    "AuditLog"
+    "AuditLog",
+    "StoredFile",
+    "UploadSession", "UploadChunk",
+    "DiagnosisRecord",
+    "TokenRevocation",
+    "InventoryReservation",
+    "DraftOrder",
+    "PaymentNotification"
 ]
\ No newline at end of file
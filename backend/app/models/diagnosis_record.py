@@ -0,0 +1,36 @@
+"""
+诊断记录模型
+每次诊断的结果都会保存，用于查看历史和统计分析（由后台队列批量写入）
+"""
+from sqlalchemy import Column, Integer, Float, String, DateTime, JSON, ForeignKey
+from sqlalchemy.orm import relationship
+from app.database import Base
+
+
+class DiagnosisRecord(Base):
+    """诊断记录"""
+    __tablename__ = "diagnosis_records"
+
+    id = Column(String(32), primary_key=True)  # 记录ID（uuid hex，诊断时生成并返回给前端）
+    disease = Column(String(32), nullable=False, index=True)  # 病种：insomnia
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)  # 登录用户（匿名诊断为空）
+    patient_id = Column(String)  # 前端/机构传入的患者编号
+    source = Column(String(16), nullable=False, default="single")  # single / batch
+
+    # 诊断结果
+    base_score = Column(Integer)
+    level = Column(String)  # 失眠等级
+    syndrome = Column(String)  # 证型
+    confidence = Column(Float)
+    syndrome_scores = Column(JSON)  # 各证型得分
+    treatment_plan = Column(JSON)
+    answers = Column(JSON)  # 转换后的答案（题号 -> 选项值）
+
+    # 诊断时间（诊断时生成，不使用数据库默认值，批量写入有延迟）
+    created_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
+    # 关系
+    user = relationship("User")
+
+    def __repr__(self):
+        return f"<DiagnosisRecord(id='{self.id}', disease='{self.disease}', level='{self.level}')>"
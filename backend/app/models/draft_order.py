@@ -0,0 +1,24 @@
+"""
+预订单模型
+结算页生成的临时订单，有效期30分钟（不扣库存），转换为正式订单或取消时删除，过期记录由后台清理
+"""
+from sqlalchemy import Column, Integer, String, DateTime, JSON, Numeric, ForeignKey
+from app.database import Base
+
+
+class DraftOrder(Base):
+    """预订单"""
+    __tablename__ = "draft_orders"
+
+    id = Column(String(64), primary_key=True)  # DRAFT_{时间戳}_{随机串}
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    items_json = Column(JSON, nullable=False)  # 下单时的商品快照
+    total_amount = Column(Numeric(10, 2), nullable=False)
+    from_source = Column(String(32))  # cart / direct_buy
+
+    # 与接口一致使用本地时间（不带时区）
+    expires_at = Column(DateTime, nullable=False, index=True)
+    created_at = Column(DateTime, nullable=False)
+
+    def __repr__(self):
+        return f"<DraftOrder(id='{self.id}', user_id={self.user_id})>"
@@ -0,0 +1,28 @@
+"""
+库存预占记录模型
+下单时扣减库存并记录预占，支付后转为已确认；取消订单或超时未支付时释放并归还库存
+"""
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index
+from app.database import Base
+
+
+class InventoryReservation(Base):
+    """库存预占记录（每个订单每个商品一条）"""
+    __tablename__ = "inventory_reservations"
+    __table_args__ = (
+        # 超时释放按 (status, expires_at) 范围扫描
+        Index("ix_inventory_reservations_status_expires_at", "status", "expires_at"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    order_id = Column(Integer, ForeignKey("orders.id"), nullable=False, index=True)
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
+    quantity = Column(Integer, nullable=False)
+    status = Column(String(16), nullable=False, default="reserved")  # reserved / committed / released
+
+    expires_at = Column(DateTime(timezone=True), nullable=False)  # 超过该时间仍未支付则释放
+    created_at = Column(DateTime(timezone=True), nullable=False)
+    released_at = Column(DateTime(timezone=True))
+
+    def __repr__(self):
+        return f"<InventoryReservation(order_id={self.order_id}, product_id={self.product_id}, status='{self.status}')>"
@@ -0,0 +1,23 @@
+"""
+支付回调记录模型
+每笔微信支付（transaction_id）只记录一次，微信重复推送的回调按该记录直接应答
+"""
+from sqlalchemy import Column, Integer, String, DateTime
+from app.database import Base
+
+
+class PaymentNotification(Base):
+    """支付回调记录"""
+    __tablename__ = "payment_notifications"
+
+    id = Column(Integer, primary_key=True, index=True)
+    transaction_id = Column(String(64), nullable=False, unique=True)  # 微信支付订单号
+    order_number = Column(String(64), nullable=False, index=True)  # 商户订单号（out_trade_no）
+    total_fee = Column(Integer)  # 支付金额（分）
+    time_end = Column(String(14))  # 支付完成时间（yyyyMMddHHmmss）
+    result = Column(String(16), nullable=False)  # paid: 本次回调将订单置为已支付 / skipped: 订单已不是待支付
+
+    created_at = Column(DateTime(timezone=True), nullable=False)
+
+    def __repr__(self):
+        return f"<PaymentNotification(transaction_id='{self.transaction_id}', result='{self.result}')>"
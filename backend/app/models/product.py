@@ -1,7 +1,7 @@
 """
 商品和订单模型
 """
-from sqlalchemy import Column, Integer, String, Text, DateTime, Float, Boolean, Enum, JSON, Numeric, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, DateTime, Float, Boolean, Enum, JSON, Numeric, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base
@@ -42,6 +42,10 @@ class Product(Base):
 
 class Order(Base):
     __tablename__ = "orders"
+    __table_args__ = (
+        # 超时未支付订单按 (status, created_at) 范围扫描
+        Index("ix_orders_status_created_at", "status", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     order_number = Column(String, unique=True, index=True)  # 订单号
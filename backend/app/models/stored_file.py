@@ -0,0 +1,25 @@
+"""
+上传文件内容索引模型
+按内容哈希（SHA-256）去重存储，引用计数归零时才删除磁盘文件
+"""
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime
+from sqlalchemy.sql import func
+from app.database import Base
+
+
+class StoredFile(Base):
+    """内容寻址的上传文件"""
+    __tablename__ = "stored_files"
+
+    id = Column(Integer, primary_key=True, index=True)
+    sha256 = Column(String(64), unique=True, nullable=False, index=True)  # 文件内容哈希
+    path = Column(String, unique=True, nullable=False)  # 相对 uploads 目录的路径
+    size = Column(BigInteger, nullable=False)  # 文件大小（字节）
+    content_type = Column(String)  # 上传时声明的MIME类型
+    ref_count = Column(Integer, default=1, nullable=False)  # 引用次数
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+    def __repr__(self):
+        return f"<StoredFile(id={self.id}, sha256='{self.sha256[:12]}', ref_count={self.ref_count})>"
@@ -0,0 +1,27 @@
+"""
+令牌吊销记录模型
+注销、刷新令牌轮换、封禁/改密时写入，各进程定期增量同步到内存中的吊销集合
+"""
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, UniqueConstraint
+from app.database import Base
+
+
+class TokenRevocation(Base):
+    """令牌吊销记录"""
+    __tablename__ = "token_revocations"
+    __table_args__ = (
+        UniqueConstraint("kind", "value", name="uq_token_revocations_kind_value"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)  # 自增ID，各进程按ID增量同步
+    kind = Column(String(16), nullable=False)  # token: 单个令牌(jti) / session: 整个登录会话(sid) / user: 用户全部令牌
+    value = Column(String(64), nullable=False)  # jti / sid；user 类型为随机值，按 not_before 生效
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
+    not_before = Column(DateTime(timezone=True))  # user 类型：早于该时间签发的令牌全部失效
+
+    # 所有可能受影响的令牌都已过期后即可清理
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+    created_at = Column(DateTime(timezone=True), nullable=False)
+
+    def __repr__(self):
+        return f"<TokenRevocation(kind='{self.kind}', value='{self.value}')>"
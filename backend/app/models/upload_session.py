@@ -0,0 +1,60 @@
+"""
+视频分片上传会话模型
+上传状态保存在数据库中，任何worker都可以接收任意分片
+"""
+from sqlalchemy import Column, Integer, BigInteger, String, Text, DateTime, Enum, ForeignKey, UniqueConstraint
+from sqlalchemy.orm import relationship
+from sqlalchemy.sql import func
+from app.database import Base
+from app.core.enums_v2 import UploadSessionStatus
+
+
+class UploadSession(Base):
+    """分片上传会话"""
+    __tablename__ = "upload_sessions"
+
+    id = Column(String(32), primary_key=True)  # 上传ID（uuid hex）
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    lesson_id = Column(Integer, ForeignKey("lessons.id"))  # 上传对应的课时
+
+    filename = Column(String, nullable=False)  # 原始文件名
+    content_type = Column(String)
+    total_size = Column(BigInteger, nullable=False)  # 文件总大小（字节）
+    chunk_size = Column(Integer, nullable=False)  # 分片大小（最后一片可以更小）
+    total_chunks = Column(Integer, nullable=False)
+    sha256 = Column(String(64))  # 客户端声明的整体哈希（可选，合并后校验）
+
+    status = Column(Enum(UploadSessionStatus), default=UploadSessionStatus.UPLOADING, nullable=False)
+    error_message = Column(Text)
+    stored_path = Column(String)  # 合并完成后的文件路径（相对 uploads 目录）
+
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+    # 关系
+    chunks = relationship("UploadChunk", back_populates="session", cascade="all, delete-orphan")
+
+    def __repr__(self):
+        return f"<UploadSession(id='{self.id}', status='{self.status}', chunks={self.total_chunks})>"
+
+
+class UploadChunk(Base):
+    """已接收的分片（每片一行，并行上传时互不争用会话行）"""
+    __tablename__ = "upload_chunks"
+    __table_args__ = (
+        UniqueConstraint("session_id", "chunk_index", name="uq_upload_chunks_session_index"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    session_id = Column(String(32), ForeignKey("upload_sessions.id", ondelete="CASCADE"), nullable=False)
+    chunk_index = Column(Integer, nullable=False)  # 分片序号（从0开始）
+    size = Column(Integer, nullable=False)
+    sha256 = Column(String(64), nullable=False)
+    received_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    # 关系
+    session = relationship("UploadSession", back_populates="chunks")
+
+    def __repr__(self):
+        return f"<UploadChunk(session_id='{self.session_id}', index={self.chunk_index})>"
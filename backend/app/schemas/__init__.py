@@ -9,7 +9,8 @@ from .user import (
 from .course import (
     Course, CourseCreate, CourseUpdate, CourseBase,
     Lesson, LessonCreate, LessonUpdate, LessonBase,
-    Enrollment, EnrollmentCreate, WatchRecord, WatchRecordCreate, WatchRecordUpdate
+    Enrollment, EnrollmentCreate, WatchRecord, WatchRecordCreate, WatchRecordUpdate,
+    VideoUploadInit, VideoUploadSession
 )
 from .expert import Expert, ExpertCreate, ExpertUpdate, ExpertBase
 from .consultation import Consultation, ConsultationCreate, ConsultationUpdate, ConsultationBase
@@ -24,6 +25,7 @@ __all__ = [
     "Course", "CourseCreate", "CourseUpdate", "CourseBase",
     "Lesson", "LessonCreate", "LessonUpdate", "LessonBase",
     "Enrollment", "EnrollmentCreate", "WatchRecord", "WatchRecordCreate", "WatchRecordUpdate",
+    "VideoUploadInit", "VideoUploadSession",
     "Expert", "ExpertCreate", "ExpertUpdate", "ExpertBase", 
     "Consultation", "ConsultationCreate", "ConsultationUpdate", "ConsultationBase",
     "Product", "ProductCreate", "ProductUpdate", "ProductBase", "ProductSubmitRequest", "ProductAuditRequest",
@@ -2,7 +2,7 @@
 购物车Schema定义
 """
 from pydantic import BaseModel, Field
-from typing import Optional, List
+from typing import Optional, List, Literal
 from datetime import datetime
 from decimal import Decimal
 
@@ -18,6 +18,18 @@ class CartItemUpdate(BaseModel):
     quantity: int = Field(ge=0)  # 0表示删除
 
 
+class CartSyncItem(BaseModel):
+    """批量同步的购物车项"""
+    product_id: int
+    quantity: int  # replace: 目标数量（0表示删除）；delta: 增减的数量
+
+
+class CartSync(BaseModel):
+    """批量同步购物车"""
+    items: List[CartSyncItem] = Field(default_factory=list, max_length=200)
+    mode: Literal["replace", "delta"] = "replace"  # replace: 完整的目标购物车；delta: 在现有数量上增减
+
+
 class CartItemResponse(BaseModel):
     """购物车项响应"""
     id: int
@@ -4,7 +4,7 @@
 from pydantic import BaseModel
 from typing import Optional, List
 from datetime import datetime
-from app.core.enums_v2 import CourseCategory, VideoStatus
+from app.core.enums_v2 import CourseCategory, VideoStatus, UploadSessionStatus
 
 class CourseBase(BaseModel):
     title: str
@@ -120,4 +120,33 @@ class WatchRecord(WatchRecordBase):
     updated_at: Optional[datetime] = None
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+
+class VideoUploadInit(BaseModel):
+    """创建视频分片上传会话"""
+    course_id: int
+    title: str
+    description: Optional[str] = None
+    order: int
+    is_free: bool = False
+    filename: str
+    total_size: int  # 文件总大小（字节）
+    chunk_size: Optional[int] = None  # 不指定时使用服务端默认分片大小
+    sha256: Optional[str] = None  # 整个文件的SHA-256，完成上传时校验
+    content_type: Optional[str] = None
+
+class VideoUploadSession(BaseModel):
+    """视频分片上传会话状态"""
+    upload_id: str
+    lesson_id: Optional[int] = None
+    filename: str
+    total_size: int
+    chunk_size: int
+    total_chunks: int
+    status: UploadSessionStatus
+    received_chunks: List[int] = []
+    missing_chunks: List[int] = []
+    video_url: Optional[str] = None
+    error_message: Optional[str] = None
+    expires_at: datetime
@@ -159,10 +159,14 @@ class UserListItem(BaseModel):
 # 令牌
 class Token(BaseModel):
     access_token: str
+    refresh_token: Optional[str] = None
     token_type: str
     expires_in: int
     user: User
 
+class TokenRefresh(BaseModel):
+    refresh_token: str
+
 class TokenData(BaseModel):
     email: Optional[str] = None
     user_id: Optional[int] = None
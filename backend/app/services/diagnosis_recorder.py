@@ -0,0 +1,209 @@
+"""
+诊断记录后台批量写入（write-behind）
+
+诊断接口只把记录放进内存队列就返回，不等待数据库：
+- 后台协程攒够 batch_size 条或每隔 flush_interval 写入一次，一批只用一次 INSERT（executemany）
+- enqueue 线程安全，可在事件循环或线程池（批量诊断的同步生成器）中调用
+- 登录用户在诊断时只记录 token 中的邮箱，写入时按批一次查询换成 user_id
+- 队列超过 max_pending 时丢弃新记录并计数，数据库故障不会拖慢诊断接口或耗尽内存
+- 写入失败的批次放回队首重试，超过 MAX_ATTEMPTS 次后丢弃
+- 关闭时先写完队列中的全部记录再退出
+"""
+import asyncio
+import logging
+import threading
+import uuid
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, List, Optional
+
+from sqlalchemy import insert, select
+
+from app.database import AsyncSessionLocal
+from app.models.diagnosis_record import DiagnosisRecord
+from app.models.user import User
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 3
+STOP_TIMEOUT = 30  # 关闭时等待队列写完的最长时间（秒）
+
+
+def new_record_id() -> str:
+    return uuid.uuid4().hex
+
+
+def utc_now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class DiagnosisRecorder:
+    """诊断记录写入队列"""
+
+    def __init__(self, batch_size: int = 200, flush_interval_ms: float = 500, max_pending: int = 20000):
+        self.batch_size = max(int(batch_size), 1)
+        self.flush_interval = max(flush_interval_ms, 1) / 1000
+        self.max_pending = max(int(max_pending), self.batch_size)
+
+        self._pending: Deque[Dict[str, Any]] = deque()
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+        # 运行统计
+        self.written = 0
+        self.dropped = 0
+        self.failed_batches = 0
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def enqueue(self, record: Dict[str, Any]) -> bool:
+        """
+        加入一条待写入记录（不阻塞），队列已满时丢弃并返回 False
+
+        record 的键与 DiagnosisRecord 的列一致，另可带 user_email（写入时换成 user_id）
+        """
+        with self._lock:
+            if len(self._pending) >= self.max_pending:
+                self.dropped += 1
+                return False
+            self._pending.append({"attempts": 0, "row": record})
+            size = len(self._pending)
+
+        if size >= self.batch_size:
+            self._wake()
+        return True
+
+    def _wake(self):
+        loop, wakeup = self._loop, self._wakeup
+        if loop is None or wakeup is None or loop.is_closed():
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            wakeup.set()
+        else:
+            loop.call_soon_threadsafe(wakeup.set)
+
+    def start(self):
+        """在事件循环中启动后台写入协程"""
+        if self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._task = self._loop.create_task(self._run())
+
+    async def stop(self):
+        """写完队列中的全部记录后停止后台协程"""
+        if self._task is None:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        try:
+            await asyncio.wait_for(asyncio.shield(self._task), timeout=STOP_TIMEOUT)
+        except asyncio.TimeoutError:
+            self._task.cancel()
+            logger.error(f"诊断记录写入超时，{self.pending} 条记录未写入")
+        self._task = None
+        self._loop = None
+        self._wakeup = None
+
+    async def _run(self):
+        while True:
+            if not self._stopping:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+            self._wakeup.clear()
+
+            # 一次唤醒写完当前队列；某批失败时等下一个周期再重试
+            while self._pending:
+                if not await self._flush_batch():
+                    break
+
+            # 关闭时不再等待刷新间隔，失败的批次重试 MAX_ATTEMPTS 次后被丢弃，循环必然结束
+            if self._stopping and not self._pending:
+                return
+
+    def _take_batch(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            count = min(self.batch_size, len(self._pending))
+            return [self._pending.popleft() for _ in range(count)]
+
+    def _requeue(self, batch: List[Dict[str, Any]]):
+        with self._lock:
+            for entry in reversed(batch):
+                entry["attempts"] += 1
+                if entry["attempts"] < MAX_ATTEMPTS:
+                    self._pending.appendleft(entry)
+                else:
+                    self.dropped += 1
+
+    async def _flush_batch(self) -> bool:
+        batch = self._take_batch()
+        if not batch:
+            return True
+        try:
+            await self._write([entry["row"] for entry in batch])
+        except Exception as e:
+            self.failed_batches += 1
+            logger.error(f"诊断记录批量写入失败（{len(batch)} 条）: {e}")
+            self._requeue(batch)
+            return False
+        self.written += len(batch)
+        return True
+
+    async def _write(self, records: List[Dict[str, Any]]):
+        async with AsyncSessionLocal() as db:
+            emails = {record["user_email"] for record in records if record.get("user_email")}
+            user_ids = {}
+            if emails:
+                result = await db.execute(select(User.email, User.id).where(User.email.in_(emails)))
+                user_ids = dict(result.all())
+
+            rows = []
+            for record in records:
+                row = {key: value for key, value in record.items() if key != "user_email"}
+                row.setdefault("user_id", user_ids.get(record.get("user_email")))
+                rows.append(row)
+
+            await db.execute(insert(DiagnosisRecord), rows)
+            await db.commit()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "pending": self.pending,
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed_batches": self.failed_batches
+        }
+
+
+# 全局单例（诊断接口和应用启动/关闭事件共用）
+diagnosis_recorder: Optional[DiagnosisRecorder] = None
+
+
+def init_diagnosis_recorder(batch_size: int, flush_interval_ms: float, max_pending: int) -> DiagnosisRecorder:
+    """创建全局诊断记录写入队列"""
+    global diagnosis_recorder
+    diagnosis_recorder = DiagnosisRecorder(
+        batch_size=batch_size,
+        flush_interval_ms=flush_interval_ms,
+        max_pending=max_pending
+    )
+    return diagnosis_recorder
+
+
+def record_diagnosis(record: Dict[str, Any]) -> bool:
+    """记录一次诊断；未开启诊断记录时直接忽略"""
+    if diagnosis_recorder is None:
+        return False
+    return diagnosis_recorder.enqueue(record)
@@ -0,0 +1,186 @@
+"""
+内容寻址的上传文件存储
+
+文件按 SHA-256 存放在 uploads/<分类>/<哈希前两位>/<哈希><扩展名>，
+stored_files 表记录 哈希 -> 路径 的索引和引用计数：
+- 相同内容再次上传时直接复用已有文件，只增加引用计数
+- 客户端可先按哈希"秒传"，已有文件时无需再上传内容
+- 删除时引用计数归零才真正删除磁盘文件
+"""
+import logging
+import os
+import uuid
+from typing import Callable, Optional, Sequence, Tuple
+
+from fastapi import UploadFile
+from sqlalchemy import update, delete
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app.core.upload_stream import RollingSignatureScanner, StoredUpload, save_upload_file
+from app.models.stored_file import StoredFile
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_ROOT = "uploads"
+STAGING_DIRECTORY = os.path.join(UPLOAD_ROOT, ".staging")
+
+
+def content_path(category: str, sha256: str, extension: str) -> str:
+    """内容寻址的相对路径（相对 uploads 目录）"""
+    return f"{category}/{sha256[:2]}/{sha256}{extension}"
+
+
+def absolute_path(relative_path: str) -> str:
+    return os.path.join(UPLOAD_ROOT, relative_path)
+
+
+def file_url(relative_path: str) -> str:
+    return f"/uploads/{relative_path}"
+
+
+def find_by_hash(db: Session, sha256: str) -> Optional[StoredFile]:
+    return db.query(StoredFile).filter(StoredFile.sha256 == sha256.lower()).first()
+
+
+def add_reference(db: Session, stored_file: StoredFile) -> Optional[StoredFile]:
+    """
+    引用计数 +1（原子条件更新）
+    返回 None 表示最后一个引用已被并发释放（记录和文件正在删除），不能再复用
+    """
+    referenced = db.execute(
+        update(StoredFile)
+        .where(StoredFile.id == stored_file.id, StoredFile.ref_count > 0)
+        .values(ref_count=StoredFile.ref_count + 1)
+    ).rowcount
+    db.commit()
+    if not referenced:
+        # 记录即将删除，移出会话，之后按相同内容重新登记时不与之冲突
+        db.expunge(stored_file)
+        return None
+    db.refresh(stored_file)
+    return stored_file
+
+
+def register_staged_file(
+    db: Session,
+    upload: StoredUpload,
+    staging_path: str,
+    category: str,
+    extension: str,
+    content_type: Optional[str]
+) -> Tuple[StoredFile, bool]:
+    """
+    把暂存文件登记到内容索引（同步，在线程池中执行）
+    返回: (文件记录, 是否新存储)
+    """
+    sha256 = upload.sha256
+    existing = find_by_hash(db, sha256)
+    # 先加引用再处理暂存文件：引用失败说明已有文件正被删除，按新内容登记
+    if existing is not None and add_reference(db, existing) is not None:
+        target = absolute_path(existing.path)
+        if os.path.exists(target):
+            os.remove(staging_path)
+        else:
+            # 索引存在但磁盘文件丢失：用本次上传的内容补回
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(staging_path, target)
+        return existing, False
+
+    relative_path = content_path(category, sha256, extension)
+    target = absolute_path(relative_path)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    os.replace(staging_path, target)
+
+    record = StoredFile(
+        sha256=sha256,
+        path=relative_path,
+        size=upload.size,
+        content_type=content_type,
+        ref_count=1
+    )
+    db.add(record)
+    try:
+        db.commit()
+    except IntegrityError:
+        # 并发上传了相同内容，对方已先登记
+        db.rollback()
+        existing = find_by_hash(db, sha256)
+        if existing is None or add_reference(db, existing) is None:
+            raise
+        if existing.path != relative_path and os.path.exists(target):
+            os.remove(target)
+        return existing, False
+
+    db.refresh(record)
+    return record, True
+
+
+async def store_upload(
+    db: Session,
+    file: UploadFile,
+    category: str,
+    max_size: int,
+    head_check: Optional[Callable[[bytes], None]] = None,
+    scanner: Optional[RollingSignatureScanner] = None,
+    extra_hashes: Sequence[str] = (),
+) -> Tuple[StoredFile, StoredUpload, bool]:
+    """
+    流式保存上传文件并按内容去重
+
+    category: 存储分类目录（images / videos / documents / general）
+    返回: (文件记录, 本次上传信息, 是否新存储)
+    """
+    extension = os.path.splitext(file.filename or "")[1].lower()
+    staging_path = os.path.join(STAGING_DIRECTORY, f"{uuid.uuid4().hex}{extension}")
+
+    upload = await save_upload_file(
+        file,
+        staging_path,
+        max_size,
+        head_check=head_check,
+        scanner=scanner,
+        hash_names=("sha256", *extra_hashes)
+    )
+    try:
+        record, created = await run_in_threadpool(
+            register_staged_file, db, upload, staging_path, category, extension, file.content_type
+        )
+    except BaseException:
+        if os.path.exists(staging_path):
+            os.remove(staging_path)
+        raise
+
+    if not created:
+        logger.info(f"上传文件命中已有内容: {record.path} (引用 {record.ref_count})")
+    return record, upload, created
+
+
+def release(db: Session, relative_path: str) -> Optional[bool]:
+    """
+    释放一次文件引用
+
+    返回: None - 文件不在内容索引中（旧文件，由调用方自行处理）
+          False - 仍有其他引用，保留文件
+          True - 最后一个引用已释放，文件已删除
+    """
+    record = db.query(StoredFile).filter(StoredFile.path == relative_path).first()
+    if record is None:
+        return None
+
+    db.execute(
+        update(StoredFile)
+        .where(StoredFile.id == record.id, StoredFile.ref_count > 0)
+        .values(ref_count=StoredFile.ref_count - 1)
+    )
+    deleted = db.execute(
+        delete(StoredFile).where(StoredFile.id == record.id, StoredFile.ref_count <= 0)
+    ).rowcount
+    if deleted:
+        # 在提交前删除磁盘文件：并发的 add_reference 等到提交后才失败，再重新写入的文件不会被这里删掉
+        path = absolute_path(relative_path)
+        if os.path.exists(path):
+            os.remove(path)
+    db.commit()
+    return bool(deleted)
@@ -0,0 +1,282 @@
+"""
+库存预占
+
+下单原本逐个商品查询两次，再在 Python 中 stock_quantity -= qty，并发下单时会超卖：
+- 一次 SELECT ... WHERE id IN (...) 取出全部商品（非 SQLite 数据库加 FOR UPDATE，按ID顺序加锁避免死锁）
+- 每个商品一条条件更新 stock_quantity = stock_quantity - :q WHERE stock_quantity >= :q，
+  影响行数为 0 即库存不足，整个事务回滚；扣减在数据库中原子完成，不依赖读到的库存值
+- 扣减成功后按订单写入预占记录（有效期 INVENTORY_RESERVATION_TTL_MINUTES），支付后确认，
+  取消订单或超时未支付时释放并归还库存
+- 释放时先把预占记录从 reserved 条件更新为 released，并发的取消和超时释放只有一方会归还库存
+- 微信预支付单的失效时间与预占过期时间一致（payment_deadline），订单超时取消后不会再被支付
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import case, exists, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app import models
+from app.core.config import settings
+from app.core.enums_v2 import OrderStatus, ProductStatus
+from app.core.exceptions import CommonErrors, ValidationException
+from app.models.inventory_reservation import InventoryReservation
+
+RESERVED = "reserved"
+COMMITTED = "committed"
+RELEASED = "released"
+
+
+def _utc_now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def merge_quantities(items: Iterable) -> Dict[int, int]:
+    """合并同一商品的多个条目，返回 product_id -> 数量"""
+    quantities: Dict[int, int] = {}
+    for item in items:
+        if item.quantity is None or item.quantity <= 0:
+            raise ValidationException("商品数量必须大于0")
+        quantities[item.product_id] = quantities.get(item.product_id, 0) + item.quantity
+    return quantities
+
+
+def reserve_stock(db: Session, quantities: Dict[int, int]) -> Dict[int, models.Product]:
+    """
+    在当前事务中扣减库存，返回 product_id -> 商品（不提交事务）
+    商品不存在或未上架抛出 PRODUCT_NOT_FOUND，任一商品库存不足时回滚事务并抛出 INSUFFICIENT_STOCK
+    """
+    product_ids = sorted(quantities)
+    query = (
+        select(models.Product)
+        .where(models.Product.id.in_(product_ids), models.Product.status == ProductStatus.ACTIVE)
+        .order_by(models.Product.id)
+    )
+    if db.get_bind().dialect.name != "sqlite":
+        query = query.with_for_update()
+    products = {product.id: product for product in db.scalars(query)}
+
+    if len(products) != len(product_ids):
+        db.rollback()
+        raise CommonErrors.PRODUCT_NOT_FOUND
+    # 读到的库存已经不足时直接失败，不再发起更新
+    if any((products[product_id].stock_quantity or 0) < quantities[product_id] for product_id in product_ids):
+        db.rollback()
+        raise CommonErrors.INSUFFICIENT_STOCK
+
+    for product_id in product_ids:
+        quantity = quantities[product_id]
+        result = db.execute(
+            update(models.Product)
+            .where(models.Product.id == product_id, models.Product.stock_quantity >= quantity)
+            .values(stock_quantity=models.Product.stock_quantity - quantity)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount != 1:
+            db.rollback()
+            raise CommonErrors.INSUFFICIENT_STOCK
+
+    for product in products.values():
+        db.expire(product, ["stock_quantity"])
+    return products
+
+
+def add_reservations(
+    db: Session,
+    order_id: int,
+    quantities: Dict[int, int],
+    ttl_minutes: Optional[int] = None
+) -> datetime:
+    """为已扣减的库存写入预占记录（不提交事务），返回过期时间"""
+    now = _utc_now()
+    ttl = settings.INVENTORY_RESERVATION_TTL_MINUTES if ttl_minutes is None else ttl_minutes
+    expires_at = now + timedelta(minutes=ttl)
+    db.add_all([
+        InventoryReservation(
+            order_id=order_id, product_id=product_id, quantity=quantity,
+            status=RESERVED, expires_at=expires_at, created_at=now
+        )
+        for product_id, quantity in quantities.items()
+    ])
+    return expires_at
+
+
+def payment_deadline(db: Session, order: models.Order) -> datetime:
+    """
+    订单的支付截止时间（UTC），即库存预占的过期时间；没有预占记录的旧订单为创建时间加预占有效期
+    微信预支付单以此为失效时间，截止后未支付的订单由清理任务取消
+    """
+    expires_at = db.scalar(
+        select(func.min(InventoryReservation.expires_at)).where(InventoryReservation.order_id == order.id)
+    )
+    if expires_at is None:
+        expires_at = (order.created_at or _utc_now()) + timedelta(minutes=settings.INVENTORY_RESERVATION_TTL_MINUTES)
+    # SQLite 读出的时间不带时区，按 UTC 处理
+    if expires_at.tzinfo is None:
+        expires_at = expires_at.replace(tzinfo=timezone.utc)
+    return expires_at
+
+
+def _commit_statement(order_id: int):
+    return (
+        update(InventoryReservation)
+        .where(InventoryReservation.order_id == order_id, InventoryReservation.status == RESERVED)
+        .values(status=COMMITTED)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def commit_reservations(db: Session, order_id: int):
+    """订单支付后确认预占，之后不再超时释放（不提交事务）"""
+    db.execute(_commit_statement(order_id))
+
+
+async def commit_reservations_async(db: AsyncSession, order_id: int):
+    await db.execute(_commit_statement(order_id))
+
+
+def _restore_stock(db: Session, quantities: Dict[int, int]):
+    """一条 UPDATE ... CASE 批量归还多个商品的库存"""
+    if not quantities:
+        return
+    db.execute(
+        update(models.Product)
+        .where(models.Product.id.in_(list(quantities)))
+        .values(stock_quantity=models.Product.stock_quantity + case(quantities, value=models.Product.id))
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _release_where(db: Session, *criteria) -> Dict[int, int]:
+    """
+    把满足条件且仍为 reserved 的预占改为 released 并归还库存，返回 product_id -> 归还数量
+    以本次写入的 released_at 识别本次释放的记录，并发释放的记录不会被重复归还
+    """
+    now = _utc_now()
+    result = db.execute(
+        update(InventoryReservation)
+        .where(*criteria, InventoryReservation.status == RESERVED)
+        .values(status=RELEASED, released_at=now)
+        .execution_options(synchronize_session=False)
+    )
+    if not result.rowcount:
+        return {}
+    quantities = dict(db.execute(
+        select(InventoryReservation.product_id, func.sum(InventoryReservation.quantity))
+        .where(*criteria, InventoryReservation.status == RELEASED, InventoryReservation.released_at == now)
+        .group_by(InventoryReservation.product_id)
+    ).all())
+    _restore_stock(db, quantities)
+    return quantities
+
+
+def release_reservations(db: Session, order_id: int, fallback_items: Optional[Iterable] = None) -> int:
+    """
+    释放订单的库存预占并归还库存（不提交事务），返回归还的商品件数
+    没有预占记录的旧订单按 fallback_items（订单明细）归还
+    """
+    has_reservations = db.scalar(
+        select(InventoryReservation.id).where(InventoryReservation.order_id == order_id).limit(1)
+    ) is not None
+    if has_reservations:
+        return sum(_release_where(db, InventoryReservation.order_id == order_id).values())
+
+    quantities: Dict[int, int] = {}
+    for item in fallback_items or []:
+        quantities[item.product_id] = quantities.get(item.product_id, 0) + item.quantity
+    _restore_stock(db, quantities)
+    return sum(quantities.values())
+
+
+def release_expired_reservations(db: Session, now: Optional[datetime] = None, limit: int = 200) -> Dict[str, int]:
+    """
+    处理一批超时的预占（按 (status, expires_at) 索引范围扫描）并提交：
+    订单仍为待支付时取消订单，已取消订单的预占释放并批量归还库存，其余状态视为已支付，确认预占
+    返回本批统计，reservations 为 0 表示没有待处理的记录
+    """
+    now = now or _utc_now()
+    query = (
+        select(InventoryReservation.id, InventoryReservation.order_id)
+        .where(InventoryReservation.status == RESERVED, InventoryReservation.expires_at <= now)
+        .order_by(InventoryReservation.expires_at)
+        .limit(limit)
+    )
+    if db.get_bind().dialect.name != "sqlite":
+        # 多个清理进程（或选主切换期间）各取不同的行
+        query = query.with_for_update(skip_locked=True)
+    rows = db.execute(query).all()
+    stats = {"reservations": len(rows), "orders_cancelled": 0, "released": 0, "committed": 0, "units_restored": 0}
+    if not rows:
+        db.rollback()
+        return stats
+
+    order_ids = {row.order_id for row in rows}
+    stats["orders_cancelled"] = db.execute(
+        update(models.Order)
+        .where(models.Order.id.in_(order_ids), models.Order.status == OrderStatus.PENDING)
+        .values(status=OrderStatus.CANCELLED)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    cancelled_ids = set(db.scalars(
+        select(models.Order.id).where(models.Order.id.in_(order_ids), models.Order.status == OrderStatus.CANCELLED)
+    ))
+
+    release_ids = [row.id for row in rows if row.order_id in cancelled_ids]
+    commit_ids = [row.id for row in rows if row.order_id not in cancelled_ids]
+    if release_ids:
+        restored = _release_where(db, InventoryReservation.id.in_(release_ids))
+        stats["released"] = len(release_ids)
+        stats["units_restored"] = sum(restored.values())
+    if commit_ids:
+        stats["committed"] = db.execute(
+            update(InventoryReservation)
+            .where(InventoryReservation.id.in_(commit_ids), InventoryReservation.status == RESERVED)
+            .values(status=COMMITTED)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+    db.commit()
+    return stats
+
+
+def cancel_stale_orders(db: Session, cutoff: datetime, limit: int = 200) -> Dict[str, int]:
+    """
+    取消一批创建时间早于 cutoff 仍未支付、且没有预占记录的旧订单（按 (status, created_at) 索引范围扫描），
+    按订单明细批量归还库存并提交；有预占记录的订单由 release_expired_reservations 处理
+    """
+    order_ids = db.scalars(
+        select(models.Order.id)
+        .where(
+            models.Order.status == OrderStatus.PENDING,
+            models.Order.created_at <= cutoff,
+            ~exists().where(InventoryReservation.order_id == models.Order.id)
+        )
+        .order_by(models.Order.created_at)
+        .limit(limit)
+    ).all()
+    stats = {"orders": len(order_ids), "orders_cancelled": 0, "units_restored": 0}
+    if not order_ids:
+        db.rollback()
+        return stats
+
+    # 逐个条件更新，只归还本次成功取消的订单（并发的 cancel_order 已自行归还）
+    cancelled_ids = [
+        order_id for order_id in order_ids
+        if db.execute(
+            update(models.Order)
+            .where(models.Order.id == order_id, models.Order.status == OrderStatus.PENDING)
+            .values(status=OrderStatus.CANCELLED)
+            .execution_options(synchronize_session=False)
+        ).rowcount == 1
+    ]
+    if cancelled_ids:
+        quantities = dict(db.execute(
+            select(models.OrderItem.product_id, func.sum(models.OrderItem.quantity))
+            .where(models.OrderItem.order_id.in_(cancelled_ids))
+            .group_by(models.OrderItem.product_id)
+        ).all())
+        _restore_stock(db, quantities)
+        stats["orders_cancelled"] = len(cancelled_ids)
+        stats["units_restored"] = sum(quantities.values())
+    db.commit()
+    return stats
@@ -0,0 +1,265 @@
+"""
+订单过期清理
+
+预订单（draft_orders）过期后没有任何地方删除，未支付订单不取消就一直占着库存：
+- 后台协程每隔 ORDER_SWEEP_INTERVAL_SECONDS 运行一轮，每轮分批处理：
+  过期预订单按 expires_at 索引批量删除；超时的库存预占按 (status, expires_at) 索引取出，
+  待支付订单取消并一条 UPDATE ... CASE 批量归还库存；没有预占记录的旧订单按 (status, created_at) 索引处理
+- 微信预支付单与预占同时失效，订单在到期后再等 ORDER_PAYMENT_GRACE_SECONDS 才取消，
+  到期前完成的支付其回调晚到也能把订单置为已支付
+- 多进程部署时只有持有数据库锁的进程执行清理（PostgreSQL pg_try_advisory_lock / MySQL GET_LOCK，
+  锁绑定在一条专用连接上，进程退出或连接断开即释放，其他进程下一轮接管）；SQLite 只支持单进程，直接执行
+- 数据库操作在线程池中执行，不阻塞事件循环
+- 也可以关闭 ORDER_SWEEPER_ENABLED，单独运行清理进程: python -m app.services.order_sweeper
+"""
+import asyncio
+import logging
+import signal
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+
+from sqlalchemy import delete, select, text
+
+from app.core.config import settings
+from app.database import SessionLocal, engine
+from app.models.draft_order import DraftOrder
+from app.services import inventory_service
+
+logger = logging.getLogger(__name__)
+
+
+class LeaderLock:
+    """基于数据库会话级锁的选主，锁连接在持有期间不归还连接池"""
+
+    def __init__(self, key: int):
+        self.key = key
+        self.dialect = engine.dialect.name
+        self._connection = None
+
+    @property
+    def held(self) -> bool:
+        return self._connection is not None or self.dialect not in ("postgresql", "mysql")
+
+    def acquire(self) -> bool:
+        """尝试成为主节点（不等待）；已持有时检查锁连接是否仍然可用"""
+        if self.dialect not in ("postgresql", "mysql"):
+            return True
+        if self._connection is not None:
+            try:
+                self._connection.execute(text("SELECT 1"))
+                self._connection.commit()
+                return True
+            except Exception as e:
+                logger.warning(f"订单清理选主连接失效，放弃主节点: {e}")
+                self._discard()
+
+        connection = engine.connect()
+        try:
+            if self.dialect == "postgresql":
+                acquired = connection.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": self.key}).scalar()
+            else:
+                acquired = connection.execute(text("SELECT GET_LOCK(:name, 0)"), {"name": f"order_sweeper_{self.key}"}).scalar()
+            connection.commit()
+        except Exception:
+            connection.close()
+            raise
+        if not acquired:
+            connection.close()
+            return False
+        self._connection = connection
+        return True
+
+    def release(self):
+        if self._connection is None:
+            return
+        try:
+            if self.dialect == "postgresql":
+                self._connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": self.key})
+            else:
+                self._connection.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": f"order_sweeper_{self.key}"})
+            self._connection.commit()
+        except Exception as e:
+            logger.warning(f"释放订单清理锁失败: {e}")
+        self._discard()
+
+    def _discard(self):
+        try:
+            self._connection.close()
+        except Exception:
+            pass
+        self._connection = None
+
+
+class OrderSweeper:
+    """过期预订单与超时未支付订单清理"""
+
+    def __init__(
+        self,
+        interval_seconds: float = 60,
+        batch_size: int = 200,
+        max_batches: int = 50,
+        order_ttl_minutes: int = 30,
+        payment_grace_seconds: int = 0,
+        lock_key: int = 0
+    ):
+        self.interval = max(interval_seconds, 1)
+        self.batch_size = max(int(batch_size), 1)
+        self.max_batches = max(int(max_batches), 1)
+        self.order_ttl = timedelta(minutes=order_ttl_minutes)
+        self.payment_grace = timedelta(seconds=max(payment_grace_seconds, 0))
+        self.leader = LeaderLock(lock_key)
+
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._stop: Optional[asyncio.Event] = None
+
+        # 运行统计
+        self.metrics: Dict[str, Any] = {
+            "runs": 0,
+            "errors": 0,
+            "drafts_expired": 0,
+            "orders_cancelled": 0,
+            "reservations_released": 0,
+            "reservations_committed": 0,
+            "units_restored": 0,
+            "last_run_at": None,
+            "last_duration_ms": None
+        }
+
+    def _record(self, **counts):
+        with self._lock:
+            for key, value in counts.items():
+                self.metrics[key] += value
+
+    # ===== 清理 =====
+
+    def _expire_drafts(self) -> int:
+        expired = 0
+        for _ in range(self.max_batches):
+            with SessionLocal() as db:
+                # 预订单使用本地时间
+                draft_ids = db.scalars(
+                    select(DraftOrder.id)
+                    .where(DraftOrder.expires_at <= datetime.now())
+                    .order_by(DraftOrder.expires_at)
+                    .limit(self.batch_size)
+                ).all()
+                if draft_ids:
+                    db.execute(delete(DraftOrder).where(DraftOrder.id.in_(draft_ids)))
+                    db.commit()
+            expired += len(draft_ids)
+            if len(draft_ids) < self.batch_size:
+                break
+        return expired
+
+    def _release_reservations(self) -> Dict[str, int]:
+        totals = {"orders_cancelled": 0, "reservations_released": 0, "reservations_committed": 0, "units_restored": 0}
+        for _ in range(self.max_batches):
+            now = datetime.now(timezone.utc) - self.payment_grace
+            with SessionLocal() as db:
+                stats = inventory_service.release_expired_reservations(db, now=now, limit=self.batch_size)
+            totals["orders_cancelled"] += stats["orders_cancelled"]
+            totals["reservations_released"] += stats["released"]
+            totals["reservations_committed"] += stats["committed"]
+            totals["units_restored"] += stats["units_restored"]
+            if stats["reservations"] < self.batch_size:
+                break
+        return totals
+
+    def _cancel_stale_orders(self) -> Dict[str, int]:
+        totals = {"orders_cancelled": 0, "units_restored": 0}
+        for _ in range(self.max_batches):
+            # 订单创建时间为数据库默认的 UTC 时间
+            cutoff = datetime.utcnow() - self.order_ttl - self.payment_grace
+            with SessionLocal() as db:
+                stats = inventory_service.cancel_stale_orders(db, cutoff, limit=self.batch_size)
+            totals["orders_cancelled"] += stats["orders_cancelled"]
+            totals["units_restored"] += stats["units_restored"]
+            if stats["orders"] < self.batch_size:
+                break
+        return totals
+
+    def sweep_once(self) -> Dict[str, int]:
+        """执行一轮清理（同步，不做选主），返回本轮处理数量"""
+        start = time.perf_counter()
+        result = {"drafts_expired": self._expire_drafts()}
+        for key, value in self._release_reservations().items():
+            result[key] = result.get(key, 0) + value
+        for key, value in self._cancel_stale_orders().items():
+            result[key] = result.get(key, 0) + value
+
+        self._record(runs=1, **result)
+        with self._lock:
+            self.metrics["last_run_at"] = datetime.utcnow().isoformat()
+            self.metrics["last_duration_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        if any(result.values()):
+            logger.info(f"订单清理完成: {result}")
+        return result
+
+    def _tick(self):
+        if self.leader.acquire():
+            self.sweep_once()
+
+    # ===== 后台运行 =====
+
+    def start(self):
+        if self._task is not None:
+            return
+        self._stop = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._stop.set()
+        await self._task
+        self._task = None
+        self._stop = None
+        await asyncio.to_thread(self.leader.release)
+
+    async def _run(self):
+        while not self._stop.is_set():
+            try:
+                await asyncio.to_thread(self._tick)
+            except Exception as e:
+                self._record(errors=1)
+                logger.error(f"订单清理失败: {e}")
+            try:
+                await asyncio.wait_for(self._stop.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self.metrics, "is_leader": self.leader.held, "running": self._task is not None}
+
+
+order_sweeper = OrderSweeper(
+    interval_seconds=settings.ORDER_SWEEP_INTERVAL_SECONDS,
+    batch_size=settings.ORDER_SWEEP_BATCH_SIZE,
+    max_batches=settings.ORDER_SWEEP_MAX_BATCHES,
+    order_ttl_minutes=settings.INVENTORY_RESERVATION_TTL_MINUTES,
+    payment_grace_seconds=settings.ORDER_PAYMENT_GRACE_SECONDS,
+    lock_key=settings.ORDER_SWEEP_LOCK_KEY
+)
+
+
+async def run_worker():
+    """独立清理进程：运行到收到 SIGINT/SIGTERM 为止"""
+    stopped = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stopped.set)
+
+    order_sweeper.start()
+    logger.info("订单清理进程已启动")
+    await stopped.wait()
+    await order_sweeper.stop()
+    logger.info(f"订单清理进程已退出: {order_sweeper.stats()}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(run_worker())
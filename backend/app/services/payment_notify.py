@@ -0,0 +1,131 @@
+"""
+微信支付回调处理（幂等）
+
+微信在没收到 SUCCESS 应答时会反复推送同一笔支付，原来的处理先读订单状态再写，重复推送并发到达时会重复处理：
+- XML 解析和验签在线程池中执行，不占用事件循环
+- 每笔支付（transaction_id）在 payment_notifications 表中只记录一次（唯一约束），
+  已处理的回调先查进程内缓存、再按唯一索引查记录，直接应答 SUCCESS
+- 订单状态用条件更新 UPDATE orders SET status='PAID' WHERE id=:id AND status='PENDING'，
+  只有一个回调能把订单置为已支付，并确认该订单的库存预占
+- 回调记录与订单状态在同一事务中提交；并发的重复回调写入记录时违反唯一约束，整个事务回滚后按已处理应答
+"""
+import asyncio
+import logging
+import time
+import xml.etree.ElementTree as ET
+from datetime import datetime, timezone
+from typing import Dict
+
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import models
+from app.core.auth_context import TTLCache
+from app.core.config import settings
+from app.core.enums_v2 import OrderStatus
+from app.core.wechat_pay import get_wechat_pay_service
+from app.models.payment_notification import PaymentNotification
+from app.services.inventory_service import commit_reservations_async
+
+logger = logging.getLogger(__name__)
+
+RESULT_PAID = "paid"
+RESULT_SKIPPED = "skipped"
+
+# 本进程已处理的 transaction_id -> 处理结果
+acknowledged = TTLCache(settings.WECHAT_NOTIFY_CACHE_SIZE)
+
+
+class NotifyError(Exception):
+    """回调无法处理，应答 FAIL 由微信稍后重试"""
+
+
+def parse_and_verify(body: bytes) -> Dict[str, str]:
+    """解析回调 XML 并验证签名（在线程池中调用）"""
+    try:
+        root = ET.fromstring(body)
+    except ET.ParseError:
+        raise NotifyError("XML格式错误")
+    data = {child.tag: child.text for child in root}
+    if not get_wechat_pay_service().verify_notify(data.copy()):
+        raise NotifyError("签名验证失败")
+    return data
+
+
+def _acknowledge(transaction_id: str, result: str) -> str:
+    acknowledged.set(transaction_id, result, time.time() + settings.WECHAT_NOTIFY_CACHE_TTL)
+    return result
+
+
+async def process_notify(db: AsyncSession, body: bytes) -> str:
+    """
+    处理一次支付回调，返回处理结果（paid / skipped / duplicate / failed）
+    需要微信重试时抛出 NotifyError
+    """
+    data = await asyncio.to_thread(parse_and_verify, body)
+
+    if data.get("return_code") != "SUCCESS" or data.get("result_code") != "SUCCESS":
+        logger.error(f"❌ 微信支付失败: {data.get('err_code_des')}")
+        return "failed"
+
+    transaction_id = data.get("transaction_id")
+    order_number = data.get("out_trade_no")
+    if not transaction_id or not order_number:
+        raise NotifyError("缺少支付订单号")
+
+    # 重复推送：进程内缓存，其次按唯一索引查回调记录
+    if acknowledged.get(transaction_id) is not None:
+        return "duplicate"
+    result = await db.scalar(
+        select(PaymentNotification.result).where(PaymentNotification.transaction_id == transaction_id)
+    )
+    if result is not None:
+        _acknowledge(transaction_id, result)
+        return "duplicate"
+
+    order_id = await db.scalar(select(models.Order.id).where(models.Order.order_number == order_number))
+    if order_id is None:
+        raise NotifyError("订单不存在")
+
+    total_fee = data.get("total_fee")
+    notification = PaymentNotification(
+        transaction_id=transaction_id,
+        order_number=order_number,
+        total_fee=int(total_fee) if total_fee and total_fee.isdigit() else None,
+        time_end=data.get("time_end"),
+        result=RESULT_SKIPPED,
+        created_at=datetime.now(timezone.utc)
+    )
+    db.add(notification)
+    try:
+        # 先写入回调记录：并发的重复回调在这里等待或失败，不会再去更新订单
+        await db.flush()
+        paid = (await db.execute(
+            update(models.Order)
+            .where(models.Order.id == order_id, models.Order.status == OrderStatus.PENDING)
+            .values(status=OrderStatus.PAID)
+            .execution_options(synchronize_session=False)
+        )).rowcount == 1
+        if paid:
+            notification.result = RESULT_PAID
+            await commit_reservations_async(db, order_id)
+            status = OrderStatus.PAID
+        else:
+            # 重新读取状态：主动查询或模拟支付可能已先把订单置为已支付
+            status = await db.scalar(select(models.Order.status).where(models.Order.id == order_id))
+            if status == OrderStatus.PAID:
+                notification.result = RESULT_PAID
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        return "duplicate"
+
+    if paid:
+        logger.info(f"✅ 订单支付成功（回调） - 订单号: {order_number}")
+    elif status == OrderStatus.PAID:
+        logger.info(f"订单已支付，回调无需更新 - 订单号: {order_number}")
+    else:
+        # 例如超时已取消的订单又完成了支付，需要人工退款
+        logger.warning(f"⚠️ 订单收到支付回调但状态为 {status.value}，未更新 - 订单号: {order_number}, 支付单号: {transaction_id}")
+    return _acknowledge(transaction_id, notification.result)
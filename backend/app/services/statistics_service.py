@@ -0,0 +1,320 @@
+"""
+平台统计服务
+
+- 每张表一条 GROUP BY + 条件求和（SUM(CASE ...)）的聚合查询，替代逐项 COUNT
+- 统计结果缓存为快照（TTL），订单/用户/商品等写入提交后自动失效
+- 快照缓存在进程内，多worker部署时各自缓存，最长陈旧时间为 TTL
+"""
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import case, event, func, select
+from sqlalchemy.orm import Session
+
+from app import models
+from app.core.config import settings
+from app.core.enums_v2 import (
+    ConsultationStatus, ConsultationType, ExpertCategory, ExpertStatus,
+    OrderStatus, ProductCategory, ProductStatus, UserRole, UserStatus
+)
+
+# 计入收入的订单状态
+REVENUE_STATUSES = (OrderStatus.PAID, OrderStatus.SHIPPED, OrderStatus.DELIVERED)
+
+
+def _count_if(condition):
+    """条件计数：SUM(CASE WHEN condition THEN 1 ELSE 0 END)"""
+    return func.sum(case((condition, 1), else_=0))
+
+
+def _sum_if(condition, column):
+    """条件求和：SUM(CASE WHEN condition THEN column ELSE 0 END)"""
+    return func.sum(case((condition, column), else_=0))
+
+
+def _money(value) -> float:
+    return round(float(value or 0), 2)
+
+
+def compute_platform_statistics(db: Session) -> dict:
+    """从数据库聚合计算平台统计数据"""
+    now = datetime.utcnow()
+    seven_days_ago = now - timedelta(days=7)
+    thirty_days_ago = now - timedelta(days=30)
+
+    # 用户：按角色、状态分组
+    users_by_role = {role: 0 for role in UserRole}
+    total_users = active_users = new_users_week = 0
+    for role, user_status, count, new_week in db.execute(
+        select(
+            models.User.role,
+            models.User.status,
+            func.count(),
+            _count_if(models.User.created_at >= seven_days_ago)
+        ).group_by(models.User.role, models.User.status)
+    ):
+        users_by_role[role] += count
+        total_users += count
+        new_users_week += new_week or 0
+        if user_status == UserStatus.ACTIVE:
+            active_users += count
+
+    # 订单：按状态分组，同时汇总近7天/30天的订单数与收入
+    orders_by_status = {order_status: 0 for order_status in OrderStatus}
+    total_orders = new_orders_week = monthly_orders = 0
+    total_revenue = weekly_revenue = monthly_revenue = 0
+    for order_status, count, amount, week_count, week_amount, month_count, month_amount in db.execute(
+        select(
+            models.Order.status,
+            func.count(),
+            func.sum(models.Order.total_amount),
+            _count_if(models.Order.created_at >= seven_days_ago),
+            _sum_if(models.Order.created_at >= seven_days_ago, models.Order.total_amount),
+            _count_if(models.Order.created_at >= thirty_days_ago),
+            _sum_if(models.Order.created_at >= thirty_days_ago, models.Order.total_amount)
+        ).group_by(models.Order.status)
+    ):
+        # 状态为空的订单只计入总数
+        if order_status is not None:
+            orders_by_status[order_status] = orders_by_status.get(order_status, 0) + count
+        total_orders += count
+        new_orders_week += week_count or 0
+        monthly_orders += month_count or 0
+        if order_status in REVENUE_STATUSES:
+            total_revenue += amount or 0
+            weekly_revenue += week_amount or 0
+            monthly_revenue += month_amount or 0
+
+    # 商品：按分类分组
+    product_category_stats = {category.value: 0 for category in ProductCategory}
+    total_products = active_products = featured_products = 0
+    for category, count, active, featured in db.execute(
+        select(
+            models.Product.category,
+            func.count(),
+            _count_if(models.Product.status == ProductStatus.ACTIVE),
+            _count_if(models.Product.is_featured == True)
+        ).group_by(models.Product.category)
+    ):
+        product_category_stats[category.value] = count
+        total_products += count
+        active_products += active or 0
+        featured_products += featured or 0
+
+    # 专家：按分类分组
+    expert_category_stats = {category.value: 0 for category in ExpertCategory}
+    total_experts = active_experts = verified_experts = 0
+    for category, count, active, verified in db.execute(
+        select(
+            models.Expert.category,
+            func.count(),
+            _count_if(models.Expert.status == ExpertStatus.ACTIVE),
+            _count_if(models.Expert.is_verified == True)
+        ).group_by(models.Expert.category)
+    ):
+        expert_category_stats[category.value] = count
+        total_experts += count
+        active_experts += active or 0
+        verified_experts += verified or 0
+
+    # 咨询：按状态、类型分组
+    total_consultations = pending_consultations = completed_consultations = 0
+    ai_consultations = expert_consultations = 0
+    new_consultations_week = monthly_consultations = 0
+    for consultation_status, consultation_type, count, week_count, month_count in db.execute(
+        select(
+            models.Consultation.status,
+            models.Consultation.type,
+            func.count(),
+            _count_if(models.Consultation.created_at >= seven_days_ago),
+            _count_if(models.Consultation.created_at >= thirty_days_ago)
+        ).group_by(models.Consultation.status, models.Consultation.type)
+    ):
+        total_consultations += count
+        new_consultations_week += week_count or 0
+        monthly_consultations += month_count or 0
+        if consultation_status == ConsultationStatus.PENDING:
+            pending_consultations += count
+        elif consultation_status == ConsultationStatus.COMPLETED:
+            completed_consultations += count
+        if consultation_type == ConsultationType.AI:
+            ai_consultations += count
+        elif consultation_type in (ConsultationType.TEXT, ConsultationType.VOICE, ConsultationType.VIDEO):
+            expert_consultations += count
+
+    # 课程与学习：无需分组，合并为一次查询
+    course_row = db.execute(
+        select(
+            select(func.count()).select_from(models.Course).scalar_subquery(),
+            select(_count_if(models.Course.is_published == True)).scalar_subquery(),
+            select(_count_if(models.Course.is_free == True)).scalar_subquery(),
+            select(_count_if(models.Course.is_free == False)).scalar_subquery(),
+            select(_count_if(models.Course.created_at >= seven_days_ago)).scalar_subquery(),
+            select(func.count()).select_from(models.Lesson).scalar_subquery(),
+            select(func.count()).select_from(models.Enrollment).scalar_subquery(),
+            select(_count_if(models.Enrollment.enrolled_at >= seven_days_ago)).scalar_subquery(),
+            select(func.sum(models.WatchRecord.watch_time)).scalar_subquery(),
+            select(_count_if(models.WatchRecord.is_completed == True)).scalar_subquery()
+        )
+    ).one()
+    (total_courses, published_courses, free_courses, paid_courses, new_courses_week,
+     total_lessons, total_enrollments, new_enrollments_week,
+     total_watch_time, completed_lessons) = (value or 0 for value in course_row)
+
+    vip_users = users_by_role[UserRole.VIP]
+    doctor_users = users_by_role[UserRole.DOCTOR]
+    admin_users = users_by_role[UserRole.ADMIN] + users_by_role[UserRole.SUPER_ADMIN]
+    pending_orders = orders_by_status[OrderStatus.PENDING]
+    completed_orders = orders_by_status[OrderStatus.DELIVERED]
+
+    return {
+        "overview": {
+            "total_users": total_users,
+            "total_experts": total_experts,
+            "total_products": total_products,
+            "total_courses": total_courses,
+            "total_orders": total_orders,
+            "total_consultations": total_consultations,
+            "total_revenue": _money(total_revenue)
+        },
+        "expert_stats": {
+            "total_experts": total_experts,
+            "active_experts": active_experts,
+            "verified_experts": verified_experts,
+            "category_stats": expert_category_stats
+        },
+        "product_stats": {
+            "total_products": total_products,
+            "active_products": active_products,
+            "featured_products": featured_products,
+            "category_stats": product_category_stats
+        },
+        "order_stats": {
+            "total_orders": total_orders,
+            "pending_orders": pending_orders,
+            "completed_orders": completed_orders,
+            "completion_rate": round(completed_orders / max(total_orders, 1) * 100, 2),
+            "total_revenue": _money(total_revenue)
+        },
+        "consultation_stats": {
+            "total_consultations": total_consultations,
+            "pending_consultations": pending_consultations,
+            "completed_consultations": completed_consultations,
+            "ai_consultations": ai_consultations,
+            "expert_consultations": expert_consultations,
+            "completion_rate": round(completed_consultations / max(total_consultations, 1) * 100, 2)
+        },
+        "user_analysis": {
+            "active_users": active_users,
+            "vip_users": vip_users,
+            "doctor_users": doctor_users,
+            "admin_users": admin_users,
+            "user_distribution": {
+                "regular": total_users - vip_users - doctor_users - admin_users,
+                "vip": vip_users,
+                "doctor": doctor_users,
+                "admin": admin_users
+            }
+        },
+        "course_analysis": {
+            "total_courses": total_courses,
+            "published_courses": published_courses,
+            "free_courses": free_courses,
+            "paid_courses": paid_courses,
+            "total_lessons": total_lessons,
+            "total_enrollments": total_enrollments
+        },
+        "recent_activity": {
+            "last_7_days": {
+                "new_users": new_users_week,
+                "new_courses": new_courses_week,
+                "new_enrollments": new_enrollments_week,
+                "new_orders": new_orders_week,
+                "new_consultations": new_consultations_week,
+                "revenue": _money(weekly_revenue)
+            },
+            "last_30_days": {
+                "revenue": _money(monthly_revenue),
+                "orders": monthly_orders,
+                "consultations": monthly_consultations
+            }
+        },
+        "learning_stats": {
+            "total_watch_time_hours": round(total_watch_time / 3600, 2),
+            "completed_lessons": completed_lessons,
+            "avg_completion_rate": round(completed_lessons / max(total_enrollments, 1) * 100, 2)
+        }
+    }
+
+
+class StatisticsCache:
+    """统计快照缓存（TTL + 显式失效）"""
+
+    def __init__(self, ttl_seconds: int = 60):
+        self.ttl_seconds = ttl_seconds
+        self._snapshot: Optional[dict] = None
+        self._expires_at = 0.0
+        self._version = 0
+        self._lock = threading.Lock()
+
+    def get(self, db: Session) -> dict:
+        """获取统计快照，过期或已失效时重新计算"""
+        with self._lock:
+            if self._snapshot is not None and time.monotonic() < self._expires_at:
+                return self._snapshot
+            version = self._version
+
+        snapshot = compute_platform_statistics(db)
+        snapshot["generated_at"] = datetime.utcnow().isoformat()
+
+        with self._lock:
+            # 计算期间发生过写入则不缓存，避免把旧数据放回缓存
+            if version == self._version:
+                self._snapshot = snapshot
+                self._expires_at = time.monotonic() + self.ttl_seconds
+        return snapshot
+
+    def invalidate(self):
+        with self._lock:
+            self._version += 1
+            self._snapshot = None
+
+
+statistics_cache = StatisticsCache(ttl_seconds=settings.ADMIN_STATS_CACHE_TTL)
+
+# 写入后需要让统计快照失效的模型
+_TRACKED_MODELS = (
+    models.User, models.Order, models.Product, models.Expert,
+    models.Course, models.Enrollment, models.Consultation
+)
+_DIRTY_FLAG = "statistics_dirty"
+
+
+@event.listens_for(Session, "after_flush")
+def _mark_statistics_dirty(session, flush_context):
+    if session.info.get(_DIRTY_FLAG):
+        return
+    for instance in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(instance, _TRACKED_MODELS):
+            session.info[_DIRTY_FLAG] = True
+            return
+
+
+@event.listens_for(Session, "after_bulk_update")
+@event.listens_for(Session, "after_bulk_delete")
+def _mark_statistics_dirty_bulk(context):
+    if context.mapper is not None and issubclass(context.mapper.class_, _TRACKED_MODELS):
+        context.session.info[_DIRTY_FLAG] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_statistics(session):
+    if session.info.pop(_DIRTY_FLAG, False):
+        statistics_cache.invalidate()
+
+
+@event.listens_for(Session, "after_rollback")
+def _clear_statistics_flag(session):
+    session.info.pop(_DIRTY_FLAG, None)
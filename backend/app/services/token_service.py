@@ -0,0 +1,133 @@
+"""
+令牌签发、刷新轮换与吊销
+
+- 登录签发一对令牌：访问令牌 + 刷新令牌，同属一个会话（sid）
+- 刷新时旧刷新令牌的 jti 写入吊销表（唯一约束保证同一令牌只能成功刷新一次），签发同会话的新令牌对
+- 已吊销的刷新令牌再次出现视为泄露，吊销整个会话
+- 注销吊销当前会话；封禁、改密吊销该用户此前签发的全部令牌
+- 吊销写库后立即登记到本进程的 revocation_store，其他进程由同步协程加载
+"""
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+
+from sqlalchemy import and_, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app import models
+from app.core.config import settings
+from app.core.exceptions import AuthenticationException
+from app.core.revocation_store import KIND_SESSION, KIND_TOKEN, KIND_USER, revocation_store
+from app.core.security import create_access_token, create_refresh_token, verify_token
+from app.models.token_revocation import TokenRevocation
+
+
+def _utc_now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _refresh_lifetime() -> timedelta:
+    return timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
+
+
+def issue_token_pair(user, session_id: Optional[str] = None) -> Dict:
+    """签发访问令牌和刷新令牌（session_id 为空时开启新会话）"""
+    claims = {"sub": user.email, "user_id": user.id, "sid": session_id or uuid.uuid4().hex}
+    return {
+        "access_token": create_access_token(data=claims),
+        "refresh_token": create_refresh_token(data=claims),
+        "token_type": "bearer",
+        "expires_in": settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60
+    }
+
+
+def _revoke(
+    db: Session,
+    kind: str,
+    value: str,
+    user_id: Optional[int],
+    expires_at: datetime,
+    not_before: Optional[datetime] = None
+) -> bool:
+    """写入一条吊销记录；已存在（并发重复吊销）时返回 False"""
+    now = _utc_now()
+    db.add(TokenRevocation(
+        kind=kind, value=value, user_id=user_id,
+        not_before=not_before, expires_at=expires_at, created_at=now
+    ))
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        return False
+    revocation_store.add(
+        kind, value, user_id,
+        not_before=not_before.timestamp() if not_before else None,
+        expires_at=expires_at.timestamp(),
+        created_at=now.timestamp()
+    )
+    return True
+
+
+def revoke_session(db: Session, session_id: str, user_id: Optional[int] = None) -> bool:
+    """注销一个登录会话（该会话的访问令牌和刷新令牌全部失效）"""
+    return _revoke(db, KIND_SESSION, session_id, user_id, _utc_now() + _refresh_lifetime())
+
+
+def revoke_user_tokens(db: Session, user_id: int) -> bool:
+    """吊销用户此前签发的全部令牌（封禁、修改密码时调用）"""
+    now = _utc_now()
+    return _revoke(db, KIND_USER, uuid.uuid4().hex, user_id, now + _refresh_lifetime(), not_before=now)
+
+
+def revoke_access_token(db: Session, payload: Dict) -> bool:
+    """注销：按访问令牌中的会话ID吊销整个会话（旧版无会话ID的令牌只能等待过期）"""
+    session_id = payload.get("sid")
+    if not session_id:
+        return False
+    return revoke_session(db, session_id, payload.get("user_id"))
+
+
+def _is_refresh_revoked(db: Session, payload: Dict) -> bool:
+    """刷新令牌是否已吊销：布隆过滤器未命中直接放行，命中后查库确认"""
+    if revocation_store.is_user_revoked(payload):
+        return True
+    candidates = []
+    if revocation_store.might_be_revoked(KIND_SESSION, payload["sid"]):
+        candidates.append(and_(TokenRevocation.kind == KIND_SESSION, TokenRevocation.value == payload["sid"]))
+    if revocation_store.might_be_revoked(KIND_TOKEN, payload["jti"]):
+        candidates.append(and_(TokenRevocation.kind == KIND_TOKEN, TokenRevocation.value == payload["jti"]))
+    if not candidates:
+        return False
+    return db.query(TokenRevocation.id).filter(or_(*candidates)).first() is not None
+
+
+def rotate_refresh_token(db: Session, refresh_token: str) -> Dict:
+    """用刷新令牌换取新的令牌对，旧刷新令牌作废"""
+    payload = verify_token(refresh_token)
+    if not payload or payload.get("type") != "refresh" or not payload.get("jti") or not payload.get("sid"):
+        raise AuthenticationException("刷新令牌无效")
+
+    user_id = payload.get("user_id")
+    if _is_refresh_revoked(db, payload):
+        # 已轮换过的刷新令牌被再次使用：可能已泄露，整个会话作废
+        revoke_session(db, payload["sid"], user_id)
+        raise AuthenticationException("刷新令牌已失效，请重新登录")
+
+    user = db.query(models.User).filter(models.User.id == user_id).first()
+    if (
+        user is None
+        or user.email != payload.get("sub")
+        or not user.is_active
+        or user.status in (models.UserStatus.BANNED, models.UserStatus.SUSPENDED)
+    ):
+        raise AuthenticationException("账户不可用，请重新登录")
+
+    # 唯一约束保证并发刷新时只有一个请求成功
+    expires_at = datetime.fromtimestamp(payload["exp"], tz=timezone.utc)
+    if not _revoke(db, KIND_TOKEN, payload["jti"], user_id, expires_at):
+        revoke_session(db, payload["sid"], user_id)
+        raise AuthenticationException("刷新令牌已失效，请重新登录")
+
+    return issue_token_pair(user, session_id=payload["sid"])
@@ -0,0 +1,425 @@
+"""
+视频分片上传（断点续传、并行上传）
+
+流程：
+1. 创建会话：登记文件大小与分片大小，同时创建状态为 UPLOADING 的课时
+2. 上传分片：按序号 PUT，顺序任意、可并行；分片写入 uploads/.chunks/<上传ID>/，
+   每片在 upload_chunks 表中单独一行，并行上传互不争用
+3. 查询进度：返回已接收 / 缺失的分片序号，断线后据此续传
+4. 完成上传：按序合并分片并计算 SHA-256，与声明的哈希比对后登记到内容索引，课时置为 READY
+
+会话状态在数据库中，分片在共享的 uploads 目录下，任意 worker 都可以接收任意分片。
+"""
+import logging
+import math
+import os
+import shutil
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, List, Optional
+
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app import models
+from app.core.config import settings
+from app.core.enums_v2 import UploadSessionStatus, VideoStatus
+from app.core.upload_stream import StoredUpload, UploadRejectedError, save_stream, stream_to_file
+from app.models.upload_session import UploadChunk, UploadSession
+from app.services import file_store
+
+logger = logging.getLogger(__name__)
+
+CHUNK_DIRECTORY = os.path.join(file_store.UPLOAD_ROOT, ".chunks")
+MIN_CHUNK_SIZE = 256 * 1024  # 256KB
+MAX_CHUNK_SIZE = 64 * 1024 * 1024  # 64MB
+MAX_TOTAL_CHUNKS = 10000
+ASSEMBLE_READ_SIZE = 1024 * 1024
+
+
+class UploadSessionError(Exception):
+    """分片上传会话操作失败"""
+
+
+class UploadSessionStateError(UploadSessionError):
+    """会话当前状态不允许该操作"""
+
+
+class UploadSessionExpiredError(UploadSessionError):
+    """会话已过期"""
+
+    def __init__(self):
+        super().__init__("上传会话已过期，请重新创建")
+
+
+class ChunksMissingError(UploadSessionError):
+    """仍有分片未上传"""
+
+    def __init__(self, missing: List[int]):
+        self.missing = missing
+        super().__init__(f"仍有 {len(missing)} 个分片未上传")
+
+
+def chunk_directory(upload_id: str) -> str:
+    return os.path.join(CHUNK_DIRECTORY, upload_id)
+
+
+def chunk_path(upload_id: str, index: int) -> str:
+    return os.path.join(chunk_directory(upload_id), f"{index:06d}.part")
+
+
+def expected_chunk_size(upload_session: UploadSession, index: int) -> int:
+    """第 index 片的应有大小（最后一片可以更小）"""
+    if index < 0 or index >= upload_session.total_chunks:
+        raise UploadSessionError(f"分片序号超出范围: 0 ~ {upload_session.total_chunks - 1}")
+    if index == upload_session.total_chunks - 1:
+        return upload_session.total_size - upload_session.chunk_size * index
+    return upload_session.chunk_size
+
+
+def is_expired(upload_session: UploadSession) -> bool:
+    expires_at = upload_session.expires_at
+    # SQLite 返回不带时区的时间（按UTC存储）
+    now = datetime.now(timezone.utc) if expires_at.tzinfo else datetime.utcnow()
+    return expires_at < now
+
+
+def _remove_chunks(db: Session, upload_id: str):
+    db.execute(delete(UploadChunk).where(UploadChunk.session_id == upload_id))
+    shutil.rmtree(chunk_directory(upload_id), ignore_errors=True)
+
+
+def _refresh_lesson_count(db: Session, course_id: int):
+    course = db.get(models.Course, course_id)
+    if course is not None:
+        course.total_lessons = db.query(models.Lesson).filter(models.Lesson.course_id == course_id).count()
+
+
+def create_session(
+    db: Session,
+    user: models.User,
+    course: models.Course,
+    title: str,
+    description: Optional[str],
+    order: int,
+    is_free: bool,
+    filename: str,
+    total_size: int,
+    chunk_size: int,
+    sha256: Optional[str] = None,
+    content_type: Optional[str] = None
+) -> UploadSession:
+    """
+    创建上传会话及对应课时
+
+    声明了哈希且内容索引中已有相同文件时直接完成（秒传），无需上传分片。
+    """
+    purge_expired_sessions(db)
+
+    lesson = models.Lesson(
+        course_id=course.id,
+        title=title,
+        description=description,
+        order=order,
+        is_free=is_free,
+        status=VideoStatus.UPLOADING
+    )
+    db.add(lesson)
+    db.flush()
+
+    upload_session = UploadSession(
+        id=uuid.uuid4().hex,
+        user_id=user.id,
+        lesson_id=lesson.id,
+        filename=filename,
+        content_type=content_type,
+        total_size=total_size,
+        chunk_size=chunk_size,
+        total_chunks=math.ceil(total_size / chunk_size),
+        sha256=sha256.lower() if sha256 else None,
+        status=UploadSessionStatus.UPLOADING,
+        expires_at=datetime.now(timezone.utc) + timedelta(hours=settings.VIDEO_UPLOAD_SESSION_TTL_HOURS)
+    )
+    db.add(upload_session)
+
+    existing = file_store.find_by_hash(db, upload_session.sha256) if upload_session.sha256 else None
+    if existing is not None and existing.size == total_size and os.path.exists(file_store.absolute_path(existing.path)):
+        referenced = db.execute(
+            update(models.StoredFile)
+            .where(models.StoredFile.id == existing.id, models.StoredFile.ref_count > 0)
+            .values(ref_count=models.StoredFile.ref_count + 1)
+        ).rowcount
+        if referenced:
+            _mark_completed(upload_session, lesson, existing.path)
+            logger.info(f"视频秒传命中已有文件: {existing.path}")
+
+    _refresh_lesson_count(db, course.id)
+    db.commit()
+    db.refresh(upload_session)
+    return upload_session
+
+
+async def receive_chunk(
+    db: AsyncSession,
+    upload_session: UploadSession,
+    index: int,
+    stream: AsyncIterator[bytes],
+    declared_sha256: Optional[str] = None
+) -> UploadChunk:
+    """
+    接收一个分片（可重复上传同一序号，后到的覆盖先到的）
+
+    先写入临时文件，大小与校验和都通过后才原子替换，失败的重传不会破坏已接收的分片。
+    替换前用条件更新确认会话仍在上传中，并持有会话行锁到提交：已开始合并的会话丢弃该分片，
+    合并也不会与替换分片交错。
+    """
+    if upload_session.status != UploadSessionStatus.UPLOADING:
+        raise UploadSessionStateError(f"上传会话状态为 {upload_session.status.value}，不能继续上传分片")
+    if is_expired(upload_session):
+        raise UploadSessionExpiredError()
+
+    expected_size = expected_chunk_size(upload_session, index)
+    final_path = chunk_path(upload_session.id, index)
+    temp_path = f"{final_path}.{uuid.uuid4().hex}"
+
+    upload = await save_stream(stream, temp_path, expected_size)
+    try:
+        if upload.size != expected_size:
+            raise UploadRejectedError(f"分片大小不符：应为 {expected_size} 字节，实际 {upload.size} 字节")
+        if declared_sha256 and declared_sha256.lower() != upload.sha256:
+            raise UploadRejectedError("分片校验失败，请重新上传该分片")
+        active = (await db.execute(
+            update(UploadSession)
+            .where(UploadSession.id == upload_session.id, UploadSession.status == UploadSessionStatus.UPLOADING)
+            .values(updated_at=func.now())
+            .execution_options(synchronize_session=False)
+        )).rowcount
+        if not active:
+            await db.rollback()
+            raise UploadSessionStateError("上传会话已开始合并或已结束，该分片已丢弃")
+        os.replace(temp_path, final_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    values = {"size": upload.size, "sha256": upload.sha256}
+    updated = (await db.execute(
+        update(UploadChunk)
+        .where(UploadChunk.session_id == upload_session.id, UploadChunk.chunk_index == index)
+        .values(**values, received_at=func.now())
+    )).rowcount
+    if updated:
+        await db.commit()
+    else:
+        db.add(UploadChunk(session_id=upload_session.id, chunk_index=index, **values))
+        try:
+            await db.commit()
+        except IntegrityError:
+            # 同一分片被并发重传，另一请求已先登记
+            await db.rollback()
+
+    return UploadChunk(session_id=upload_session.id, chunk_index=index, **values)
+
+
+def received_chunk_indexes(db: Session, upload_session: UploadSession) -> List[int]:
+    return list(db.scalars(
+        select(UploadChunk.chunk_index)
+        .where(UploadChunk.session_id == upload_session.id)
+        .order_by(UploadChunk.chunk_index)
+    ))
+
+
+def missing_chunk_indexes(upload_session: UploadSession, received: List[int]) -> List[int]:
+    received_set = set(received)
+    return [index for index in range(upload_session.total_chunks) if index not in received_set]
+
+
+class _ChunkReader:
+    """按序号依次读取分片文件，对外表现为一个连续的文件对象"""
+
+    def __init__(self, paths: List[str]):
+        self._paths = iter(paths)
+        self._current = None
+
+    def read(self, size: int) -> bytes:
+        while True:
+            if self._current is None:
+                path = next(self._paths, None)
+                if path is None:
+                    return b""
+                self._current = open(path, "rb")
+            data = self._current.read(size)
+            if data:
+                return data
+            self._current.close()
+            self._current = None
+
+    def close(self):
+        if self._current is not None:
+            self._current.close()
+            self._current = None
+
+
+def _assemble(upload_session: UploadSession, staging_path: str) -> StoredUpload:
+    """按序合并分片到暂存文件，同时计算 SHA-256"""
+    paths = [chunk_path(upload_session.id, index) for index in range(upload_session.total_chunks)]
+    missing = [index for index, path in enumerate(paths) if not os.path.exists(path)]
+    if missing:
+        raise ChunksMissingError(missing)
+
+    reader = _ChunkReader(paths)
+    try:
+        upload = stream_to_file(reader, staging_path, upload_session.total_size, chunk_size=ASSEMBLE_READ_SIZE)
+    finally:
+        reader.close()
+
+    if upload.size != upload_session.total_size:
+        os.remove(staging_path)
+        raise UploadRejectedError(f"合并后文件大小不符：应为 {upload_session.total_size} 字节，实际 {upload.size} 字节")
+    if upload_session.sha256 and upload.sha256 != upload_session.sha256:
+        os.remove(staging_path)
+        raise UploadRejectedError("文件校验失败：合并后的SHA-256与声明的不一致")
+    return upload
+
+
+def _mark_completed(upload_session: UploadSession, lesson: Optional[models.Lesson], relative_path: str):
+    upload_session.status = UploadSessionStatus.COMPLETED
+    upload_session.stored_path = relative_path
+    upload_session.error_message = None
+    if lesson is not None:
+        lesson.video_url = file_store.file_url(relative_path)
+        lesson.file_id = os.path.basename(relative_path)
+        lesson.status = VideoStatus.READY  # 本地文件直接标记为就绪
+
+
+def finalize_session(db: Session, upload_session: UploadSession) -> UploadSession:
+    """
+    合并分片并完成上传（同步，耗时与文件大小成正比，应在线程池中执行）
+
+    通过条件更新 UPLOADING -> ASSEMBLING 抢占会话，多个 worker 同时收到完成请求时只有一个执行合并。
+    """
+    if upload_session.status == UploadSessionStatus.COMPLETED:
+        return upload_session
+    if is_expired(upload_session):
+        raise UploadSessionExpiredError()
+
+    missing = missing_chunk_indexes(upload_session, received_chunk_indexes(db, upload_session))
+    if missing:
+        raise ChunksMissingError(missing)
+
+    claimed = db.execute(
+        update(UploadSession)
+        .where(UploadSession.id == upload_session.id, UploadSession.status == UploadSessionStatus.UPLOADING)
+        .values(status=UploadSessionStatus.ASSEMBLING)
+    ).rowcount
+    db.commit()
+    if not claimed:
+        db.refresh(upload_session)
+        raise UploadSessionStateError(f"上传会话状态为 {upload_session.status.value}，不能完成上传")
+
+    db.refresh(upload_session)
+    lesson = db.get(models.Lesson, upload_session.lesson_id) if upload_session.lesson_id else None
+    if lesson is not None:
+        lesson.status = VideoStatus.PROCESSING
+        db.commit()
+
+    extension = os.path.splitext(upload_session.filename)[1].lower()
+    staging_path = os.path.join(file_store.STAGING_DIRECTORY, f"{uuid.uuid4().hex}{extension}")
+    try:
+        upload = _assemble(upload_session, staging_path)
+        record, _ = file_store.register_staged_file(
+            db, upload, staging_path, "videos", extension, upload_session.content_type
+        )
+    except ChunksMissingError as e:
+        # 分片记录存在但文件丢失（例如未共享 uploads 目录），删除记录让客户端重传
+        db.execute(
+            delete(UploadChunk)
+            .where(UploadChunk.session_id == upload_session.id, UploadChunk.chunk_index.in_(e.missing))
+        )
+        _reset_to_uploading(db, upload_session, lesson)
+        raise
+    except UploadRejectedError as e:
+        upload_session.status = UploadSessionStatus.FAILED
+        upload_session.error_message = str(e)
+        if lesson is not None:
+            lesson.status = VideoStatus.ERROR
+        _remove_chunks(db, upload_session.id)
+        db.commit()
+        raise
+    except BaseException:
+        if os.path.exists(staging_path):
+            os.remove(staging_path)
+        db.rollback()
+        _reset_to_uploading(db, upload_session, lesson)
+        raise
+
+    _mark_completed(upload_session, lesson, record.path)
+    _remove_chunks(db, upload_session.id)
+    db.commit()
+    db.refresh(upload_session)
+    logger.info(f"视频分片上传完成: {upload_session.id} -> {record.path}")
+    return upload_session
+
+
+def _reset_to_uploading(db: Session, upload_session: UploadSession, lesson: Optional[models.Lesson]):
+    """合并未完成时回到接收分片状态，允许客户端补传后重试"""
+    upload_session.status = UploadSessionStatus.UPLOADING
+    if lesson is not None:
+        lesson.status = VideoStatus.UPLOADING
+    db.commit()
+
+
+def abort_session(db: Session, upload_session: UploadSession) -> UploadSession:
+    """取消上传：删除分片和尚未就绪的课时"""
+    aborted = db.execute(
+        update(UploadSession)
+        .where(
+            UploadSession.id == upload_session.id,
+            UploadSession.status.in_((UploadSessionStatus.UPLOADING, UploadSessionStatus.FAILED))
+        )
+        .values(status=UploadSessionStatus.ABORTED)
+    ).rowcount
+    if not aborted:
+        db.rollback()
+        db.refresh(upload_session)
+        raise UploadSessionStateError(f"上传会话状态为 {upload_session.status.value}，不能取消")
+
+    _discard_session(db, upload_session)
+    db.commit()
+    db.refresh(upload_session)
+    return upload_session
+
+
+def _discard_session(db: Session, upload_session: UploadSession):
+    _remove_chunks(db, upload_session.id)
+    lesson = db.get(models.Lesson, upload_session.lesson_id) if upload_session.lesson_id else None
+    if lesson is not None and lesson.status in (VideoStatus.UPLOADING, VideoStatus.ERROR) and not lesson.video_url:
+        course_id = lesson.course_id
+        upload_session.lesson_id = None
+        db.flush()
+        db.delete(lesson)
+        db.flush()
+        _refresh_lesson_count(db, course_id)
+
+
+def purge_expired_sessions(db: Session, limit: int = 100) -> int:
+    """清理过期未完成的会话（删除分片文件和占位课时），返回清理数量"""
+    expired = db.scalars(
+        select(UploadSession)
+        .where(
+            UploadSession.expires_at < datetime.now(timezone.utc),
+            UploadSession.status.in_((UploadSessionStatus.UPLOADING, UploadSessionStatus.FAILED))
+        )
+        .limit(limit)
+    ).all()
+    for upload_session in expired:
+        upload_session.status = UploadSessionStatus.ABORTED
+        upload_session.error_message = "上传会话已过期"
+        _discard_session(db, upload_session)
+    if expired:
+        db.commit()
+        logger.info(f"清理过期视频上传会话 {len(expired)} 个")
+    return len(expired)
@@ -0,0 +1,73 @@
+"""
+事件循环延迟压测：对比 async 路由中直接使用同步会话与使用 AsyncSession
+
+并发发起 N 个"检出连接 + 慢查询"任务，同时用一个心跳协程测量事件循环延迟。
+同步会话会在事件循环线程里阻塞，心跳延迟随并发线性增长；异步会话不阻塞事件循环。
+
+在 backend 目录下运行:
+    SECRET_KEY=bench PYTHONPATH=. python ../scripts/bench_async_db.py
+"""
+import asyncio
+import statistics
+import time
+
+from sqlalchemy import text
+
+from app.database import AsyncSessionLocal, SessionLocal, async_engine
+
+CONCURRENCY = 50
+# 模拟一次耗时数毫秒的查询
+SLOW_QUERY = text(
+    "WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c WHERE x < 20000) "
+    "SELECT count(*) FROM c"
+)
+
+
+async def heartbeat(samples: list, stop: asyncio.Event, interval: float = 0.005):
+    """按固定间隔醒来，记录实际唤醒的延迟"""
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        samples.append((time.perf_counter() - start - interval) * 1000)
+
+
+async def sync_checkout():
+    db = SessionLocal()
+    try:
+        db.execute(SLOW_QUERY).scalar()
+    finally:
+        db.close()
+    await asyncio.sleep(0)
+
+
+async def async_checkout():
+    async with AsyncSessionLocal() as db:
+        await db.execute(SLOW_QUERY)
+
+
+async def run(name, checkout):
+    samples, stop = [], asyncio.Event()
+    beat = asyncio.create_task(heartbeat(samples, stop))
+    await asyncio.sleep(0.02)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(checkout() for _ in range(CONCURRENCY)))
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    await beat
+    samples.sort()
+    p99 = samples[int(len(samples) * 0.99) - 1] if samples else 0.0
+    print(f"{name:<6} {CONCURRENCY} 并发: 总耗时 {elapsed * 1000:.0f}ms, "
+          f"事件循环延迟 中位数 {statistics.median(samples or [0]):.1f}ms / "
+          f"p99 {p99:.1f}ms / 最大 {max(samples or [0]):.1f}ms")
+
+
+async def main():
+    await run("sync", sync_checkout)
+    await run("async", async_checkout)
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
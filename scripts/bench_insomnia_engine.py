@@ -0,0 +1,243 @@
+"""
+失眠诊断引擎：计分表/方案表实现与原逐题实现的一致性校验和性能测试
+
+在 backend 目录下运行:
+    SECRET_KEY=bench PYTHONPATH=. python ../scripts/bench_insomnia_engine.py
+"""
+import itertools
+import json
+import random
+import time
+from dataclasses import asdict
+from typing import Dict, Optional
+
+from app.diagnosis.insomnia_diagnosis_engine import (
+    DiagnosisResult, InsomniaDiagnosisEngine, InsomniaLevel, SyndromeScores, SyndromeType
+)
+
+NUM_RANDOM_SETS = 20000
+BATCH_SIZE = 5000
+
+
+class ReferenceEngine(InsomniaDiagnosisEngine):
+    """原逐题计分实现（改为计分表之前的版本），作为一致性校验的基准"""
+
+    @classmethod
+    def _check_special_flows(cls, answers: Dict) -> Optional[DiagnosisResult]:
+        if "1" in answers:
+            answer_1 = answers["1"][0] if isinstance(answers["1"], list) else answers["1"]
+            if answer_1 == "A":
+                return cls._special_flow_result("perfect_sleep")
+        if "9" in answers:
+            answer_9 = answers["9"][0] if isinstance(answers["9"], list) else answers["9"]
+            if answer_9 == "C":
+                return cls._special_flow_result("long_term_medication")
+        return None
+
+    @classmethod
+    def _calculate_base_score(cls, answers: Dict) -> int:
+        total_score = 0
+        for q_id in range(1, 7):
+            if str(q_id) in answers and answers[str(q_id)]:
+                answer = answers[str(q_id)][0] if isinstance(answers[str(q_id)], list) else answers[str(q_id)]
+                total_score += cls.BASE_SCORING[q_id].get(answer, 0)
+        for q_id in ("7", "8"):
+            if q_id in answers and answers[q_id]:
+                selected_options = answers[q_id] if isinstance(answers[q_id], list) else [answers[q_id]]
+                for opt in selected_options:
+                    total_score += cls.BASE_SCORING[int(q_id)].get(opt, 0)
+        return total_score
+
+    @classmethod
+    def _calculate_syndrome_scores(cls, answers: Dict) -> SyndromeScores:
+        scores = SyndromeScores()
+        for field_name, question_ids in cls.SYNDROME_SCORING.items():
+            for q_id in question_ids:
+                if str(q_id) in answers and answers[str(q_id)]:
+                    if answers[str(q_id)] == "是" or (isinstance(answers[str(q_id)], list) and "是" in answers[str(q_id)]):
+                        setattr(scores, field_name, getattr(scores, field_name) + 1)
+                    elif isinstance(answers[str(q_id)], list):
+                        setattr(scores, field_name, getattr(scores, field_name) + len(answers[str(q_id)]))
+        return scores
+
+    @classmethod
+    def _determine_insomnia_level(cls, base_score: int) -> InsomniaLevel:
+        if base_score >= 103:
+            return InsomniaLevel.NO_TREATMENT
+        elif base_score >= 60:
+            return InsomniaLevel.PRIMARY
+        elif base_score >= 45:
+            return InsomniaLevel.MIDDLE
+        return InsomniaLevel.ADVANCED
+
+    @classmethod
+    def _determine_syndrome_type(cls, scores: SyndromeScores) -> SyndromeType:
+        row_scores = {"liver_intestine": scores.liver_intestine, "blood": scores.blood, "neural": scores.neural}
+        col_scores = {"bone_marrow": scores.bone_marrow, "brain_marrow": scores.brain_marrow}
+        max_row = max(row_scores.items(), key=lambda x: x[1])[0]
+        max_col = max(col_scores.items(), key=lambda x: x[1])[0]
+        return cls.SYNDROME_MATRIX.get((max_row, max_col), SyndromeType.LIVER_KIDNEY_DEFICIENCY)
+
+    @classmethod
+    def _special_flow_result(cls, special: str) -> DiagnosisResult:
+        result = super()._special_flow_result(special)
+        result.treatment_plan = dict(result.treatment_plan)
+        return result
+
+    @classmethod
+    def _generate_treatment_plan(cls, base_score: int, syndrome: SyndromeType, syndrome_scores: SyndromeScores) -> Dict:
+        if base_score >= 103:
+            return {"level": "无需治疗", "recommendation": "保持现状", "products": [], "therapy": []}
+        elif base_score == 74:
+            return {"level": "初级失眠(74分)", "recommendation": "保持", "products": ["茶包1"], "therapy": []}
+        elif base_score >= 60:
+            scores = {"肝肠": syndrome_scores.liver_intestine, "血液": syndrome_scores.blood, "神内": syndrome_scores.neural}
+            max_syndrome = max(scores.items(), key=lambda x: x[1])[0]
+            tea = {"肝肠": "茶包3(养肝)", "血液": "茶包3(养血)", "神内": "茶包3(养神)"}[max_syndrome]
+            return {"level": "初级失眠(60-73分)", "recommendation": "茶包3 + 奶粉", "products": [tea, "奶粉"], "therapy": []}
+        elif base_score >= 45:
+            syndrome_products, additional_products = cls._get_syndrome_products_with_supplements(syndrome)
+            return {"level": "中级失眠(45-59分)", "recommendation": "奶粉+营养补充+理疗",
+                    "products": syndrome_products + additional_products,
+                    "therapy": [cls._get_syndrome_acupoints(syndrome)]}
+        return {"level": "高级失眠(≤44分)", "recommendation": "定制流程", "products": ["②丸剂", "奶粉"],
+                "therapy": [], "special": "定制流程"}
+
+    @classmethod
+    def analyze_questionnaire(cls, answers: Dict) -> DiagnosisResult:
+        special_result = cls._check_special_flows(answers)
+        if special_result:
+            return special_result
+        base_score = cls._calculate_base_score(answers)
+        syndrome_scores = cls._calculate_syndrome_scores(answers)
+        syndrome = cls._determine_syndrome_type(syndrome_scores)
+        return DiagnosisResult(
+            base_score=base_score,
+            level=cls._determine_insomnia_level(base_score),
+            syndrome=syndrome,
+            syndrome_scores=syndrome_scores,
+            treatment_plan=cls._generate_treatment_plan(base_score, syndrome, syndrome_scores),
+            confidence=cls._calculate_confidence(base_score, syndrome_scores)
+        )
+
+
+def random_answer_value(rng: random.Random, question_id: int):
+    """随机答案：缺失、单值、列表（可重复）、空值、未知选项"""
+    if question_id <= 9:
+        options = list(InsomniaDiagnosisEngine.BASE_SCORING[question_id]) + ["Z"]
+    else:
+        options = ["是", "否", "A", "B", "C"]
+
+    kind = rng.random()
+    if question_id <= 6 and kind >= 0.15:
+        # 基础题大多正常作答且偏向高分选项，使各失眠等级都有样本
+        return rng.choice(options[:2] * 3 + options[:-1])
+    if question_id in (7, 8) and kind >= 0.5:
+        return options[-2]  # "无"
+    if kind < 0.1:
+        return None  # 不作答
+    if kind < 0.15:
+        return "" if question_id in (1, 9) else []
+    if kind < 0.6:
+        return rng.choice(options)
+    return [rng.choice(options) for _ in range(rng.randint(1, 4))]
+
+
+def random_answer_sets(count: int, seed: int = 42):
+    rng = random.Random(seed)
+    answer_sets = []
+    for _ in range(count):
+        answers = {}
+        for question_id in range(1, 20):
+            value = random_answer_value(rng, question_id)
+            if value is not None:
+                answers[str(question_id)] = value
+        # 控制特殊流程的比例，让大部分问卷走完整计分
+        if rng.random() < 0.8:
+            answers.pop("1", None)
+            if answers.get("9") in ("C", ["C"]) or (isinstance(answers.get("9"), list) and answers["9"][:1] == ["C"]):
+                answers.pop("9")
+        answer_sets.append(answers)
+    return answer_sets
+
+
+def as_json(result: DiagnosisResult):
+    """按接口返回的JSON比较（方案表中的 tuple 序列化后与原实现的 list 相同）"""
+    return json.loads(json.dumps(asdict(result), ensure_ascii=False))
+
+
+def check_equivalence(answer_sets):
+    mismatches = 0
+    single_results = [InsomniaDiagnosisEngine.analyze_questionnaire(answers) for answers in answer_sets]
+    batch_results = InsomniaDiagnosisEngine.analyze_batch(answer_sets)
+    for answers, single, batch in zip(answer_sets, single_results, batch_results):
+        expected = as_json(ReferenceEngine.analyze_questionnaire(answers))
+        if as_json(single) != expected or as_json(batch) != expected:
+            mismatches += 1
+            if mismatches <= 5:
+                print("不一致:", answers, expected, as_json(single), as_json(batch))
+
+    specials = sum(1 for result in batch_results if "special" in result.treatment_plan
+                   and result.treatment_plan["special"] in ("perfect_sleep", "long_term_medication"))
+    levels = {level.value: 0 for level in InsomniaLevel}
+    for result in batch_results:
+        levels[result.level.value] += 1
+    print(f"一致性校验: {len(answer_sets)} 份随机问卷, 不一致 {mismatches} 份 "
+          f"(特殊流程 {specials} 份, 等级分布 {levels})")
+    return mismatches == 0
+
+
+def check_treatment_plans():
+    """方案表与原逐次生成逻辑逐项比较：全部分数 x 证型 x 证型分数组合"""
+    mismatches = checked = 0
+    score_patterns = [SyndromeScores(*pattern) for pattern in itertools.product(range(4), repeat=5)]
+    for base_score in range(0, 131):
+        for syndrome in SyndromeType:
+            for scores in score_patterns:
+                expected = ReferenceEngine._generate_treatment_plan(base_score, syndrome, scores)
+                plan = InsomniaDiagnosisEngine._generate_treatment_plan(base_score, syndrome, scores)
+                checked += 1
+                if json.loads(json.dumps(plan)) != expected:
+                    mismatches += 1
+    print(f"方案表校验: {checked} 种组合, 不一致 {mismatches} 种")
+    return mismatches == 0
+
+
+def bench(answer_sets):
+    start = time.perf_counter()
+    for answers in answer_sets:
+        ReferenceEngine.analyze_questionnaire(answers)
+    reference = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for answers in answer_sets:
+        InsomniaDiagnosisEngine.analyze_questionnaire(answers)
+    single = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for offset in range(0, len(answer_sets), BATCH_SIZE):
+        InsomniaDiagnosisEngine.analyze_batch(answer_sets[offset:offset + BATCH_SIZE])
+    batch = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for offset in range(0, len(answer_sets), BATCH_SIZE):
+        InsomniaDiagnosisEngine.score_batch(answer_sets[offset:offset + BATCH_SIZE])
+    scores_only = time.perf_counter() - start
+
+    count = len(answer_sets)
+    for name, elapsed in (("原实现逐份", reference), ("计分表逐份", single),
+                          ("analyze_batch", batch), ("score_batch", scores_only)):
+        print(f"{name:<14} {count} 份: {elapsed:.3f}s, 平均 {elapsed / count * 1e6:.1f} µs/份")
+
+
+def main():
+    answer_sets = random_answer_sets(NUM_RANDOM_SETS)
+    ok = check_equivalence(answer_sets)
+    ok = check_treatment_plans() and ok
+    bench(answer_sets)
+    if not ok:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+登录洪峰压测：bcrypt 在事件循环中直接计算 vs 提交到专用线程池
+
+同时发起 LOGINS 个登录请求，另一个协程持续请求一个无关的轻量接口，统计其延迟分布。
+bcrypt 在事件循环里计算时，无关接口要排在所有登录之后；放进线程池后只受 CPU 竞争影响，
+排队超过 PASSWORD_HASH_MAX_PENDING 的登录直接返回 503。
+最后校验 BCRYPT_ROUNDS 调整后，旧哈希在登录时被自动替换。
+
+在 backend 目录下运行:
+    SECRET_KEY=bench PYTHONPATH=. python ../scripts/bench_login_storm.py
+"""
+import asyncio
+import os
+import tempfile
+import time
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench_login.db")
+
+import httpx
+from fastapi import FastAPI
+from passlib.context import CryptContext
+
+from app import models
+from app.api import auth
+from app.core import security
+from app.core.config import settings
+from app.database import Base, SessionLocal, engine
+
+LOGINS = 40
+PROBE_INTERVAL = 0.01
+PASSWORD = "Bench123456"
+
+
+def create_users():
+    Base.metadata.create_all(engine)
+    hashed = security.get_password_hash(PASSWORD)
+    old_hash = CryptContext(schemes=["bcrypt"], bcrypt__rounds=max(settings.BCRYPT_ROUNDS - 2, 4)).hash(PASSWORD)
+    db = SessionLocal()
+    db.add_all([
+        models.User(
+            username=f"bench{i}", email=f"bench{i}@example.com", hashed_password=hashed,
+            status=models.UserStatus.ACTIVE, is_active=True
+        )
+        for i in range(LOGINS)
+    ])
+    db.add(models.User(
+        username="legacy", email="legacy@example.com", hashed_password=old_hash,
+        status=models.UserStatus.ACTIVE, is_active=True
+    ))
+    db.commit()
+    db.close()
+
+
+def build_app() -> FastAPI:
+    """只挂载认证路由和一个无关接口（不经过限流中间件）"""
+    app = FastAPI()
+    app.include_router(auth.router, prefix="/api/auth")
+
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    return app
+
+
+async def inline_verify(plain_password, hashed_password):
+    """改造前的行为：在事件循环中直接计算 bcrypt"""
+    return security.pwd_context.verify_and_update(plain_password, hashed_password)
+
+
+def percentile(samples, p):
+    samples = sorted(samples)
+    return samples[min(int(len(samples) * p), len(samples) - 1)] if samples else 0.0
+
+
+async def run(name, client):
+    latencies, done = [], asyncio.Event()
+
+    async def probe():
+        # 从计划发出请求的时刻计时，事件循环被阻塞导致的发送延迟也计入
+        while not done.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(PROBE_INTERVAL)
+            await client.get("/ping")
+            latencies.append((time.perf_counter() - start - PROBE_INTERVAL) * 1000)
+
+    async def login(i):
+        response = await client.post("/api/auth/login", json={"username": f"bench{i}", "password": PASSWORD})
+        return response.status_code
+
+    prober = asyncio.create_task(probe())
+    await asyncio.sleep(0.05)
+    start = time.perf_counter()
+    statuses = await asyncio.gather(*(login(i) for i in range(LOGINS)))
+    elapsed = time.perf_counter() - start
+    done.set()
+    await prober
+
+    counts = {code: statuses.count(code) for code in sorted(set(statuses))}
+    print(f"[{name}] {LOGINS} 个并发登录 {elapsed:.2f}s, 状态码 {counts}; "
+          f"无关接口 {len(latencies)} 次, p50 {percentile(latencies, 0.5):.1f}ms, "
+          f"p99 {percentile(latencies, 0.99):.1f}ms, max {max(latencies):.1f}ms")
+
+
+async def check_rehash(client):
+    db = SessionLocal()
+    before = db.query(models.User).filter(models.User.username == "legacy").one().hashed_password
+    response = await client.post("/api/auth/login", json={"username": "legacy", "password": PASSWORD})
+    db.expire_all()
+    after = db.query(models.User).filter(models.User.username == "legacy").one().hashed_password
+    db.close()
+    rounds = settings.BCRYPT_ROUNDS
+    print(f"登录时重新哈希: 状态码 {response.status_code}, {before[:7]} -> {after[:7]} (当前成本 {rounds})")
+    return response.status_code == 200 and after.startswith(f"$2b${rounds:02d}$")
+
+
+async def main():
+    create_users()
+    transport = httpx.ASGITransport(app=build_app())
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        pooled = auth.verify_password_and_update_async
+        auth.verify_password_and_update_async = inline_verify
+        try:
+            await run("事件循环内计算", client)
+        finally:
+            auth.verify_password_and_update_async = pooled
+        await run(f"线程池({security.password_hasher.workers}线程, 排队上限 {security.password_hasher.max_pending})", client)
+        print("线程池统计:", security.password_hasher.stats())
+        ok = await check_rehash(client)
+    if not ok:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,123 @@
+"""
+二元诊断：症状倒排索引与原逐维度扫描实现的一致性校验和性能测试
+
+在 backend 目录下运行:
+    SECRET_KEY=bench PYTHONPATH=. python ../scripts/bench_symptom_index.py
+"""
+import random
+import time
+from dataclasses import astuple
+
+from app.diagnosis.binary_diagnosis import DIMENSION_FIELDS, BinaryDiagnosisEngine
+from app.diagnosis.symptom_index import SymptomIndex
+from app.models.insomnia_models import DiagnosticScores, Symptoms
+
+NUM_PATIENTS = 20000
+EXTRA_SYMPTOMS_PER_DIMENSION = 500  # 模拟医师补充大量症状后的配置规模
+
+
+def reference_scores(symptom_weights, tongue_pulse_weights, symptoms: Symptoms) -> DiagnosticScores:
+    """原实现：每个维度重新扫描一遍患者症状"""
+    all_symptoms = symptoms.primary_symptoms + symptoms.secondary_symptoms
+    values = []
+    for dimension, _ in DIMENSION_FIELDS:
+        total_score = 0.0
+        weights = symptom_weights.get(dimension, {})
+        for symptom in all_symptoms:
+            if symptom in weights:
+                total_score += weights[symptom]
+        tongue_weights = tongue_pulse_weights.get(dimension, {}).get("tongue", {})
+        if symptoms.tongue_appearance in tongue_weights:
+            total_score += tongue_weights[symptoms.tongue_appearance]
+        pulse_weights = tongue_pulse_weights.get(dimension, {}).get("pulse", {})
+        if symptoms.pulse_condition in pulse_weights:
+            total_score += pulse_weights[symptoms.pulse_condition]
+        values.append(total_score)
+    return DiagnosticScores(*values)
+
+
+def extended_weights(rng: random.Random):
+    """在现有配置上为每个维度增加大量合成症状（部分症状跨维度共享）"""
+    symptom_weights = {dimension: dict(weights) for dimension, weights in BinaryDiagnosisEngine.SYMPTOM_WEIGHTS.items()}
+    for dimension_number, dimension in enumerate(symptom_weights):
+        for i in range(EXTRA_SYMPTOMS_PER_DIMENSION):
+            name = f"症状{(dimension_number * EXTRA_SYMPTOMS_PER_DIMENSION + i) % 3000}"
+            symptom_weights[dimension][name] = rng.choice((0.5, 1.0, 1.5, 2.0, 2.5, 3.0)) + rng.random() / 10
+    return symptom_weights
+
+
+def random_patients(symptom_weights, count: int, seed: int = 7):
+    rng = random.Random(seed)
+    vocabulary = sorted({symptom for weights in symptom_weights.values() for symptom in weights}) + ["无关症状"]
+    tongues = [t for w in BinaryDiagnosisEngine.TONGUE_PULSE_WEIGHTS.values() for t in w["tongue"]] + ["其他舌象"]
+    pulses = [p for w in BinaryDiagnosisEngine.TONGUE_PULSE_WEIGHTS.values() for p in w["pulse"]] + ["其他脉象"]
+    patients = []
+    for _ in range(count):
+        patients.append(Symptoms(
+            primary_symptoms=[rng.choice(vocabulary) for _ in range(rng.randint(0, 6))],
+            secondary_symptoms=[rng.choice(vocabulary) for _ in range(rng.randint(0, 6))],
+            tongue_appearance=rng.choice(tongues),
+            pulse_condition=rng.choice(pulses),
+            mental_state=""
+        ))
+    return patients
+
+
+def check_and_bench(name, symptom_weights, score_fn, patients):
+    mismatches = 0
+    for patient in patients:
+        expected = reference_scores(symptom_weights, BinaryDiagnosisEngine.TONGUE_PULSE_WEIGHTS, patient)
+        if astuple(score_fn(patient)) != astuple(expected):
+            mismatches += 1
+            if mismatches <= 5:
+                print("不一致:", patient, expected, score_fn(patient))
+
+    start = time.perf_counter()
+    for patient in patients:
+        reference_scores(symptom_weights, BinaryDiagnosisEngine.TONGUE_PULSE_WEIGHTS, patient)
+    reference = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for patient in patients:
+        score_fn(patient)
+    indexed = time.perf_counter() - start
+
+    count = len(patients)
+    print(f"[{name}] {count} 位患者, 不一致 {mismatches} 位; "
+          f"逐维度扫描 {reference / count * 1e6:.1f} µs/位, 倒排索引 {indexed / count * 1e6:.1f} µs/位")
+    return mismatches == 0
+
+
+def main():
+    rng = random.Random(42)
+
+    # 1. 现有配置：与 BinaryDiagnosisEngine.calculate_scores 比较
+    weights = BinaryDiagnosisEngine.SYMPTOM_WEIGHTS
+    ok = check_and_bench("现有配置", weights, BinaryDiagnosisEngine.calculate_scores,
+                         random_patients(weights, NUM_PATIENTS))
+
+    # 2. 扩充后的配置：同一索引结构，症状数增加约百倍
+    weights = extended_weights(rng)
+    index = SymptomIndex.from_weights(
+        weights, BinaryDiagnosisEngine.TONGUE_PULSE_WEIGHTS,
+        dimensions=[dimension for dimension, _ in DIMENSION_FIELDS]
+    )
+
+    def indexed_scores(patient: Symptoms) -> DiagnosticScores:
+        return DiagnosticScores(*index.score(
+            patient.primary_symptoms + patient.secondary_symptoms,
+            patient.tongue_appearance,
+            patient.pulse_condition
+        ))
+
+    ok = check_and_bench(f"扩充配置({index.vocabulary_size}项)", weights, indexed_scores,
+                         random_patients(weights, NUM_PATIENTS)) and ok
+
+    ranking = BinaryDiagnosisEngine.rank_dimensions(random_patients(BinaryDiagnosisEngine.SYMPTOM_WEIGHTS, 1)[0])
+    print("top-3 示例:", ranking)
+    if not ok:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+购物车读取查询次数校验
+
+GET /api/cart/ 的 SQL 条数应与购物车中的商品数无关（改造前每个商品懒加载一次商品表），
+缓存命中时不访问数据库，增删改后立即看到新内容，没有购物车的用户读取时不写库。
+
+在 backend 目录下运行:
+    SECRET_KEY=bench PYTHONPATH=. python ../scripts/check_cart_queries.py
+"""
+import os
+import tempfile
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/check_cart.db")
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from app import models
+from app.api import cart
+from app.core.cart_cache import cart_cache
+from app.core.enums_v2 import ProductCategory, ProductStatus
+from app.core.security import create_access_token
+from app.database import Base, SessionLocal, engine
+
+CART_SIZES = (1, 10, 30)
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+        event.listen(engine, "before_cursor_execute", self._count)
+
+    def _count(self, *args):
+        self.count += 1
+
+    def measure(self, fn):
+        start = self.count
+        result = fn()
+        return result, self.count - start
+
+
+def setup() -> dict:
+    """每种规格的购物车各建一个用户，返回 用户邮箱 -> 商品数"""
+    Base.metadata.create_all(engine)
+    db = SessionLocal()
+    products = [
+        models.Product(
+            name=f"商品{i}", category=list(ProductCategory)[0], price=10 + i,
+            stock_quantity=100, status=ProductStatus.ACTIVE
+        )
+        for i in range(max(CART_SIZES))
+    ]
+    db.add_all(products)
+    users = {}
+    for size in CART_SIZES + (0,):
+        user = models.User(
+            username=f"cart{size}", email=f"cart{size}@example.com", hashed_password="x",
+            status=models.UserStatus.ACTIVE, is_active=True
+        )
+        db.add(user)
+        db.flush()
+        if size:
+            user_cart = models.Cart(user_id=user.id)
+            db.add(user_cart)
+            db.flush()
+            db.add_all([
+                models.CartItem(cart_id=user_cart.id, product_id=product.id, quantity=2, price_snapshot=product.price)
+                for product in products[:size]
+            ])
+        users[user.email] = size
+    db.commit()
+    db.close()
+    return users
+
+
+def main():
+    users = setup()
+    app = FastAPI()
+    app.include_router(cart.router, prefix="/api")
+    client = TestClient(app)
+    counter = QueryCounter()
+
+    def get(email):
+        headers = {"Authorization": f"Bearer {create_access_token({'sub': email})}"}
+        response = client.get("/api/cart/", headers=headers)
+        assert response.status_code == 200, response.text
+        return response.json()
+
+    ok = True
+    counts = {}
+    for email, size in users.items():
+        get(email)  # 预热认证缓存，只统计购物车本身的查询
+        cart_cache.invalidate()
+        data, counts[size] = counter.measure(lambda: get(email))
+        ok = ok and len(data["items"]) == size and data["total_items"] == size * 2
+        _, cached = counter.measure(lambda: get(email))
+        print(f"{size:>2} 件商品: 未命中缓存 {counts[size]} 条SQL, 命中缓存 {cached} 条SQL, 总价 {data['total_price']}")
+        ok = ok and cached == 0
+
+    constant = len({count for size, count in counts.items() if size}) == 1
+    print(f"查询次数与商品数无关: {'通过' if constant else '不通过'}")
+
+    db = SessionLocal()
+    empty_has_cart = db.query(models.Cart).join(models.User).filter(models.User.email == "cart0@example.com").count()
+    db.close()
+    print(f"没有购物车的用户读取后不创建购物车: {'通过' if empty_has_cart == 0 else '不通过'}")
+
+    # 修改后立即失效
+    email = "cart1@example.com"
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': email})}"}
+    item_id = get(email)["items"][0]["id"]
+    client.put(f"/api/cart/items/{item_id}", json={"quantity": 5}, headers=headers)
+    fresh = get(email)["total_items"] == 5
+    print(f"修改数量后读到新内容: {'通过' if fresh else '不通过'}")
+
+    if not (ok and constant and empty_has_cart == 0 and fresh):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
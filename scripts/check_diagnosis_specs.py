@@ -0,0 +1,49 @@
+"""
+声明式问卷规格检查：编译 app/diagnosis/specs 下全部规格，并用随机答卷测试计分耗时
+
+在 backend 目录下运行（新增或修改规格后先跑一遍，规格错误会直接报出）:
+    SECRET_KEY=bench PYTHONPATH=. python ../scripts/check_diagnosis_specs.py
+"""
+import random
+import time
+
+from app.diagnosis.spec_engine import SpecRegistry
+
+NUM_RANDOM_SETS = 20000
+
+
+def random_answers(diagnosis, rng: random.Random):
+    answers = {}
+    for question in diagnosis.spec["questions"]:
+        if rng.random() < 0.1:
+            continue  # 不作答
+        options = [option["value"] for option in question["options"]]
+        if question.get("type") == "multiple":
+            answers[str(question["id"])] = rng.sample(options, rng.randint(0, min(3, len(options))))
+        else:
+            answers[str(question["id"])] = rng.choice(options)
+    return answers
+
+
+def main():
+    registry = SpecRegistry().load()
+    rng = random.Random(42)
+    for diagnosis in registry.all():
+        answer_sets = [random_answers(diagnosis, rng) for _ in range(NUM_RANDOM_SETS)]
+        start = time.perf_counter()
+        results = [diagnosis.analyze(answers) for answers in answer_sets]
+        elapsed = time.perf_counter() - start
+
+        levels, syndromes = {}, {}
+        for result in results:
+            levels[result.level] = levels.get(result.level, 0) + 1
+            syndromes[result.syndrome] = syndromes.get(result.syndrome, 0) + 1
+        print(f"{diagnosis.key} v{diagnosis.version}: {diagnosis.question_count} 题, "
+              f"{len(diagnosis.dimension_keys)} 维度, {len(diagnosis.syndrome_keys)} 证型; "
+              f"平均 {elapsed / NUM_RANDOM_SETS * 1e6:.1f} µs/份")
+        print(f"  等级分布 {levels}")
+        print(f"  证型分布 {syndromes}")
+
+
+if __name__ == "__main__":
+    main()
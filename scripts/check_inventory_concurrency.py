@@ -0,0 +1,160 @@
+"""
+库存并发扣减校验：多线程同时抢购同一商品，验证不超卖
+
+- 改造前的写法（先查询库存、再在 Python 中 stock_quantity -= qty）作为对照，并发下会丢失更新而超卖
+- 改造后的 create_order：条件更新扣减，成功订单数必须等于初始库存，库存不为负，预占记录与销量一致
+- 取消订单与超时释放并发执行时，每个预占只归还一次库存，最终库存回到初始值
+
+默认使用临时 SQLite 数据库，设置 DATABASE_URL 可在 PostgreSQL 上验证（FOR UPDATE 行锁路径）。
+在 backend 目录下运行:
+    SECRET_KEY=bench PYTHONPATH=. python ../scripts/check_inventory_concurrency.py
+"""
+import os
+import tempfile
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/check_inventory.db")
+
+from sqlalchemy import func
+
+from app import models
+from app.api import orders
+from app.core.enums_v2 import OrderStatus, ProductCategory, ProductStatus
+from app.core.exceptions import TCMException
+from app.database import Base, SessionLocal, engine
+from app.schemas.product import OrderCreate
+from app.services import inventory_service
+
+STOCK = 50
+THREADS = 16
+ATTEMPTS = 200
+
+
+def setup_product(name: str) -> int:
+    db = SessionLocal()
+    product = models.Product(
+        name=name, category=list(ProductCategory)[0], price=9.9,
+        stock_quantity=STOCK, status=ProductStatus.ACTIVE
+    )
+    db.add(product)
+    db.commit()
+    product_id = product.id
+    db.close()
+    return product_id
+
+
+def order_payload(product_id: int) -> OrderCreate:
+    return OrderCreate(
+        items=[{"product_id": product_id, "quantity": 1}],
+        customer_info={"name": "压测", "phone": "13800000000", "address": "测试地址"},
+        total_amount=9.9
+    )
+
+
+def legacy_checkout(product_id: int):
+    """改造前的扣减方式：读库存、校验、在 Python 中扣减"""
+    db = SessionLocal()
+    try:
+        product = db.query(models.Product).filter(models.Product.id == product_id).first()
+        if product.stock_quantity < 1:
+            return "INSUFFICIENT_STOCK"
+        product.stock_quantity -= 1
+        db.commit()
+        return "OK"
+    finally:
+        db.close()
+
+
+def reserved_checkout(product_id: int):
+    db = SessionLocal()
+    try:
+        orders.create_order(order_payload(product_id), user_id=1, db=db)
+        return "OK"
+    except TCMException as e:
+        return e.error_code
+    finally:
+        db.close()
+
+
+def storm(name: str, checkout, product_id: int) -> bool:
+    barrier = threading.Barrier(THREADS)
+
+    def worker(index):
+        barrier.wait()
+        return [checkout(product_id) for _ in range(index, ATTEMPTS, THREADS)]
+
+    with ThreadPoolExecutor(max_workers=THREADS) as pool:
+        results = Counter(code for batch in pool.map(worker, range(THREADS)) for code in batch)
+
+    db = SessionLocal()
+    stock = db.query(models.Product.stock_quantity).filter(models.Product.id == product_id).scalar()
+    reserved = db.query(func.coalesce(func.sum(models.InventoryReservation.quantity), 0)).filter(
+        models.InventoryReservation.product_id == product_id
+    ).scalar()
+    db.close()
+
+    sold = results["OK"]
+    ok = sold == STOCK and stock == 0
+    print(f"[{name}] {THREADS} 线程 {ATTEMPTS} 次抢购库存 {STOCK}: 结果 {dict(results)}, "
+          f"剩余库存 {stock}, 预占 {reserved}, 超卖 {max(sold - STOCK, 0)} -> {'通过' if ok else '不通过'}")
+    return ok and (checkout is legacy_checkout or reserved == sold)
+
+
+def check_release(product_id: int) -> bool:
+    """取消一半订单的同时执行超时释放，库存应恰好回到初始值"""
+    db = SessionLocal()
+    order_ids = [
+        order_id for (order_id,) in db.query(models.Order.id).join(models.OrderItem).filter(
+            models.OrderItem.product_id == product_id
+        )
+    ]
+    db.close()
+
+    def cancel(order_id):
+        session = SessionLocal()
+        try:
+            orders.cancel_order(order_id, db=session)
+        except TCMException:
+            pass  # 已被超时释放取消
+        finally:
+            session.close()
+
+    def expire():
+        session = SessionLocal()
+        try:
+            future = datetime.now(timezone.utc) + timedelta(days=1)
+            while inventory_service.release_expired_reservations(session, now=future, limit=10)["reservations"]:
+                pass
+        finally:
+            session.close()
+
+    with ThreadPoolExecutor(max_workers=THREADS) as pool:
+        futures = [pool.submit(cancel, order_id) for order_id in order_ids[::2]]
+        futures += [pool.submit(expire) for _ in range(4)]
+        for future in futures:
+            future.result()
+
+    db = SessionLocal()
+    stock = db.query(models.Product.stock_quantity).filter(models.Product.id == product_id).scalar()
+    statuses = Counter(status.value for (status,) in db.query(models.Order.status).filter(models.Order.id.in_(order_ids)))
+    db.close()
+    ok = stock == STOCK and statuses.get(OrderStatus.CANCELLED.value) == len(order_ids)
+    print(f"[取消/超时释放] {len(order_ids)} 个订单: 状态 {dict(statuses)}, 库存 {stock} -> {'通过' if ok else '不通过'}")
+    return ok
+
+
+def main():
+    Base.metadata.create_all(engine)
+    storm("改造前", legacy_checkout, setup_product("对照商品"))
+    product_id = setup_product("抢购商品")
+    ok = storm("条件更新", reserved_checkout, product_id)
+    ok = check_release(product_id) and ok
+    if not ok:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()